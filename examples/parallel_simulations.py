@@ -2,13 +2,10 @@ import wntr
 import numpy as np
 from multiprocessing import Pool
 import time
-import pickle
 import logging
 
 def run_scenario(pipe_to_break):
-    f = open('wn.pickle', 'r')
-    wn = pickle.load(f)
-    f.close()
+    wn = wntr.network.load_snapshot('wn.npz')
     wn.split_pipe_with_junction(pipe_to_break, pipe_to_break+'__A', pipe_to_break+'__B', 'leak_'+pipe_to_break)
     leak = wn.get_node('leak_'+pipe_to_break)
     leak.add_leak(wn, 0.01, 0.75, 3600, 5*3600)
@@ -23,9 +20,7 @@ wn = wntr.network.WaterNetworkModel(inp_file)
 wn.options.duration = 72*3600
 wn.options.hydraulic_timestep = 3600
 pipes_to_break = list(np.random.choice(wn.pipe_name_list(), size=10, replace=False))
-f=open('wn.pickle','w')
-pickle.dump(wn,f)
-f.close()
+wntr.network.save_snapshot(wn, 'wn.npz')
 
 # run in serial
 t0 = time.time()
@@ -47,3 +42,18 @@ for i, serial_result in enumerate(results_list_serial):
     parallel_result = results_list[i]
     assert ((serial_result.node==parallel_result.node).all().all().all())
     assert ((serial_result.link==parallel_result.link).all().all().all())
+
+# run in parallel with the scenario runner, which sends the network to each
+# worker once and only sends the scenario descriptions to the workers
+scenarios = [wntr.scenario.HydraulicScenario(pipe_name, leaks=[(pipe_name, 0.01, 3600, 5*3600)])
+             for pipe_name in pipes_to_break]
+runner = wntr.sim.ScenarioRunner(wn, scenarios, pressure_driven=True)
+t4 = time.time()
+results_list_runner = runner.run(num_processes=5)
+t5 = time.time()
+print 'scenario runner time: ',t5-t4
+
+for i, serial_result in enumerate(results_list_serial):
+    runner_result = results_list_runner[i]
+    assert ((serial_result.node==runner_result.node).all().all().all())
+    assert ((serial_result.link==runner_result.link).all().all().all())
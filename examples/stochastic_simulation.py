@@ -1,7 +1,6 @@
 import wntr
 import numpy as np
 import matplotlib.pyplot as plt
-import pickle
 
 # Create a water network model
 inp_file = 'networks/Net3.inp'
@@ -24,9 +23,7 @@ for name, node in wn.junctions():
 pipe_diameters = wn.query_link_attribute('diameter', np.less_equal, 
                                          0.9144,  # 36 inches = 0.9144 m
                                          link_type=wntr.network.Pipe)
-failure_probability = {}
-for k,v in pipe_diameters.iteritems():
-    failure_probability[k] = v/sum(pipe_diameters.values())
+failure_probability = pipe_diameters/pipe_diameters.sum()
     
 # Define maximum iterations
 Imax = 5
@@ -37,19 +34,15 @@ results = {}
 # Set random seed
 np.random.seed(67823)
 
-f=open('wn.pickle','w')
-pickle.dump(wn,f)
-f.close()
-
 for i in range(Imax):
     
     # Select the number of leaks, random value between 1 and 5
     N = np.random.random_integers(1,5,1)
     
     # Select N unique pipes based on failure probability
-    pipes_to_fail = np.random.choice(failure_probability.keys(), 5, 
+    pipes_to_fail = np.random.choice(failure_probability.index, 5, 
                                      replace=False, 
-                                     p=failure_probability.values())
+                                     p=failure_probability.values)
     
     # Select time of failure, uniform dist, between 1 and 10 hours
     time_of_failure = np.round(np.random.uniform(1,10,1)[0], 2) 
@@ -57,6 +50,9 @@ for i in range(Imax):
     # Select duration of failure, uniform dist, between 12 and 24 hours
     duration_of_failure = np.round(np.random.uniform(12,24,1)[0], 2) 
     
+    # Record the changes made to the network in this iteration
+    overlay = wn.overlay()
+    
     for pipe_to_fail in pipes_to_fail:
         pipe = wn.get_link(pipe_to_fail)
         leak_diameter = pipe.diameter*0.3
@@ -79,13 +75,12 @@ for i in range(Imax):
     print sim_name
     results[sim_name] = sim.run_sim()
     
-    f=open('wn.pickle','r')
-    wn = pickle.load(f)
-    f.close()
+    # Discard the leaks before the next iteration
+    overlay.discard()
     
 ### ANALYSIS ###
 nzd_junctions = wn.query_node_attribute('base_demand', np.greater, 0, 
-                                        node_type=wntr.network.Junction).keys()
+                                        node_type=wntr.network.Junction).index
 
 result_names = results.keys()
 for name in result_names:
@@ -0,0 +1,421 @@
+"""
+Array-backed storage of the attributes of nodes and links.
+
+The state of a network that changes during a simulation (heads, demands,
+flows, statuses, ...) is kept in one NumPy array per attribute instead of
+in the dictionary of each node or link object. Each node or link added to a
+WaterNetworkModel is given an integer id into these arrays, and the
+corresponding attributes of the object (declared with StoredAttribute) read
+and write the arrays. Simulators can therefore read or write the state of
+all nodes or links at once by indexing the arrays with the ids of the
+objects, and queries can select nodes or links by comparing whole columns.
+"""
+import numpy as np
+
+
+class StoredAttribute(object):
+    """
+    Descriptor for an attribute of a node or link that is stored in an
+    AttributeStore once the object is added to a water network model. Until
+    then (and after the object is removed from the model) the value is kept
+    in the __dict__ of the object.
+    """
+    def __init__(self, name):
+        """
+        Parameters
+        ----------
+        name : string
+            Name of the attribute (and of the column of the AttributeStore)
+        """
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        d = obj.__dict__
+        if '_store' in d:
+            return d['_store'].get(self.name, d['_store_id'])
+        try:
+            return d[self.name]
+        except KeyError:
+            raise AttributeError("'{0}' object has no attribute '{1}'".format(type(obj).__name__, self.name))
+
+    def __set__(self, obj, value):
+        d = obj.__dict__
+        if '_store' in d:
+            d['_store'].set(self.name, d['_store_id'], value)
+        else:
+            d[self.name] = value
+
+
+_stored_attribute_names = {}
+
+# Values that represent None in columns of each type
+_none_values = {float: np.nan, int: -1, object: None}
+
+# Sides of np.searchsorted for the lower and upper bounds of the values that
+# satisfy each comparison (None if the range is not bounded)
+_index_bounds = {np.greater: ('right', None),
+                 np.greater_equal: ('left', None),
+                 np.less: (None, 'left'),
+                 np.less_equal: (None, 'right'),
+                 np.equal: ('left', 'right')}
+
+
+def stored_attribute_names(cls):
+    """
+    Returns the names of the attributes of a class that are declared with
+    StoredAttribute.
+
+    Parameters
+    ----------
+    cls : class
+        A node or link class
+
+    Returns
+    -------
+    names : list of strings
+    """
+    names = _stored_attribute_names.get(cls)
+    if names is None:
+        names = set()
+        for klass in cls.__mro__:
+            for name, value in vars(klass).iteritems():
+                if isinstance(value, StoredAttribute):
+                    names.add(value.name)
+        names = sorted(names)
+        _stored_attribute_names[cls] = names
+    return names
+
+
+class AttributeStore(object):
+    """
+    Stores the attributes of a set of objects (the nodes or the links of a
+    water network model) in one NumPy array (column) per attribute. Each
+    object added to the store is given an id, which is the index of its
+    values in every column. Ids of removed objects are reused.
+
+    None is stored as NaN in float columns (so a NaN value is read back as
+    None) and as -1 in integer columns. The columns may be longer than the
+    number of objects; the rows that are not in use hold None. The store
+    also keeps the name and the class of each object, so that the ids of the
+    objects of a given class can be found without iterating over the objects.
+
+    A sorted index can be kept for any column (see create_index), which
+    select uses to find the ids of the objects whose values are in a range.
+    The index is rebuilt the first time it is used after the column changes.
+
+    While a ScenarioOverlay is active, each column is replaced by a copy the
+    first time it is accessed, so that the original columns can be restored.
+    """
+    overlay = None
+    _original_columns = None
+
+    def __init__(self, columns, capacity=16):
+        """
+        Parameters
+        ----------
+        columns : list of (string, type) tuples
+            The name and type (float or int) of each column
+        capacity : int
+            Initial length of the columns
+        """
+        # The name of each object and the position of its class in self._classes
+        columns = list(columns) + [('_name', object), ('_class', int)]
+        self._dtypes = dict(columns)
+        self._none_values = dict((name, _none_values[dtype]) for name, dtype in columns)
+        self._columns = {}
+        for name, dtype in columns:
+            self._columns[name] = self._new_column(name, capacity)
+        self._capacity = capacity
+        self._num_ids = 0
+        self._free_ids = []
+        self._classes = []
+        # {column name: (sorted values, ids) or None if the index must be rebuilt}
+        self._sorted_indexes = {}
+
+    def _new_column(self, name, length):
+        column = np.empty(length, dtype=self._dtypes[name])
+        column.fill(self._none_values[name])
+        return column
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('overlay', None)
+        state.pop('_original_columns', None)
+        state['_sorted_indexes'] = dict.fromkeys(self._sorted_indexes)
+        return state
+
+    def __getitem__(self, name):
+        """
+        Returns the column of an attribute. The array is replaced by a longer
+        one when objects are added beyond its length (or when an overlay is
+        started), so it should not be kept across additions.
+        """
+        if self._original_columns is not None and name not in self._original_columns:
+            self._copy_column(name)
+        if name in self._sorted_indexes:
+            self._sorted_indexes[name] = None
+        return self._columns[name]
+
+    def column_names(self):
+        """
+        Returns a list of the names of the attribute columns.
+        """
+        return sorted(name for name in self._columns if not name.startswith('_'))
+
+    def get(self, name, store_id):
+        """
+        Returns the value of an attribute as a python scalar (or None).
+        """
+        value = self._columns[name].item(store_id)
+        if value != value or value == self._none_values[name]:
+            return None
+        return value
+
+    def set(self, name, store_id, value):
+        """
+        Sets the value of an attribute.
+        """
+        if value is None:
+            value = self._none_values[name]
+        if name in self._sorted_indexes:
+            self._sorted_indexes[name] = None
+        if self._original_columns is None:
+            self._columns[name][store_id] = value
+        else:
+            self[name][store_id] = value
+
+    def add(self, obj):
+        """
+        Assign an id to obj and move the values of its stored attributes from
+        its __dict__ into the columns.
+        """
+        if self.overlay is not None:
+            self.overlay._save_object(obj)
+        if len(self._free_ids) > 0:
+            store_id = self._free_ids.pop()
+        else:
+            store_id = self._num_ids
+            self._num_ids += 1
+            if store_id >= self._capacity:
+                self._grow()
+        if self._original_columns is not None:
+            self._copy_columns()
+        columns = self._columns
+        none_values = self._none_values
+        d = obj.__dict__
+        for name in stored_attribute_names(type(obj)):
+            if name in d:
+                value = d.pop(name)
+                columns[name][store_id] = none_values[name] if value is None else value
+        columns['_name'][store_id] = obj.name()
+        columns['_class'][store_id] = self._class_id(type(obj))
+        d['_store'] = self
+        d['_store_id'] = store_id
+        if self._sorted_indexes:
+            self._invalidate_indexes()
+
+    def remove(self, obj):
+        """
+        Move the values of the stored attributes of obj back into its
+        __dict__ and release its id.
+        """
+        if self.overlay is not None:
+            self.overlay._save_object(obj)
+        if self._original_columns is not None:
+            self._copy_columns()
+        d = obj.__dict__
+        store_id = d.pop('_store_id')
+        del d['_store']
+        for name in stored_attribute_names(type(obj)):
+            d[name] = self.get(name, store_id)
+        for name, column in self._columns.iteritems():
+            column[store_id] = self._none_values[name]
+        self._free_ids.append(store_id)
+        if self._sorted_indexes:
+            self._invalidate_indexes()
+
+    def _class_id(self, cls):
+        try:
+            return self._classes.index(cls)
+        except ValueError:
+            self._classes.append(cls)
+            return len(self._classes) - 1
+
+    def find_ids(self, cls=None, attributes=[], ids=None):
+        """
+        Returns the ids of the objects that are instances of cls and that
+        store all of the attributes given.
+
+        Parameters
+        ----------
+        cls : class
+            Only objects of this class (or of a subclass) are returned. If
+            None, objects of any class are returned.
+        attributes : list of strings
+            Names of columns that the class of the objects must declare (as
+            StoredAttribute)
+        ids : numpy array of ints
+            If given, only ids in this (sorted) array are returned
+
+        Returns
+        -------
+        ids : sorted numpy array of ints
+        """
+        class_ids = [class_id for class_id, klass in enumerate(self._classes)
+                     if (cls is None or issubclass(klass, cls)) and
+                     all(name in stored_attribute_names(klass) for name in attributes)]
+        if ids is None:
+            classes = self._columns['_class'][:self._num_ids]
+            if len(class_ids) == len(self._classes):
+                return np.flatnonzero(classes >= 0)
+            return np.flatnonzero(np.in1d(classes, class_ids))
+        if len(class_ids) == len(self._classes):
+            return ids
+        return ids[np.in1d(self._columns['_class'][ids], class_ids)]
+
+    def names(self, ids):
+        """
+        Returns a numpy array with the names of the objects with the given ids.
+        """
+        return self._columns['_name'][ids]
+
+    def dtype(self, name):
+        """
+        Returns the type (float, int, or object) of a column.
+        """
+        return self._dtypes[name]
+
+    def values(self, name, ids):
+        """
+        Returns a numpy array with the values of an attribute for the given
+        ids (None values are NaN or -1).
+        """
+        return self._columns[name][ids]
+
+    def create_index(self, name):
+        """
+        Keep a sorted index of a column, which select uses for comparisons
+        with np.greater, np.greater_equal, np.less, np.less_equal, and
+        np.equal. Values that are None are not in the index.
+        """
+        if name not in self._columns or name.startswith('_'):
+            raise KeyError('No attribute column named ' + str(name))
+        self._sorted_indexes[name] = None
+
+    def drop_index(self, name):
+        """
+        Stop keeping a sorted index of a column.
+        """
+        self._sorted_indexes.pop(name, None)
+
+    def has_index(self, name):
+        """
+        Returns True if a sorted index of the column is kept.
+        """
+        return name in self._sorted_indexes
+
+    def _invalidate_indexes(self):
+        for name in self._sorted_indexes:
+            self._sorted_indexes[name] = None
+
+    def _sorted_index(self, name):
+        index = self._sorted_indexes[name]
+        if index is None:
+            ids = self.find_ids()
+            values = self._columns[name][ids]
+            if values.dtype == float:
+                not_none = np.logical_not(np.isnan(values))
+            else:
+                not_none = values != self._none_values[name]
+            ids = ids[not_none]
+            values = values[not_none]
+            order = np.argsort(values, kind='mergesort')
+            index = (values[order], ids[order])
+            self._sorted_indexes[name] = index
+        return index
+
+    def select(self, name, operation, value, ids=None):
+        """
+        Returns the ids of the objects for which operation(value of the
+        attribute, value) is True. operation is applied to a numpy array of
+        the values of the attribute, so it should be a numpy function such
+        as np.greater. If a sorted index of the column is kept (see
+        create_index), comparisons use it instead of comparing the whole
+        column.
+
+        Parameters
+        ----------
+        name : string
+            Name of the column
+        operation : function
+            e.g., np.greater, np.greater_equal, np.less, np.less_equal,
+            np.equal, np.not_equal
+        value : float or int
+            The value the attribute is compared to
+        ids : numpy array of ints
+            If given, only ids in this (sorted) array are returned
+
+        Returns
+        -------
+        ids : sorted numpy array of ints
+        """
+        bounds = _index_bounds.get(operation)
+        if bounds is not None and name in self._sorted_indexes:
+            sorted_values, sorted_ids = self._sorted_index(name)
+            lower, upper = bounds
+            start = 0 if lower is None else sorted_values.searchsorted(value, lower)
+            stop = len(sorted_values) if upper is None else sorted_values.searchsorted(value, upper)
+            selected = np.sort(sorted_ids[start:stop])
+            if ids is None:
+                return selected
+            return selected[np.in1d(selected, ids, assume_unique=True)]
+        if ids is None:
+            ids = self.find_ids()
+        return ids[np.asarray(operation(self._columns[name][ids], value), dtype=bool)]
+
+    def _grow(self):
+        capacity = 2*self._capacity
+        for name, column in self._columns.items():
+            if self._original_columns is not None and name not in self._original_columns:
+                self._original_columns[name] = column
+            new_column = self._new_column(name, capacity)
+            new_column[:self._capacity] = column
+            self._columns[name] = new_column
+        self._capacity = capacity
+
+    def _copy_column(self, name):
+        column = self._columns[name]
+        self._original_columns[name] = column
+        self._columns[name] = column.copy()
+
+    def _copy_columns(self):
+        for name in self._columns.keys():
+            if name not in self._original_columns:
+                self._copy_column(name)
+
+    def _begin_overlay(self, overlay):
+        self.overlay = overlay
+        self._original_columns = {}
+        self._original_state = (self._capacity, self._num_ids, list(self._free_ids))
+
+    def _end_overlay(self, restore):
+        if restore:
+            self._columns.update(self._original_columns)
+            self._capacity, self._num_ids, self._free_ids = self._original_state
+            self._invalidate_indexes()
+        self.overlay = None
+        self._original_columns = None
+        del self._original_state
+
+    def _changed_ids(self):
+        """
+        Returns the set of ids whose values differ from the values when the
+        overlay was started.
+        """
+        changed = np.zeros(self._original_state[0], dtype=bool)
+        for name, original in self._original_columns.iteritems():
+            column = self._columns[name][:len(original)]
+            changed |= (column != original) & np.logical_not((column != column) & (original != original))
+        return set(np.flatnonzero(changed).tolist())
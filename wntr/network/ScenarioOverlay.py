@@ -0,0 +1,256 @@
+"""
+Copy-on-write overlays for trying changes on a water network model.
+
+An overlay records the state of a water network model that is about to be
+changed, so that every change made while the overlay is active (modified
+attributes, added or removed nodes, links, controls, patterns, and curves,
+and the state left by a simulation) can be discarded. Only the attributes of
+the model, its options, its graph (not the contents of their dictionaries),
+and its controls are saved when the overlay is started. Each node or link is
+saved the first time one of its attributes is assigned, each column of the
+attribute stores (see AttributeStore) is copied the first time it is
+accessed, and each dictionary of the model (and each adjacency dictionary of
+the graph) is replaced by a copy the first time a key is added or removed.
+The originals are never modified, and discarding the overlay puts them back,
+so the model is restored exactly (including the order of its dictionaries)
+in time proportional to the number of changes.
+"""
+from AttributeStore import StoredAttribute
+
+import logging
+logger = logging.getLogger('wntr.network.ScenarioOverlay')
+
+def _recording_setattr(self, name, value):
+    """
+    __setattr__ of Node and Link: saves the object for the overlay of its model
+    (if any) before its first change. Stored attributes are restored with the
+    columns of the attribute store instead.
+    """
+    store = self.__dict__.get('_store')
+    if store is not None and store.overlay is not None and \
+       not isinstance(getattr(type(self), name, None), StoredAttribute):
+        store.overlay._save_object(self)
+    object.__setattr__(self, name, value)
+
+
+class ScenarioOverlay(object):
+    """
+    Records the changes made to a water network model so that they can be
+    discarded. Overlays are created with WaterNetworkModel.overlay, e.g.,
+
+    >>> overlay = wn.overlay()
+    >>> wn.split_pipe_with_junction('123', '123_A', '123_B', '123_leak')
+    >>> wn.get_node('123_leak').add_leak(wn, area=0.05, start_time=3600)
+    >>> results = wntr.sim.WNTRSimulator(wn, pressure_driven=True).run_sim()
+    >>> overlay.discard()
+
+    or, to discard the changes at the end of a block,
+
+    >>> with wn.overlay():
+    ...     wn.remove_link('123')
+    ...     results = wntr.sim.WNTRSimulator(wn).run_sim()
+
+    Only one overlay can be active on a model at a time. Changes made in
+    place to mutable attribute values (e.g., the points of a curve or the
+    list of a pattern) and changes made directly to the networkx graph are
+    not recorded.
+    """
+    def __init__(self, wn):
+        """
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+            The model to record changes of
+        """
+        if wn._node_attributes.overlay is not None:
+            raise RuntimeError('An overlay is already active on this water network model.')
+        self._wn = wn
+        self._active = True
+        # {id(object): (object, copy of its __dict__ before the first change)}
+        self._saved_objects = {}
+        # The model, its options, and its graph are saved when the overlay starts;
+        # their dictionaries (and the adjacency dictionaries of the graph) are
+        # replaced by copies before they are changed.
+        self._save_object(wn)
+        self._save_object(wn.options)
+        self._save_object(wn._graph)
+        # Controls keep some state between timesteps of a simulation
+        for control in wn._control_dict.itervalues():
+            self._save_object(control)
+        self._copied = set()
+        self._stores = [wn._node_attributes, wn._link_attributes]
+        for store in self._stores:
+            store._begin_overlay(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._active:
+            self.discard()
+        return False
+
+    def is_active(self):
+        """
+        Returns True until the overlay is discarded or committed.
+        """
+        return self._active
+
+    def discard(self):
+        """
+        Undo all changes made to the model since the overlay was started.
+        """
+        self._check_active()
+        self._active = False
+        for store in self._stores:
+            store._end_overlay(restore=True)
+        for obj, saved_dict in self._saved_objects.itervalues():
+            obj.__dict__ = saved_dict
+        self._saved_objects = {}
+
+    def commit(self):
+        """
+        Keep all changes made to the model and stop recording changes.
+        """
+        self._check_active()
+        self._active = False
+        for store in self._stores:
+            store._end_overlay(restore=False)
+        self._saved_objects = {}
+
+    def _check_active(self):
+        if not self._active:
+            raise RuntimeError('The overlay has already been discarded or committed.')
+
+    def _save_object(self, obj):
+        """
+        Save the __dict__ of obj (once) before it is changed.
+        """
+        key = id(obj)
+        if key not in self._saved_objects:
+            self._saved_objects[key] = (obj, obj.__dict__.copy())
+
+    def _copy_model_attributes(self, names):
+        """
+        Replace the dictionaries (or lists) of the model named in names by copies
+        before keys are added to or removed from them.
+        """
+        wn = self._wn
+        for name in names:
+            if ('model', name) not in self._copied:
+                value = getattr(wn, name)
+                setattr(wn, name, type(value)(value))
+                self._copied.add(('model', name))
+
+    def _copy_graph_nodes(self, nodes):
+        """
+        Replace the attribute dictionaries of nodes of the graph by copies.
+        """
+        G = self._copy_graph()
+        for node in nodes:
+            if ('node', node) not in self._copied and node in G.node:
+                G.node[node] = dict(G.node[node])
+                self._copied.add(('node', node))
+
+    def _copy_graph_edges(self, edges):
+        """
+        Replace the successors of u, the predecessors of v, and the edges (and
+        their attribute dictionaries) from u to v of the graph by copies for each
+        (u, v) in edges.
+        """
+        G = self._copy_graph()
+        for u, v in edges:
+            if ('succ', u) not in self._copied and u in G.succ:
+                G.succ[u] = dict(G.succ[u])
+                self._copied.add(('succ', u))
+            if ('pred', v) not in self._copied and v in G.pred:
+                G.pred[v] = dict(G.pred[v])
+                self._copied.add(('pred', v))
+            if ('edge', u, v) not in self._copied and u in G.succ and v in G.succ[u]:
+                keydict = dict((key, dict(attr)) for key, attr in G.succ[u][v].iteritems())
+                G.succ[u][v] = keydict
+                G.pred[v][u] = keydict
+                self._copied.add(('edge', u, v))
+
+    def _copy_graph(self):
+        G = self._wn._graph
+        if 'graph' not in self._copied:
+            G.node = dict(G.node)
+            G.pred = dict(G.pred)
+            G.adj = dict(G.adj)
+            G.succ = G.adj
+            G.edge = G.adj
+            self._copied.add('graph')
+        return G
+
+    def _original(self, name):
+        return self._saved_objects[id(self._wn)][1][name]
+
+    def _added(self, name):
+        current = getattr(self._wn, name)
+        original = self._original(name)
+        return [key for key in current if key not in original]
+
+    def _removed(self, name):
+        current = getattr(self._wn, name)
+        original = self._original(name)
+        return [key for key in original if key not in current]
+
+    def _modified(self, objects, store):
+        changed_ids = store._changed_ids()
+        return sorted(name for name, obj in objects.iteritems()
+                      if id(obj) in self._saved_objects or obj.__dict__.get('_store_id') in changed_ids)
+
+    def added_nodes(self):
+        """
+        Returns the names of the nodes added to the model (e.g., leak junctions).
+        """
+        return self._added('_nodes')
+
+    def removed_nodes(self):
+        """
+        Returns the names of the nodes removed from the model.
+        """
+        return self._removed('_nodes')
+
+    def added_links(self):
+        """
+        Returns the names of the links added to the model.
+        """
+        return self._added('_links')
+
+    def removed_links(self):
+        """
+        Returns the names of the links removed from the model.
+        """
+        return self._removed('_links')
+
+    def added_controls(self):
+        """
+        Returns the names of the controls added to the model.
+        """
+        return self._added('_control_dict')
+
+    def removed_controls(self):
+        """
+        Returns the names of the controls removed from the model.
+        """
+        return self._removed('_control_dict')
+
+    def modified_nodes(self):
+        """
+        Returns the names of the nodes of the model that were already in the
+        model and whose attributes were assigned (this includes the nodes whose
+        head, demand, etc. were changed by a simulation).
+        """
+        return [name for name in self._modified(self._wn._nodes, self._wn._node_attributes)
+                if name in self._original('_nodes')]
+
+    def modified_links(self):
+        """
+        Returns the names of the links of the model that were already in the
+        model and whose attributes were assigned (this includes the links whose
+        status or flow were changed by a simulation).
+        """
+        return [name for name in self._modified(self._wn._links, self._wn._link_attributes)
+                if name in self._original('_links')]
@@ -5,9 +5,12 @@ from scipy.optimize import fsolve
 from wntr.utils import convert
 import wntr.network
 import numpy as np
+import pandas as pd
 import warnings
 import sys
 import logging
+from AttributeStore import AttributeStore, StoredAttribute
+from ScenarioOverlay import ScenarioOverlay, _recording_setattr
 
 # -*- coding: utf-8 -*-
 """
@@ -43,8 +46,10 @@ class WaterNetworkModel(object):
         
         Optional Parameters
         -------------------
-        inp_file_name: string
-           directory and filename of inp file to load into the WaterNetworkModel object.
+        inp_file_name: string or file-like object
+           directory and filename of inp file to load into the WaterNetworkModel object,
+           or an open file-like object. Gzip compressed files (ending in .gz) and streams
+           are decompressed.
 
         """
 
@@ -74,6 +79,19 @@ class WaterNetworkModel(object):
         self._pumps = {}
         self._valves = {}
 
+        # Arrays holding the attributes of the nodes and links that change
+        # during a simulation or are commonly queried (see StoredAttribute)
+        self._node_attributes = AttributeStore([('elevation', float), ('head', float), ('prev_head', float),
+                                                ('demand', float), ('prev_demand', float),
+                                                ('expected_demand', float), ('prev_expected_demand', float),
+                                                ('leak_demand', float), ('prev_leak_demand', float),
+                                                ('base_demand', float), ('base_head', float),
+                                                ('init_level', float), ('min_level', float), ('max_level', float),
+                                                ('diameter', float), ('min_vol', float)])
+        self._link_attributes = AttributeStore([('status', int), ('flow', float), ('prev_flow', float),
+                                                ('length', float), ('diameter', float), ('roughness', float),
+                                                ('minor_loss', float)])
+
         # Initialize pattern and curve dictionaries
         # Dictionary of pattern or curves indexed by their names
         self._patterns = {}
@@ -146,6 +164,8 @@ class WaterNetworkModel(object):
         base_demand = float(base_demand)
         elevation = float(elevation)
         junction = Junction(name, base_demand, demand_pattern_name, elevation)
+        self._before_change(['_nodes', '_junctions'], graph_nodes=[name])
+        self._node_attributes.add(junction)
         self._nodes[name] = junction
         self._junctions[name] = junction
         self._graph.add_node(name)
@@ -200,6 +220,8 @@ class WaterNetworkModel(object):
         assert init_level >= min_level, "Initial tank level must be greater than or equal to the tank minimum level."
         assert init_level <= max_level, "Initial tank level must be less than or equal to the tank maximum level."
         tank = Tank(name, elevation, init_level, min_level, max_level, diameter, min_vol, vol_curve)
+        self._before_change(['_nodes', '_tanks'], graph_nodes=[name])
+        self._node_attributes.add(tank)
         self._nodes[name] = tank
         self._tanks[name] = tank
         self._graph.add_node(name)
@@ -336,6 +358,8 @@ class WaterNetworkModel(object):
         """
         base_head = float(base_head)
         reservoir = Reservoir(name, base_head, head_pattern_name)
+        self._before_change(['_nodes', '_reservoirs'], graph_nodes=[name])
+        self._node_attributes.add(reservoir)
         self._nodes[name] = reservoir
         self._reservoirs[name] = reservoir
         self._graph.add_node(name)
@@ -382,10 +406,12 @@ class WaterNetworkModel(object):
         minor_loss = float(minor_loss)
         pipe = Pipe(name, start_node_name, end_node_name, length,
                     diameter, roughness, minor_loss, status, check_valve_flag)
+        self._before_change(['_links', '_pipes', '_check_valves'], graph_edges=[(start_node_name, end_node_name)])
         # Add to list of cv
         if check_valve_flag:
             self._check_valves.append(name)
 
+        self._link_attributes.add(pipe)
         self._links[name] = pipe
         self._pipes[name] = pipe
         self._graph.add_edge(start_node_name, end_node_name, key=name)
@@ -438,6 +464,8 @@ class WaterNetworkModel(object):
             Float value of power in KW. Head curve object.
         """
         pump = Pump(name, start_node_name, end_node_name, info_type, info_value)
+        self._before_change(['_links', '_pumps'], graph_edges=[(start_node_name, end_node_name)])
+        self._link_attributes.add(pump)
         self._links[name] = pump
         self._pumps[name] = pump
         self._graph.add_edge(start_node_name, end_node_name, key=name)
@@ -503,6 +531,8 @@ class WaterNetworkModel(object):
 
         valve = Valve(name, start_node_name, end_node_name,
                       diameter, valve_type, minor_loss, setting)
+        self._before_change(['_links', '_valves'], graph_edges=[(start_node_name, end_node_name)])
+        self._link_attributes.add(valve)
         self._links[name] = valve
         self._valves[name] = valve
         self._graph.add_edge(start_node_name, end_node_name, key=name)
@@ -534,6 +564,7 @@ class WaterNetworkModel(object):
         pattern_list : list of floats
             A list of floats that make up the pattern.
         """
+        self._before_change(['_patterns'])
         self._patterns[name] = pattern_list
 
     def add_curve(self, name, curve_type, xy_tuples_list):
@@ -550,6 +581,7 @@ class WaterNetworkModel(object):
             List of X-Y coordinate tuples on the curve.
         """
         curve = Curve(name, curve_type, xy_tuples_list)
+        self._before_change(['_curves'])
         self._curves[name] = curve
 
     def add_control(self, name, control_object):
@@ -577,6 +609,7 @@ class WaterNetworkModel(object):
             if type(start_node)==Tank or type(end_node)==Tank:
                 warnings.warn('Controls should not be added to links that are connected to tanks. Consider adding an additional link and using the control on it. Note that this will become an error in the next release.')
 
+        self._before_change(['_control_dict'])
         self._control_dict[name] = control_object
         control_object.name = name
 
@@ -648,11 +681,14 @@ class WaterNetworkModel(object):
            False, no controls will be removed.
         """
         link = self.get_link(name)
+        self._before_change(['_links', '_pipes', '_pumps', '_valves', '_check_valves'],
+                            graph_edges=[(link.start_node(), link.end_node())])
         if link.cv:
             self._check_valves.remove(name)
             warnings.warn('You are removing a pipe with a check valve.')
         self._graph.remove_edge(link.start_node(), link.end_node(), key=name)
         self._links.pop(name)
+        self._link_attributes.remove(link)
         if isinstance(link, Pipe):
             self._num_pipes -= 1
             self._pipes.pop(name)
@@ -701,7 +737,10 @@ class WaterNetworkModel(object):
            False, no controls will be removed.
         """
         node = self.get_node(name)
+        self._before_change(['_nodes', '_junctions', '_tanks', '_reservoirs'], graph_nodes=[name],
+                            graph_edges=[(u, v) for u, v in self._graph.in_edges(name) + self._graph.out_edges(name)])
         self._nodes.pop(name)
+        self._node_attributes.remove(node)
         self._graph.remove_node(name)
         if isinstance(node, Junction):
             self._num_junctions -= 1
@@ -747,6 +786,7 @@ class WaterNetworkModel(object):
         name : string
            The name of the control object to be removed.
         """
+        self._before_change(['_control_dict'])
         del self._control_dict[name]
 
     def discard_control(self, name):
@@ -760,6 +800,8 @@ class WaterNetworkModel(object):
         name : string
            The name of the control object to be removed.
         """
+        if name in self._control_dict:
+            self._before_change(['_control_dict'])
         try:
             del self._control_dict[name]
         except KeyError:
@@ -996,7 +1038,7 @@ class WaterNetworkModel(object):
         """
         return copy.deepcopy(self._graph)
         
-    def query_node_attribute(self, attribute, operation=None, value=None, node_type=None):
+    def query_node_attribute(self, attribute, operation=None, value=None, node_type=None, conditions=None):
         """ Query node attributes, for example get all nodes with elevation <= threshold
 
         Parameters
@@ -1014,31 +1056,34 @@ class WaterNetworkModel(object):
             options = Node, Junction, Reservoir, Tank, or None, default = None
             Note None and Node produce the same results
 
+        conditions: list of (attribute, operation, value) tuples
+            Additional conditions that the nodes must satisfy, e.g.,
+            [('elevation', np.less, 100), ('base_demand', np.greater, 0)]
+
         Returns
         -------
-        dictionary
-            dictionary of node names to attribute for nodes of node_type satisfying operation threshold
+        pandas Series
+            node attribute indexed by the names of the nodes of node_type satisfying operation threshold
+            and all conditions
 
         Notes
         -----
-        If operation and value are both None, the dictionary being returned will contain the attributes
+        If operation and value are both None, the Series being returned will contain the attributes
         for all nodes with the specified attribute.
 
+        Attributes stored in arrays (see AttributeStore; e.g., elevation,
+        base_demand, and the tank levels) are compared all at once, using a
+        sorted index of the attribute if one was created with
+        create_node_attribute_index. For these attributes, operation is applied
+        to numpy arrays and None values are NaN. The nodes are in the order in
+        which they were added to the model.
         """
-        node_attribute_dict = {}
-        for name, node in self.nodes(node_type):
-            try:
-                if operation == None and value == None:
-                    node_attribute_dict[name] = getattr(node, attribute)
-                else:
-                    node_attribute = getattr(node, attribute)
-                    if operation(node_attribute, value):
-                        node_attribute_dict[name] = node_attribute
-            except AttributeError:
-                pass
-        return node_attribute_dict
+        if node_type is not None and not issubclass(node_type, Node):
+            raise RuntimeError('node_type, '+str(node_type)+', not recognized.')
+        return self._query_attribute(self._node_attributes, self._nodes, node_type, attribute,
+                                     operation, value, conditions)
 
-    def query_link_attribute(self, attribute, operation=None, value=None, link_type=None):
+    def query_link_attribute(self, attribute, operation=None, value=None, link_type=None, conditions=None):
         """ Query link attributes, for example get all pipe diameters > threshold
 
         Parameters
@@ -1056,29 +1101,98 @@ class WaterNetworkModel(object):
             options = Link, Pipe, Pump, Valve, or None, default = None
             Note: None and Link produce the same results
 
+        conditions: list of (attribute, operation, value) tuples
+            Additional conditions that the links must satisfy, e.g.,
+            [('diameter', np.greater, 0.3), ('length', np.greater, 100)]
+
         Returns
         -------
-        dictionary
-            dictionary of link names to attributes for links of link_type  satisfying operation threshold
+        pandas Series
+            link attribute indexed by the names of the links of link_type satisfying operation threshold
+            and all conditions
 
         Notes
         -----
-        If operation and value are both None, the dictionary being returned will contain the attributes
+        If operation and value are both None, the Series being returned will contain the attributes
         for all links with the specified attribute.
 
+        Attributes stored in arrays (see AttributeStore; e.g., length,
+        diameter, roughness, and status) are compared all at once, using a
+        sorted index of the attribute if one was created with
+        create_link_attribute_index. For these attributes, operation is
+        applied to numpy arrays and None values are NaN (or -1 for status).
+        The links are in the order in which they were added to the model.
         """
-        link_attribute_dict = {}
-        for name, link in self.links(link_type):
+        if link_type is not None and not issubclass(link_type, Link):
+            raise RuntimeError('link_type, '+str(link_type)+', not recognized.')
+        return self._query_attribute(self._link_attributes, self._links, link_type, attribute,
+                                     operation, value, conditions)
+
+    def _query_attribute(self, store, objects, object_type, attribute, operation, value, conditions):
+        predicates = []
+        if operation is not None:
+            predicates.append((attribute, operation, value))
+        if conditions is not None:
+            predicates.extend(conditions)
+
+        # Conditions on stored attributes are evaluated on the columns of the
+        # store; only the objects that satisfy them are visited for the others.
+        stored = set(store.column_names())
+        ids = None
+        for name, predicate_operation, predicate_value in predicates:
+            if name in stored:
+                ids = store.select(name, predicate_operation, predicate_value, ids)
+        stored_attributes = [name for name in set([attribute] + [predicate[0] for predicate in predicates])
+                             if name in stored]
+        ids = store.find_ids(object_type, stored_attributes, ids)
+        names = store.names(ids)
+
+        other_predicates = [predicate for predicate in predicates if predicate[0] not in stored]
+        if attribute in stored and len(other_predicates) == 0:
+            return pd.Series(store.values(attribute, ids), index=names)
+
+        selected_names = []
+        selected_values = []
+        for name in names:
+            obj = objects[name]
             try:
-                if operation == None and value == None:
-                    link_attribute_dict[name] = getattr(link, attribute)
-                else:
-                    link_attribute = getattr(link, attribute)
-                    if operation(link_attribute, value):
-                        link_attribute_dict[name] = link_attribute
+                if all(predicate_operation(getattr(obj, predicate_attribute), predicate_value)
+                       for predicate_attribute, predicate_operation, predicate_value in other_predicates):
+                    selected_values.append(getattr(obj, attribute))
+                    selected_names.append(name)
             except AttributeError:
                 pass
-        return link_attribute_dict
+        return pd.Series(selected_values, index=selected_names)
+
+    def create_node_attribute_index(self, attribute):
+        """
+        Keep a sorted index of a node attribute that is stored in an array
+        (see AttributeStore), which speeds up queries that compare the
+        attribute with np.greater, np.greater_equal, np.less, np.less_equal,
+        or np.equal on large networks. The index is updated as needed when
+        the attribute changes.
+
+        Parameters
+        ----------
+        attribute: string
+            Node attribute, e.g., 'elevation'
+        """
+        self._node_attributes.create_index(attribute)
+
+    def create_link_attribute_index(self, attribute):
+        """
+        Keep a sorted index of a link attribute that is stored in an array
+        (see AttributeStore), which speeds up queries that compare the
+        attribute with np.greater, np.greater_equal, np.less, np.less_equal,
+        or np.equal on large networks. The index is updated as needed when
+        the attribute changes.
+
+        Parameters
+        ----------
+        attribute: string
+            Link attribute, e.g., 'diameter'
+        """
+        self._link_attributes.create_index(attribute)
 
     def num_nodes(self):
         """
@@ -1353,6 +1467,7 @@ class WaterNetworkModel(object):
         name : name of the node
         coordinates : tuple of X-Y coordinates
         """
+        self._before_change(graph_nodes=[name])
         nx.set_node_attributes(self._graph, 'pos', {name: coordinates})
 
     def scale_node_coordinates(self, scale):
@@ -1379,6 +1494,7 @@ class WaterNetworkModel(object):
             Name of the link used.
         """
         link = self.get_link(link_name)
+        self._before_change(graph_edges=[(link.start_node(), link.end_node())])
         self._graph.edge[link.start_node()][link.end_node()][link_name][attr_name] = value
         
     def shifted_time(self):
@@ -1405,6 +1521,48 @@ class WaterNetworkModel(object):
         """
         return self.shifted_time_sec() % (24*3600)
 
+    def overlay(self):
+        """
+        Start recording changes to the network so that they can be discarded
+        (see ScenarioOverlay). This is much cheaper than copying the network
+        for each scenario, e.g.,
+
+        >>> for pipe_name in pipes_to_break:
+        ...     with wn.overlay():
+        ...         wn.split_pipe_with_junction(pipe_name, pipe_name+'_A', pipe_name+'_B', pipe_name+'_leak')
+        ...         wn.get_node(pipe_name+'_leak').add_leak(wn, area=0.05, start_time=3600)
+        ...         results[pipe_name] = wntr.sim.WNTRSimulator(wn, pressure_driven=True).run_sim()
+
+        Returns
+        -------
+        overlay : ScenarioOverlay
+            Call overlay.discard() to undo the changes (or overlay.commit() to
+            keep them). Used in a with statement, the changes are discarded at
+            the end of the block.
+        """
+        return ScenarioOverlay(self)
+
+    def _before_change(self, attributes=[], graph_nodes=[], graph_edges=[]):
+        """
+        Let the active overlay (if any) copy the dictionaries of the network
+        and the parts of the graph that are about to be changed.
+
+        Parameters
+        ----------
+        attributes : list of strings
+            Names of the dictionaries (or lists) of the network whose keys will change
+        graph_nodes : list of strings
+            Nodes of the graph whose attributes will change (or that will be added or removed)
+        graph_edges : list of (string, string) tuples
+            (start node, end node) of the edges of the graph that will change (or be added
+            or removed)
+        """
+        overlay = self._node_attributes.overlay
+        if overlay is not None:
+            overlay._copy_model_attributes(attributes)
+            overlay._copy_graph_nodes(graph_nodes)
+            overlay._copy_graph_edges(graph_edges)
+
     def reset_initial_values(self):
         """
         Resets all initial values in the network.
@@ -1646,6 +1804,24 @@ class WaterNetworkModel(object):
         for junction_name, junction in self.nodes(Junction):
             f.write('%s\n'%junction.to_inp_string(flowunit))
 
+        # Print the demands of junctions with several demand categories. These
+        # replace the demands in the [JUNCTIONS] section.
+        f.write('[DEMANDS]\n')
+        text_format = '{:20s} {:12f} {:24s} {:>3s}\n'
+        label_format = '{:20s} {:>12s} {:24s}\n'
+        f.write(label_format.format(';Junction', 'Demand', 'Pattern'))
+        for junction_name, junction in self.nodes(Junction):
+            if len(junction.demand_categories) == 0:
+                continue
+            demands = [(junction.base_demand, junction.demand_pattern_name, None)]+junction.demand_categories
+            for base_demand, demand_pattern_name, category_name in demands:
+                if demand_pattern_name is None:
+                    demand_pattern_name = ''
+                comment = ';'
+                if category_name is not None:
+                    comment = ';'+category_name
+                f.write(text_format.format(junction_name, convert('Demand',flowunit,base_demand,False), demand_pattern_name, comment))
+
         # Print reservoir information
         f.write('[RESERVOIRS]\n')
         text_format = '{:20s} {:12f} {:>12s} {:>3s}\n'
@@ -2061,6 +2237,16 @@ class Node(object):
     """
     The base node class.
     """
+    prev_head = StoredAttribute('prev_head')
+    head = StoredAttribute('head')
+    prev_demand = StoredAttribute('prev_demand')
+    demand = StoredAttribute('demand')
+    leak_demand = StoredAttribute('leak_demand')
+    prev_leak_demand = StoredAttribute('prev_leak_demand')
+
+    # Saves the node for the active ScenarioOverlay of its model before its first change
+    __setattr__ = _recording_setattr
+
     def __init__(self, name):
         """
         Parameters
@@ -2106,6 +2292,13 @@ class Link(object):
     """
     The base link class.
     """
+    status = StoredAttribute('status')
+    prev_flow = StoredAttribute('prev_flow')
+    flow = StoredAttribute('flow')
+
+    # Saves the link for the active ScenarioOverlay of its model before its first change
+    __setattr__ = _recording_setattr
+
     def __init__(self, link_name, start_node_name, end_node_name):
         """
         Parameters
@@ -2175,6 +2368,11 @@ class Junction(Node):
     """
     Junction class that is inherited from Node
     """
+    elevation = StoredAttribute('elevation')
+    base_demand = StoredAttribute('base_demand')
+    prev_expected_demand = StoredAttribute('prev_expected_demand')
+    expected_demand = StoredAttribute('expected_demand')
+
     def __init__(self, name, base_demand=0.0, demand_pattern_name=None, elevation=0.0):
         """
         Parameters
@@ -2198,6 +2396,8 @@ class Junction(Node):
         self.prev_expected_demand = None
         self.expected_demand = base_demand
         self.demand_pattern_name = demand_pattern_name
+        self.demand_categories = []
+        "Additional demand categories of the junction, as a list of (base_demand, demand_pattern_name, category_name) tuples. The demand of the junction is the sum of the demand given by base_demand and demand_pattern_name and the demands of these categories."
         self.elevation = elevation
         self.nominal_pressure = 20.0
         "The nominal pressure attribute is used for pressure-dependent demand. This is the lowest pressure at which the customer receives the full requested demand."
@@ -2231,6 +2431,23 @@ class Junction(Node):
             return text_format.format(self._name, convert('Elevation',flowunit,self.elevation,False), convert('Demand',flowunit,self.base_demand,False), '', ';')
         
 
+    def add_demand_category(self, base_demand, demand_pattern_name=None, category_name=None):
+        """
+        Add a demand category to the junction (e.g., from the [DEMANDS] section of an inp file). The demand
+        of the category is added to the demand of the junction.
+
+        Parameters
+        ----------
+        base_demand : float
+            Base demand of the category.
+            Internal units must be cubic meters per second (m^3/s).
+        demand_pattern_name : string
+            Name of the demand pattern of the category. If None, the default pattern of the network is used.
+        category_name : string
+            Name of the category.
+        """
+        self.demand_categories = self.demand_categories + [(float(base_demand), demand_pattern_name, category_name)]
+
     def add_leak(self, wn, area, discharge_coeff = 0.75, start_time=None, end_time=None):
         """Method to add a leak to a junction. Leaks are modeled by:
 
@@ -2365,6 +2582,13 @@ class Tank(Node):
     """
     Tank class that is inherited from Node
     """
+    elevation = StoredAttribute('elevation')
+    init_level = StoredAttribute('init_level')
+    min_level = StoredAttribute('min_level')
+    max_level = StoredAttribute('max_level')
+    diameter = StoredAttribute('diameter')
+    min_vol = StoredAttribute('min_vol')
+
     def __init__(self, name, elevation=0.0, init_level=3.048,
                  min_level=0.0, max_level=6.096, diameter=15.24,
                  min_vol=None, vol_curve=None):
@@ -2566,6 +2790,8 @@ class Reservoir(Node):
     """
     Reservoir class that is inherited from Node
     """
+    base_head = StoredAttribute('base_head')
+
     def __init__(self, name, base_head=0.0, head_pattern_name=None):
         """
         Parameters
@@ -2597,6 +2823,11 @@ class Pipe(Link):
     """
     Pipe class that is inherited from Link
     """
+    length = StoredAttribute('length')
+    diameter = StoredAttribute('diameter')
+    roughness = StoredAttribute('roughness')
+    minor_loss = StoredAttribute('minor_loss')
+
     def __init__(self, name, start_node_name, end_node_name, length=304.8,
                  diameter=0.3048, roughness=100, minor_loss=0.00, status='OPEN', check_valve_flag=False):
         """
@@ -2798,6 +3029,9 @@ class Valve(Link):
     """
     Valve class that is inherited from Link
     """
+    diameter = StoredAttribute('diameter')
+    minor_loss = StoredAttribute('minor_loss')
+
     def __init__(self, name, start_node_name, end_node_name,
                  diameter=0.3048, valve_type='PRV', minor_loss=0.0, setting=0.0):
         """
@@ -1,6 +1,9 @@
+from AttributeStore import AttributeStore, StoredAttribute
+from ScenarioOverlay import ScenarioOverlay
 from WaterNetworkModel import WaterNetworkModel, Node, Link, Junction, Reservoir, Tank, Pipe, Pump, Valve, Curve, LinkStatus, WaterNetworkOptions, LinkTypes, NodeTypes
 from ParseWaterNetwork import ParseWaterNetwork
 from NetworkControls import ControlAction, TimeControl, ConditionalControl, _CheckValveHeadControl, MultiConditionalControl, _PRVControl
 from ControlLogger import ControlLogger
 from draw_graph import draw_graph, custom_colormap
 from WntrMultiDiGraph import WntrMultiDiGraph
+from snapshot import save_snapshot, load_snapshot
@@ -0,0 +1,691 @@
+"""
+Columnar binary snapshots of water network models.
+
+A snapshot stores the attributes of the nodes, links, and curves of a
+WaterNetworkModel as one column per attribute and object type, along with
+the patterns, coordinates, and connectivity, in an uncompressed NumPy .npz
+file. The columns are packed into one array per data type (float, int,
+bool, and string; each distinct string is stored once), so loading a
+snapshot reads a handful of arrays regardless of the size of the network.
+Lists, tuples, and dictionaries are stored as columns of their lengths and
+of their items, and attributes that refer to nodes, links, or curves are
+stored as the names of the objects. The columns of the attribute stores of
+the model (see AttributeStore) are stored as separate arrays of the .npz
+file, which load_snapshot can memory-map instead of reading. The layout of
+the snapshot (class names, attribute names, and the position of each
+column) is stored as JSON.
+
+Only the controls, and any attribute that cannot be stored in columns as
+described above, are pickled. Loading a snapshot unpickles them and imports
+the classes named in the snapshot, which can execute arbitrary code: only
+load snapshots from trusted sources.
+
+The dictionaries of the model and the graph are rebuilt in the same
+iteration order as the original model, so simulating a loaded model gives
+exactly the same results as simulating an unpickled copy.
+"""
+import numpy as np
+import cPickle as pickle
+from cStringIO import StringIO
+import json
+import struct
+import sys
+import gc
+import zipfile
+from WaterNetworkModel import WaterNetworkOptions, Node, Link, Curve
+from AttributeStore import AttributeStore, _none_values
+
+import logging
+logger = logging.getLogger('wntr.network.snapshot')
+
+SNAPSHOT_VERSION = 4
+
+# Attributes of WaterNetworkModel that are stored in columns or rebuilt
+_columnar_model_attributes = set(['_nodes', '_links', '_junctions', '_tanks', '_reservoirs', '_pipes', '_pumps',
+                                  '_valves', '_patterns', '_curves', '_control_dict', '_graph', 'options',
+                                  '_node_attributes', '_link_attributes'])
+
+# Dictionaries of the model that hold nodes or links
+_node_dicts = ['_nodes', '_junctions', '_tanks', '_reservoirs']
+_link_dicts = ['_links', '_pipes', '_pumps', '_valves']
+
+# Attribute stores of the model and the prefix of the names of their arrays
+_stores = [('_node_attributes', 'node_store.'), ('_link_attributes', 'link_store.')]
+
+# Types of the columns of an attribute store
+_store_types = {'float': float, 'int': int, 'object': object}
+
+
+def save_snapshot(wn, snapshot_file):
+    """
+    Save a water network model as a binary snapshot.
+
+    Parameters
+    ----------
+    wn : WaterNetworkModel
+        The water network model to save
+    snapshot_file : string or file-like object
+        Name of the snapshot file (the name is used as given; no extension
+        is added) or an open file-like object
+    """
+    writer = _SnapshotWriter(wn)
+    meta = {'version': SNAPSHOT_VERSION}
+
+    meta['model'] = writer.record(dict((key, value) for key, value in wn.__dict__.iteritems()
+                                       if key not in _columnar_model_attributes))
+    meta['model_class'] = _class_path(type(wn))
+    meta['options'] = writer.record(wn.options.__dict__)
+    meta['attribute_stores'] = [(key, _save_store(getattr(wn, key), prefix, writer)) for key, prefix in _stores]
+
+    meta['curves'] = _save_table(wn._curves, wn._curves.keys(), writer)
+    meta['nodes'] = _save_grouped_tables(wn._nodes, writer)
+    meta['links'] = _save_grouped_tables(wn._links, writer)
+    # The keys of each dictionary are stored in iteration order, so that the
+    # dictionaries are rebuilt by inserting the keys in the same order (as
+    # pickle does)
+    meta['node_dicts'] = [(key, writer.column(getattr(wn, key).keys())) for key in _node_dicts]
+    meta['link_dicts'] = [(key, writer.column(getattr(wn, key).keys())) for key in _link_dicts]
+
+    meta['patterns'] = writer.column([wn._patterns])
+    meta['graph'] = _save_graph(wn._graph, writer)
+    meta['controls'] = writer.column([wn._control_dict])
+
+    arrays = writer.get_arrays()
+    arrays['meta'] = np.frombuffer(json.dumps(meta), dtype=np.uint8)
+
+    if isinstance(snapshot_file, basestring):
+        f = open(snapshot_file, 'wb')
+        try:
+            np.savez(f, **arrays)
+        finally:
+            f.close()
+    else:
+        np.savez(snapshot_file, **arrays)
+
+
+def load_snapshot(snapshot_file, mmap_mode=None):
+    """
+    Load a water network model from a binary snapshot created with
+    save_snapshot. Snapshots can contain pickled data, so only load
+    snapshots from trusted sources.
+
+    Parameters
+    ----------
+    snapshot_file : string or file-like object
+        Name of the snapshot file or an open file-like object
+    mmap_mode : None, 'r', 'r+', or 'c'
+        If not None, the columns of the attribute stores of the model are
+        memory-mapped from the snapshot file with this mode (see
+        numpy.memmap) instead of being read. With 'r' the stored attributes
+        of the nodes and links cannot be changed (so the model cannot be
+        simulated), and with 'r+' changes are written to the snapshot file;
+        'c' (copy-on-write) only reads the parts of the columns that are
+        used and keeps the changes in memory. Requires the name of a file.
+
+    Returns
+    -------
+    wn : WaterNetworkModel
+    """
+    if mmap_mode is not None and not isinstance(snapshot_file, basestring):
+        raise ValueError('Memory-mapping a snapshot requires the name of the snapshot file.')
+    data = np.load(snapshot_file)
+    # Rebuilding creates many objects without creating any garbage; the
+    # cyclic garbage collector would otherwise run repeatedly during the load.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        try:
+            meta = _from_json(json.loads(data['meta'].tostring()))
+        except ValueError:
+            meta = {}
+        if meta.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Snapshot format version {0} is not supported (expected version {1}).'
+                             .format(meta.get('version'), SNAPSHOT_VERSION))
+
+        model_class = _find_class(meta['model_class'])
+        wn = model_class.__new__(model_class)
+        reader = _SnapshotReader(wn, data)
+        wn.options = WaterNetworkOptions.__new__(WaterNetworkOptions)
+        wn.options.__dict__.update(reader.record(meta['options']))
+        if mmap_mode is None:
+            arrays = data
+        else:
+            arrays = _memmap_arrays(snapshot_file, [store['prefix'] + name for key, store in meta['attribute_stores']
+                                                    for name in store['columns']], mmap_mode)
+        for key, store in meta['attribute_stores']:
+            setattr(wn, key, _load_store(store, reader, arrays))
+
+        wn._curves = {}
+        _load_table(meta['curves'], reader, wn._curves)
+
+        for tables, dicts in [(meta['nodes'], meta['node_dicts']), (meta['links'], meta['link_dicts'])]:
+            objects = {}
+            for table in tables:
+                _load_table(table, reader, objects)
+            for key, column in dicts:
+                ordered_objects = {}
+                for name in reader.column(column):
+                    ordered_objects[name] = objects[name]
+                setattr(wn, key, ordered_objects)
+
+        wn._patterns = reader.column(meta['patterns'])[0]
+        wn._graph = _load_graph(meta['graph'], reader)
+        wn._control_dict = reader.column(meta['controls'])[0]
+        wn.__dict__.update(reader.record(meta['model']))
+    finally:
+        if gc_enabled:
+            gc.enable()
+        data.close()
+    return wn
+
+
+def _class_path(cls):
+    return (cls.__module__, cls.__name__)
+
+
+def _find_class(class_path):
+    module_name, class_name = class_path
+    __import__(module_name)
+    return getattr(sys.modules[module_name], class_name)
+
+
+def _from_json(obj):
+    """
+    Convert the unicode strings returned by json.loads to str.
+    """
+    if isinstance(obj, unicode):
+        return obj.encode('utf-8')
+    elif isinstance(obj, list):
+        return [_from_json(value) for value in obj]
+    elif isinstance(obj, dict):
+        return dict((_from_json(key), _from_json(value)) for key, value in obj.iteritems())
+    return obj
+
+
+def _memmap_arrays(filename, names, mmap_mode):
+    """
+    Memory-map arrays of an uncompressed .npz file (np.load only memory-maps
+    .npy files). The data of each array follows the local header of its
+    member of the zip file and the .npy header.
+    """
+    zf = zipfile.ZipFile(filename)
+    try:
+        members = dict((info.filename, info) for info in zf.infolist())
+    finally:
+        zf.close()
+    arrays = {}
+    f = open(filename, 'rb')
+    try:
+        for name in names:
+            info = members[name + '.npy']
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError('Array {0} of the snapshot is compressed and cannot be memory-mapped.'.format(name))
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if np.prod(shape) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(filename, dtype=dtype, mode=mmap_mode, offset=f.tell(), shape=shape,
+                                         order='F' if fortran_order else 'C')
+    finally:
+        f.close()
+    return arrays
+
+
+class _Missing(object):
+    """
+    Placeholder for attributes that are not set on every object of a table.
+    """
+    pass
+
+_missing = _Missing()
+
+
+class _SnapshotWriter(object):
+    """
+    Collects the columns and arrays of a snapshot. Objects that cannot be
+    stored in columns are pickled, replacing the model and its nodes, links,
+    and curves by references.
+    """
+    def __init__(self, wn):
+        self._wn = wn
+        self._pools = {'float': [], 'int': [], 'bool': [], 'str': []}
+        # Each distinct string is stored once; the str pool holds indices into self._strings
+        self._strings = []
+        self._string_ids = {}
+        self._pickles = []
+        self._pickles_size = 0
+        # Arrays stored in the snapshot as they are
+        self.arrays = {}
+
+    def _persistent_id(self, obj):
+        wn = self._wn
+        if obj is wn:
+            return 'model'
+        elif obj is _missing:
+            return 'missing'
+        elif isinstance(obj, Node):
+            if wn._nodes.get(obj._name) is obj:
+                return 'node:' + obj._name
+        elif isinstance(obj, Link):
+            if wn._links.get(obj._link_name) is obj:
+                return 'link:' + obj._link_name
+        elif isinstance(obj, Curve):
+            if wn._curves.get(obj.name) is obj:
+                return 'curve:' + obj.name
+        elif obj is wn.options:
+            return 'options'
+        elif obj is wn._node_attributes:
+            return 'node_attributes'
+        elif obj is wn._link_attributes:
+            return 'link_attributes'
+        return None
+
+    def _pickle(self, obj):
+        f = StringIO()
+        p = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+        p.persistent_id = self._persistent_id
+        p.dump(obj)
+        data = f.getvalue()
+        start = self._pickles_size
+        self._pickles.append(data)
+        self._pickles_size += len(data)
+        return ('pickle', (start, self._pickles_size))
+
+    def _append(self, kind, values):
+        pool = self._pools[kind]
+        start = len(pool)
+        pool.extend(values)
+        return start, len(pool)
+
+    def _none_flags(self, values):
+        if None in values:
+            return self._append('bool', [value is None for value in values])
+        return None
+
+    def column(self, values):
+        """
+        Store a list of values in the pool of their type if they all have the
+        same type (or are None). Lists, tuples, and dictionaries are stored as
+        columns of their lengths and items, and references to the nodes,
+        links, and curves of the model as their names. A list holding the
+        same referenced object (e.g., the attribute store of the model) is
+        stored as a single reference. Other values are pickled.
+
+        Returns
+        -------
+        column : tuple
+            (kind, (start, stop) in the pool, (start, stop) of the None flags in the
+            bool pool or None), ('none', number of values), ('ref', reference,
+            number of values), ('refs', column of references), ('list', column
+            of lengths, column of items), ('tuple', number of values, columns of
+            items, None flags), ('dict', column of lengths, column of keys,
+            column of items), or ('pickle', (start, stop) in the pickles)
+        """
+        if len(values) == 0:
+            return ('none', 0)
+        if all(value is values[0] for value in values):
+            pid = self._persistent_id(values[0])
+            if pid is not None:
+                return ('ref', self._string_id(pid), len(values))
+        types = set(type(value) for value in values if value is not None)
+        if len(types) == 0:
+            return ('none', len(values))
+
+        if len(types) == 1:
+            value_type = types.pop()
+            if value_type == list:
+                return ('list', self.column([None if value is None else len(value) for value in values]),
+                        self.column([item for value in values if value is not None for item in value]))
+            elif value_type == dict:
+                dicts = [value for value in values if value is not None]
+                return ('dict', self.column([None if value is None else len(value) for value in values]),
+                        self.column([key for value in dicts for key in value.iterkeys()]),
+                        self.column([item for value in dicts for item in value.itervalues()]))
+            elif value_type == tuple and len(set(len(value) for value in values if value is not None)) == 1:
+                length = len(next(value for value in values if value is not None))
+                return ('tuple', len(values),
+                        [self.column([None if value is None else value[i] for value in values])
+                         for i in range(length)],
+                        self._none_flags(values))
+            elif value_type in _pool_kinds:
+                kind, default = _pool_kinds[value_type]
+                none_flags = self._none_flags(values)
+                if none_flags is not None:
+                    values = [default if value is None else value for value in values]
+                if kind == 'str':
+                    values = [self._string_id(value) for value in values]
+                return (kind, self._append(kind, values), none_flags)
+
+        pids = [None if value is None else self._persistent_id(value) for value in values]
+        if all(pid is not None for pid, value in zip(pids, values) if value is not None):
+            return ('refs', self.column(pids))
+        return self._pickle(values)
+
+    def record(self, d):
+        """
+        Store the values of a dictionary in separate columns (the values need
+        not have the same type).
+        """
+        keys = d.keys()
+        return ('record', self.column(keys), [self.column([d[key]]) for key in keys])
+
+    def _string_id(self, value):
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._string_ids[value] = string_id
+        return string_id
+
+    def get_arrays(self):
+        arrays = dict(self.arrays)
+        arrays.update({'float': np.array(self._pools['float'], dtype=np.float64),
+                       'int': np.array(self._pools['int'], dtype=np.int64),
+                       'bool': np.array(self._pools['bool'], dtype=bool),
+                       'str': np.array(self._pools['str'], dtype=np.int64),
+                       'strings': np.frombuffer(''.join(self._strings), dtype=np.uint8),
+                       'string_offsets': np.cumsum([0] + [len(value) for value in self._strings], dtype=np.int64),
+                       'pickles': np.frombuffer(''.join(self._pickles), dtype=np.uint8)})
+        return arrays
+
+# Pool and None placeholder of the values of each type
+_pool_kinds = {bool: ('bool', False), int: ('int', 0), float: ('float', 0.0), str: ('str', '')}
+
+
+class _SnapshotReader(object):
+    """
+    Reads the columns of a snapshot and unpickles objects pickled by
+    _SnapshotWriter, resolving the references with the (partially) rebuilt
+    model.
+    """
+    def __init__(self, wn, data):
+        self._wn = wn
+        self._data = data
+        self._pools = {}
+
+    def _persistent_load(self, pid):
+        wn = self._wn
+        if pid == 'model':
+            return wn
+        elif pid == 'missing':
+            return _missing
+        elif pid == 'options':
+            return wn.options
+        elif pid == 'node_attributes':
+            return wn._node_attributes
+        elif pid == 'link_attributes':
+            return wn._link_attributes
+        kind, name = pid.split(':', 1)
+        if kind == 'node':
+            return wn._nodes[name]
+        elif kind == 'link':
+            return wn._links[name]
+        elif kind == 'curve':
+            return wn._curves[name]
+        raise pickle.UnpicklingError('Unknown reference in snapshot: ' + pid)
+
+    def _unpickle(self, span):
+        start, stop = span
+        u = pickle.Unpickler(StringIO(self._pool('pickles')[start:stop]))
+        u.persistent_load = self._persistent_load
+        return u.load()
+
+    def _pool(self, kind):
+        if kind not in self._pools:
+            if kind == 'strings':
+                data = self._data['strings'].tostring()
+                offsets = self._data['string_offsets'].tolist()
+                self._pools[kind] = [data[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+            elif kind == 'pickles':
+                self._pools[kind] = self._data['pickles'].tostring()
+            else:
+                self._pools[kind] = self._data[kind].tolist()
+        return self._pools[kind]
+
+    def _set_none(self, values, none_flags):
+        if none_flags is not None:
+            start, stop = none_flags
+            for i, is_none in enumerate(self._pool('bool')[start:stop]):
+                if is_none:
+                    values[i] = None
+        return values
+
+    def column(self, column):
+        kind = column[0]
+        if kind == 'none':
+            return [None]*column[1]
+        elif kind == 'ref':
+            return [self._persistent_load(self._pool('strings')[column[1]])]*column[2]
+        elif kind == 'refs':
+            return [None if pid is None else self._persistent_load(pid) for pid in self.column(column[1])]
+        elif kind == 'pickle':
+            return self._unpickle(column[1])
+        elif kind == 'list':
+            items = self.column(column[2])
+            values = []
+            start = 0
+            for length in self.column(column[1]):
+                if length is None:
+                    values.append(None)
+                else:
+                    values.append(items[start:start+length])
+                    start += length
+            return values
+        elif kind == 'dict':
+            keys = self.column(column[2])
+            items = self.column(column[3])
+            values = []
+            start = 0
+            for length in self.column(column[1]):
+                if length is None:
+                    values.append(None)
+                else:
+                    # Inserted in the order of the saved dictionary
+                    value = {}
+                    for i in xrange(start, start+length):
+                        value[keys[i]] = items[i]
+                    values.append(value)
+                    start += length
+            return values
+        elif kind == 'tuple':
+            if len(column[2]) == 0:
+                values = [()]*column[1]
+            else:
+                values = zip(*[self.column(item_column) for item_column in column[2]])
+            return self._set_none(values, column[3])
+        start, stop = column[1]
+        values = self._pool(kind)[start:stop]
+        if kind == 'str':
+            values = map(self._pool('strings').__getitem__, values)
+        return self._set_none(values, column[2])
+
+    def record(self, record):
+        return dict(zip(self.column(record[1]), [self.column(column)[0] for column in record[2]]))
+
+
+def _save_store(store, prefix, writer):
+    """
+    Store each column of an attribute store as a separate array (except the
+    names of the objects, which are stored in the string pool).
+    """
+    columns = sorted(name for name in store._columns if name != '_name')
+    for name in columns:
+        writer.arrays[prefix + name] = store._columns[name]
+    return {'prefix': prefix,
+            'columns': columns,
+            'dtypes': dict((name, dtype.__name__) for name, dtype in store._dtypes.iteritems()),
+            'names': writer.column(store._columns['_name'].tolist()),
+            'capacity': store._capacity,
+            'num_ids': store._num_ids,
+            'free_ids': store._free_ids,
+            'classes': [_class_path(cls) for cls in store._classes],
+            'indexes': sorted(store._sorted_indexes)}
+
+
+def _load_store(store, reader, arrays):
+    """
+    Rebuild an attribute store (without calling __init__) from the arrays of
+    its columns.
+    """
+    dtypes = dict((name, _store_types[dtype]) for name, dtype in store['dtypes'].iteritems())
+    new_store = AttributeStore.__new__(AttributeStore)
+    new_store._dtypes = dtypes
+    new_store._none_values = dict((name, _none_values[dtype]) for name, dtype in dtypes.iteritems())
+    new_store._columns = dict((name, arrays[store['prefix'] + name]) for name in store['columns'])
+    new_store._columns['_name'] = np.array(reader.column(store['names']), dtype=object)
+    new_store._capacity = store['capacity']
+    new_store._num_ids = store['num_ids']
+    new_store._free_ids = store['free_ids']
+    new_store._classes = [_find_class(class_path) for class_path in store['classes']]
+    new_store._sorted_indexes = dict.fromkeys(store['indexes'])
+    return new_store
+
+
+def _save_grouped_tables(objects, writer):
+    """
+    Store the objects of each class in a separate table.
+    """
+    groups = {}
+    for name, obj in objects.iteritems():
+        groups.setdefault(_class_path(type(obj)), []).append(name)
+    return [_save_table(objects, names, writer) for class_path, names in sorted(groups.items())]
+
+
+def _save_table(objects, keys, writer):
+    """
+    Store the attributes of objects[key] for each key (all of the same class)
+    in one column per attribute. The keys are stored in the order given, so
+    that the rebuilt dictionaries are filled in the same order.
+
+    Returns
+    -------
+    table : dict
+        The class, the dictionary keys and the description of each column
+    """
+    table = {'keys': writer.column(keys), 'class': None, 'columns': []}
+    if len(keys) == 0:
+        return table
+    table['class'] = _class_path(type(objects[keys[0]]))
+    attributes = set()
+    for key in keys:
+        attributes.update(objects[key].__dict__.iterkeys())
+    for attribute in sorted(attributes):
+        values = [objects[key].__dict__.get(attribute, _missing) for key in keys]
+        table['columns'].append((attribute, writer.column(values)))
+    return table
+
+
+def _load_table(table, reader, objects):
+    """
+    Rebuild the objects of a table (without calling __init__) and add them
+    to the objects dictionary.
+    """
+    keys = reader.column(table['keys'])
+    if len(keys) == 0:
+        return
+    cls = _find_class(table['class'])
+    attributes = []
+    columns = []
+    partial = []
+    for attribute, column in table['columns']:
+        values = reader.column(column)
+        # Only references and pickled columns can hold the placeholder
+        if column[0] in ('refs', 'pickle') and any(value is _missing for value in values):
+            partial.append((attribute, values))
+        else:
+            attributes.append(attribute)
+            columns.append(values)
+    new = cls.__new__
+    for key, row in zip(keys, zip(*columns)):
+        obj = new(cls)
+        obj.__dict__ = dict(zip(attributes, row))
+        objects[key] = obj
+    for attribute, values in partial:
+        for key, value in zip(keys, values):
+            if value is not _missing:
+                objects[key].__dict__[attribute] = value
+
+
+def _save_graph(G, writer):
+    """
+    Store the nodes and edges of the graph with their 'type' and 'pos'
+    attributes in columns; other attributes are stored in dictionaries.
+    """
+    graph = {'class': _class_path(type(G)), 'graph': writer.column([G.graph])}
+
+    nodes = G.nodes(data=True)
+    graph['node_names'] = writer.column([node for node, attr in nodes])
+    graph['node_types'] = writer.column([attr.get('type', None) for node, attr in nodes])
+    graph['pos'] = writer.column([attr.get('pos', None) for node, attr in nodes])
+    extra = {}
+    for node, attr in nodes:
+        node_extra = dict((key, value) for key, value in attr.iteritems() if key not in ('type', 'pos'))
+        if len(node_extra) > 0:
+            extra[node] = node_extra
+    graph['node_extra'] = writer.column([extra])
+
+    edges = G.edges(keys=True, data=True)
+    graph['edge_start'] = writer.column([u for u, v, k, attr in edges])
+    graph['edge_end'] = writer.column([v for u, v, k, attr in edges])
+    graph['edge_keys'] = writer.column([k for u, v, k, attr in edges])
+    graph['edge_types'] = writer.column([attr.get('type', None) for u, v, k, attr in edges])
+    extra = {}
+    for u, v, k, attr in edges:
+        edge_extra = dict((key, value) for key, value in attr.iteritems() if key != 'type')
+        if len(edge_extra) > 0:
+            extra[(u, v, k)] = edge_extra
+    graph['edge_extra'] = writer.column([extra])
+    # The order of the predecessors of each node (which determines the order of
+    # in_edges) is not the order of the edges above
+    pred_order = [(v, u) for v in G.pred for u in G.pred[v]]
+    graph['pred_end'] = writer.column([v for v, u in pred_order])
+    graph['pred_start'] = writer.column([u for v, u in pred_order])
+    return graph
+
+
+def _load_graph(graph, reader):
+    G = _find_class(graph['class'])()
+    G.graph = reader.column(graph['graph'])[0]
+
+    names = reader.column(graph['node_names'])
+    types = reader.column(graph['node_types'])
+    pos = reader.column(graph['pos'])
+    # The node, successor, and predecessor dictionaries of the graph are filled
+    # directly, which is much faster than add_nodes_from and add_edges_from.
+    node_dict = G.node
+    succ = G.succ
+    pred = G.pred
+    extra = reader.column(graph['node_extra'])[0]
+    for name, node_type, node_pos in zip(names, types, pos):
+        attr = {}
+        if node_type is not None:
+            attr['type'] = node_type
+        if node_pos is not None:
+            attr['pos'] = node_pos
+        if name in extra:
+            attr.update(extra[name])
+        node_dict[name] = attr
+        succ[name] = {}
+        pred[name] = {}
+
+    extra = reader.column(graph['edge_extra'])[0]
+    for u, v, k, edge_type in zip(reader.column(graph['edge_start']), reader.column(graph['edge_end']),
+                                  reader.column(graph['edge_keys']), reader.column(graph['edge_types'])):
+        attr = {}
+        if edge_type is not None:
+            attr['type'] = edge_type
+        if (u, v, k) in extra:
+            attr.update(extra[(u, v, k)])
+        if v in succ[u]:
+            succ[u][v][k] = attr
+        else:
+            succ[u][v] = {k: attr}
+    for v, u in zip(reader.column(graph['pred_end']), reader.column(graph['pred_start'])):
+        pred[v][u] = succ[u][v]
+    return G
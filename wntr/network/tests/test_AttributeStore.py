@@ -0,0 +1,71 @@
+from nose.tools import *
+import copy
+import cPickle as pickle
+import numpy as np
+import wntr
+
+def _simple_network():
+    wn = wntr.network.WaterNetworkModel()
+    wn.add_reservoir('r1', base_head=30.0)
+    wn.add_junction('j1', base_demand=0.01, elevation=10.0)
+    wn.add_junction('j2', base_demand=0.02, elevation=5.0)
+    wn.add_pipe('p1', 'r1', 'j1')
+    wn.add_pipe('p2', 'j1', 'j2', status='CLOSED')
+    return wn
+
+def test_attributes_stored_in_arrays():
+    wn = _simple_network()
+    j2 = wn.get_node('j2')
+    assert_equal(j2.elevation, 5.0)
+    assert_equal(j2.expected_demand, 0.02)
+    assert_true(j2.head is None)
+    assert_false('head' in j2.__dict__)
+    assert_equal(wn._node_attributes['elevation'][j2._store_id], 5.0)
+
+    j2.head = 12.5
+    assert_equal(wn._node_attributes['head'][j2._store_id], 12.5)
+    wn._node_attributes['head'][j2._store_id] = 13.0
+    assert_equal(j2.head, 13.0)
+    j2.head = None
+    assert_true(j2.head is None)
+
+    p2 = wn.get_link('p2')
+    assert_equal(p2.status, wntr.network.LinkStatus.closed)
+    p2.status = wntr.network.LinkStatus.opened
+    assert_equal(wn._link_attributes['status'][p2._store_id], wntr.network.LinkStatus.opened)
+    assert_false(hasattr(wn.get_node('r1'), 'elevation'))
+
+def test_remove_and_add():
+    wn = _simple_network()
+    j2 = wn.get_node('j2')
+    j2.head = 7.0
+    store_id = j2._store_id
+    wn.remove_link('p2')
+    wn.remove_node('j2')
+    # removed objects keep their values
+    assert_equal(j2.head, 7.0)
+    assert_equal(j2.elevation, 5.0)
+    assert_true(np.isnan(wn._node_attributes['head'][store_id]))
+
+    # the id is reused
+    wn.add_junction('j3', elevation=2.0)
+    j3 = wn.get_node('j3')
+    assert_equal(j3._store_id, store_id)
+    assert_true(j3.head is None)
+    assert_equal(j3.elevation, 2.0)
+
+def test_many_nodes():
+    wn = wntr.network.WaterNetworkModel()
+    for i in range(100):
+        wn.add_junction('j'+str(i), elevation=float(i))
+    for i in range(100):
+        assert_equal(wn.get_node('j'+str(i)).elevation, float(i))
+
+def test_copies_are_independent():
+    wn = _simple_network()
+    wn.get_node('j1').head = 20.0
+    for wn2 in [copy.deepcopy(wn), pickle.loads(pickle.dumps(wn, pickle.HIGHEST_PROTOCOL))]:
+        assert_equal(wn2.get_node('j1').head, 20.0)
+        wn2.get_node('j1').head = 21.0
+        assert_equal(wn.get_node('j1').head, 20.0)
+        assert_true(wn2.get_node('j1')._store is wn2._node_attributes)
@@ -0,0 +1,107 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+import warnings
+import wntr
+
+testdir = dirname(abspath(str(__file__)))
+datadir = join(testdir,'..','..','..','examples','networks')
+
+def _load_network():
+    inp_file = join(datadir,'Net3.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    wn.options.duration = 6*3600
+    return wn
+
+def _apply_changes(wn):
+    wn.split_pipe_with_junction('123', '123_A', '123_B', 'leak1')
+    wn.get_node('leak1').add_leak(wn, area=0.05, start_time=3600, end_time=7200)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        wn.remove_link('105')
+    wn.get_link('20').diameter = 2.0
+    wn.get_node('10').elevation = 200.0
+    wn.options.duration = 3600
+
+def test_discard_restores_network():
+    wn1 = _load_network()
+    wn2 = _load_network()
+    results1 = wntr.sim.WNTRSimulator(wn1).run_sim()
+
+    overlay = wn2.overlay()
+    _apply_changes(wn2)
+    wntr.sim.WNTRSimulator(wn2, pressure_driven=True).run_sim()
+    overlay.discard()
+    assert_false(overlay.is_active())
+
+    for name in ['_nodes', '_links', '_junctions', '_pipes', '_control_dict', '_patterns', '_curves']:
+        assert_equal(getattr(wn1, name).keys(), getattr(wn2, name).keys())
+    assert_equal(wn1._check_valves, wn2._check_valves)
+    assert_equal(wn1._graph.edges(keys=True, data=True), wn2._graph.edges(keys=True, data=True))
+    assert_equal(wn1._graph.pred, wn2._graph.pred)
+    assert_equal(wn1.options.__dict__, wn2.options.__dict__)
+    assert_equal(wn2.get_link('20').diameter, wn1.get_link('20').diameter)
+    assert_equal(wn2.get_node('10').elevation, wn1.get_node('10').elevation)
+    assert_true(wn2.get_node('10').head is None)
+
+    # Simulating the restored network gives exactly the same results
+    results2 = wntr.sim.WNTRSimulator(wn2).run_sim()
+    assert_true(results1.node.equals(results2.node))
+    assert_true(results1.link.equals(results2.link))
+
+def test_introspection():
+    wn = _load_network()
+    overlay = wn.overlay()
+    _apply_changes(wn)
+    assert_equal(overlay.added_nodes(), ['leak1'])
+    assert_equal(sorted(overlay.added_links()), ['123_A', '123_B'])
+    assert_equal(sorted(overlay.removed_links()), ['105', '123'])
+    assert_equal(overlay.removed_nodes(), [])
+    assert_equal(sorted(overlay.added_controls()), ['junctionleak1end_leak_control',
+                                                    'junctionleak1start_leak_control'])
+    assert_equal(overlay.modified_links(), ['20'])
+    assert_true('10' in overlay.modified_nodes())
+    assert_false('leak1' in overlay.modified_nodes())
+    overlay.discard()
+
+def test_commit_and_context_manager():
+    wn = _load_network()
+    overlay = wn.overlay()
+    wn.get_link('20').diameter = 2.0
+    overlay.commit()
+    assert_equal(wn.get_link('20').diameter, 2.0)
+    assert_raises(RuntimeError, overlay.discard)
+
+    with wn.overlay() as overlay:
+        wn.add_junction('new_junction', elevation=10.0)
+        assert_raises(RuntimeError, wn.overlay)
+    assert_false(overlay.is_active())
+    assert_false('new_junction' in wn._nodes)
+    assert_false('new_junction' in wn._graph.node)
+    # The overlay of a network does not record changes to other networks
+    wn_other = _load_network()
+    with wn.overlay():
+        wn_other.get_link('20').diameter = 3.0
+    assert_equal(wn_other.get_link('20').diameter, 3.0)
+
+def test_overlays_in_threads():
+    import threading
+    networks = [_load_network() for i in range(2)]
+    errors = []
+    def change_and_discard(wn):
+        try:
+            for i in range(200):
+                with wn.overlay():
+                    wn.get_link('20').diameter = 2.0
+                    wn.get_node('10').elevation = 200.0
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=change_and_discard, args=(wn,)) for wn in networks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert_equal(errors, [])
+    expected = _load_network()
+    for wn in networks:
+        assert_equal(wn.get_link('20').diameter, expected.get_link('20').diameter)
+        assert_equal(wn.get_node('10').elevation, expected.get_node('10').elevation)
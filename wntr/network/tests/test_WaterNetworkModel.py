@@ -1,6 +1,9 @@
 from nose.tools import *
+import os
 from os.path import abspath, dirname, join
 import numpy as np
+import gzip
+from StringIO import StringIO
 #from sympy.physics import units
 import wntr
 
@@ -22,11 +25,11 @@ def test_Net1():
     G = wn.get_graph_deep_copy()
     
     node = G.node
-    elevation = wn.query_node_attribute('elevation')
-    base_demand = wn.query_node_attribute('base_demand')
+    elevation = dict(wn.query_node_attribute('elevation'))
+    base_demand = dict(wn.query_node_attribute('base_demand'))
     edge = G.edge
-    diameter = wn.query_link_attribute('diameter')
-    length = wn.query_link_attribute('length')
+    diameter = dict(wn.query_link_attribute('diameter'))
+    length = dict(wn.query_link_attribute('length'))
 
     # Data from the INP file, converted using flowunits
     flowunits = epanet_unit_id[wn.options.units]
@@ -129,7 +132,7 @@ def test_query_node_attribute():
     
     expected_nodes = ['13', '22', '23']
     
-    assert_list_equal(nodes.keys(), expected_nodes)
+    assert_list_equal(list(nodes.index), expected_nodes)
 
 def test_query_pipe_attribute():
     inp_file = join(net1dir,'Net1.inp') 
@@ -143,7 +146,7 @@ def test_query_pipe_attribute():
     
     expected_pipes = ['10']
     
-    assert_list_equal(pipes.keys(), expected_pipes)
+    assert_list_equal(list(pipes.index), expected_pipes)
 
 def test_nzd_nodes():
     inp_file = join(net1dir,'Net1.inp') 
@@ -154,9 +157,100 @@ def test_nzd_nodes():
     
     nzd_nodes = wn.query_node_attribute('base_demand', np.greater, 0.0)
     
-    expected_nodes = ['11', '13', '12', '21', '22', '23', '32', '31']
+    expected_nodes = ['11', '12', '13', '21', '22', '23', '31', '32']
     
-    assert_list_equal(nzd_nodes.keys(), expected_nodes)
+    assert_list_equal(list(nzd_nodes.index), expected_nodes)
+
+def test_query_compound_conditions():
+    inp_file = join(net1dir,'Net1.inp') 
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    
+    pipes = wn.query_link_attribute('diameter', np.greater, 0.2, link_type=wntr.network.Pipe,
+                                    conditions=[('diameter', np.less, 0.3), ('length', np.greater, 1600)])
+    expected = dict((name, pipe.diameter) for name, pipe in wn.links(wntr.network.Pipe)
+                    if 0.2 < pipe.diameter < 0.3 and pipe.length > 1600)
+    assert_dict_equal(dict(pipes), expected)
+    
+    # Conditions on attributes that are not stored in arrays
+    pipes = wn.query_link_attribute('length', conditions=[('cv', np.equal, False)])
+    assert_equal(len(pipes), wn.num_pipes())
+    pumps = wn.query_link_attribute('info_type', link_type=wntr.network.Pump)
+    assert_dict_equal(dict(pumps), {'9': 'HEAD'})
+
+    tanks = wn.query_node_attribute('max_level', np.greater, 0, node_type=wntr.network.Tank)
+    assert_list_equal(list(tanks.index), ['2'])
+    
+def test_query_with_index():
+    inp_file = join(net1dir,'Net1.inp') 
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    
+    queries = [(np.greater, 200.0), (np.greater_equal, 211.836), (np.less, 211.836),
+               (np.less_equal, 211.836), (np.equal, 211.836), (np.not_equal, 211.836)]
+    expected = [wn.query_node_attribute('elevation', operation, value) for operation, value in queries]
+    wn.create_node_attribute_index('elevation')
+    for (operation, value), result in zip(queries, expected):
+        assert_true(wn.query_node_attribute('elevation', operation, value).equals(result))
+    
+    # The index follows changes of the attribute
+    wn.get_node('10').elevation = 100.0
+    assert_false('10' in wn.query_node_attribute('elevation', np.greater, 200.0).index)
+    wn.add_junction('new', elevation=250.0)
+    assert_true('new' in wn.query_node_attribute('elevation', np.greater, 200.0).index)
+    
+def test_read_inp_file_object():
+    inp_file = join(net1dir,'Net1.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+
+    f = open(inp_file, 'r')
+    wn_file = wntr.network.WaterNetworkModel(f)
+    f.close()
+
+    data = StringIO()
+    gz = gzip.GzipFile(fileobj=data, mode='wb')
+    gz.write(open(inp_file, 'r').read())
+    gz.close()
+    data.seek(0)
+    wn_gzip = wntr.network.WaterNetworkModel(data)
+
+    for wn2 in [wn_file, wn_gzip]:
+        assert_list_equal(sorted(wn2._nodes.keys()), sorted(wn._nodes.keys()))
+        assert_list_equal(sorted(wn2._links.keys()), sorted(wn._links.keys()))
+        assert_list_equal(sorted(wn2._control_dict.keys()), sorted(wn._control_dict.keys()))
+        assert_true(wn2.query_node_attribute('elevation').equals(wn.query_node_attribute('elevation')))
+        assert_true(wn2.query_link_attribute('diameter').equals(wn.query_link_attribute('diameter')))
+        assert_dict_equal(wn2.get_graph_deep_copy().node, wn.get_graph_deep_copy().node)
+        assert_equal(wn2.options.duration, wn.options.duration)
+    assert_equal(wn_file.name, inp_file)
+
+def test_demand_categories():
+    inp_file = join(net1dir,'Net1.inp')
+    inp_text = open(inp_file, 'r').read()
+    demands = '[DEMANDS]\n 10 100 1\n 11 50\n 11 25 1 ;Industrial\n\n'
+    wn = wntr.network.WaterNetworkModel(StringIO(inp_text.replace('[END]', demands+'[END]')))
+    # the demands in [DEMANDS] replace the demands in [JUNCTIONS] (in GPM)
+    junction = wn.get_node('10')
+    assert_almost_equal(junction.base_demand, 100*6.30901964e-05)
+    assert_equal(junction.demand_pattern_name, '1')
+    assert_equal(junction.demand_categories, [])
+    junction = wn.get_node('11')
+    assert_almost_equal(junction.base_demand, 50*6.30901964e-05)
+    assert_true(junction.demand_pattern_name is None)
+    assert_equal(len(junction.demand_categories), 1)
+    assert_almost_equal(junction.demand_categories[0][0], 25*6.30901964e-05)
+    assert_equal(junction.demand_categories[0][1], '1')
+
+    # the demand categories are written to the [DEMANDS] section
+    inp_copy = join(testdir, 'demand_categories_tmp.inp')
+    try:
+        wn.write_inpfile(inp_copy)
+        wn2 = wntr.network.WaterNetworkModel(inp_copy)
+    finally:
+        if os.path.exists(inp_copy):
+            os.remove(inp_copy)
+    junction2 = wn2.get_node('11')
+    assert_almost_equal(junction2.base_demand, junction.base_demand)
+    assert_almost_equal(junction2.demand_categories[0][0], junction.demand_categories[0][0])
+    assert_equal(junction2.demand_categories[0][1], '1')
     
 if __name__ == '__main__':
     test_Net1()
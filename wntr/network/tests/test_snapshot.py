@@ -0,0 +1,120 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+from cStringIO import StringIO
+import tempfile
+import os
+import numpy as np
+import wntr
+from wntr.network.AttributeStore import stored_attribute_names
+
+testdir = dirname(abspath(str(__file__)))
+datadir = join(testdir,'..','..','tests','networks_for_testing')
+net3dir = join(testdir,'..','..','..','examples','networks')
+
+def _save_and_load(wn):
+    f = StringIO()
+    wntr.network.save_snapshot(wn, f)
+    f.seek(0)
+    return wntr.network.load_snapshot(f)
+
+def _attributes(obj):
+    attributes = dict((key, value) for key, value in obj.__dict__.iteritems() if key != '_store')
+    for name in stored_attribute_names(type(obj)):
+        attributes[name] = getattr(obj, name)
+    return attributes
+
+def test_snapshot_attributes():
+    inp_file = join(net3dir,'Net3.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    wn2 = _save_and_load(wn)
+
+    assert_equal(wn2.name, wn.name)
+    assert_dict_equal(wn2.options.__dict__, wn.options.__dict__)
+    assert_dict_equal(wn2._patterns, wn._patterns)
+    assert_list_equal(sorted(wn2.junction_name_list()), sorted(wn.junction_name_list()))
+    assert_list_equal(sorted(wn2.tank_name_list()), sorted(wn.tank_name_list()))
+    assert_list_equal(sorted(wn2.pump_name_list()), sorted(wn.pump_name_list()))
+    assert_equal(wn2.num_nodes(), wn.num_nodes())
+    assert_equal(wn2.num_links(), wn.num_links())
+    for name, node in wn.nodes():
+        node2 = wn2.get_node(name)
+        assert_equal(type(node2), type(node))
+        assert_dict_equal(_attributes(node2), _attributes(node))
+    for name, link in wn.pipes():
+        assert_dict_equal(_attributes(wn2.get_link(name)), _attributes(link))
+    for name, pump in wn.pumps():
+        assert_true(wn2.get_link(name).curve is wn2.get_curve(pump.curve.name))
+    assert_dict_equal(wn2.get_node_coordinates(), wn.get_node_coordinates())
+    assert_list_equal(sorted(wn2._graph.edges(keys=True, data=True)), sorted(wn._graph.edges(keys=True, data=True)))
+
+def test_snapshot_controls():
+    inp_file = join(datadir,'conditional_controls_1.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    wn.get_node('junction1').add_leak(wn, area=0.01, start_time=3600, end_time=7200)
+    wn2 = _save_and_load(wn)
+
+    assert_list_equal(sorted(wn2.control_name_list()), sorted(wn.control_name_list()))
+    for name in wn.control_name_list():
+        control = wn2.get_control(name)
+        target = control._control_action._target_obj_ref
+        if isinstance(target, wntr.network.Node):
+            assert_true(target is wn2.get_node(target.name()))
+        else:
+            assert_true(target is wn2.get_link(target.name()))
+
+    results = wntr.sim.WNTRSimulator(wn).run_sim()
+    results2 = wntr.sim.WNTRSimulator(wn2).run_sim()
+    for name in ['head', 'demand', 'leak_demand']:
+        assert_true(np.allclose(results.node[name].values, results2.node[name][results.node[name].columns].values,
+                                atol=1e-10, equal_nan=True))
+    assert_true(np.allclose(results.link['flowrate'].values,
+                            results2.link['flowrate'][results.link['flowrate'].columns].values, atol=1e-10))
+
+def test_snapshot_file():
+    inp_file = join(net3dir,'Net3.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    fd, filename = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        wntr.network.save_snapshot(wn, filename)
+        assert_true(os.path.exists(filename))
+        wn2 = wntr.network.load_snapshot(filename)
+    finally:
+        os.remove(filename)
+    assert_equal(wn2.num_nodes(), wn.num_nodes())
+
+@raises(ValueError)
+def test_snapshot_version():
+    wn = wntr.network.WaterNetworkModel(join(net3dir,'Net1.inp'))
+    saved_version = wntr.network.snapshot.SNAPSHOT_VERSION
+    f = StringIO()
+    try:
+        wntr.network.snapshot.SNAPSHOT_VERSION = saved_version + 1
+        wntr.network.save_snapshot(wn, f)
+    finally:
+        wntr.network.snapshot.SNAPSHOT_VERSION = saved_version
+    f.seek(0)
+    wntr.network.load_snapshot(f)
+
+def test_snapshot_mmap():
+    inp_file = join(net3dir,'Net3.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    fd, filename = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        wntr.network.save_snapshot(wn, filename)
+        data = np.load(filename)
+        try:
+            assert_true(np.allclose(data['node_store.head'], wn._node_attributes['head'], rtol=0, atol=0, equal_nan=True))
+            assert_true(np.allclose(data['link_store.flow'], wn._link_attributes['flow'], rtol=0, atol=0, equal_nan=True))
+        finally:
+            data.close()
+        wn2 = wntr.network.load_snapshot(filename, mmap_mode='c')
+        assert_true(isinstance(wn2._node_attributes['head'], np.memmap))
+        results = wntr.sim.WNTRSimulator(wn).run_sim()
+        results2 = wntr.sim.WNTRSimulator(wn2).run_sim()
+        del wn2
+    finally:
+        os.remove(filename)
+    assert_true(np.allclose(results.node['head'].values, results2.node['head'][results.node['head'].columns].values,
+                            atol=1e-10))
@@ -19,6 +19,7 @@ tookit ENmethodname functions.
 from toolkit import *
 from future import *
 from epanet2 import ENepanet, EpanetException, ENgetwarning
+from binfile import BinaryOutput, HydraulicsFile
 import os, sys
 from pkg_resources import Requirement, resource_filename
 
@@ -0,0 +1,226 @@
+"""
+Readers for the binary output and hydraulics files of EPANET 2
+"""
+import numpy as np
+
+MAGIC_NUMBER = 516114521
+
+# Size in bytes of the ids and of the title, file name, and chemical strings in the prolog
+_ID_SIZE = 32
+_TITLE_SIZE = 80
+_FILENAME_SIZE = 260
+
+# Order of the results of each reporting period
+NODE_RESULTS = ['demand', 'head', 'pressure', 'quality']
+LINK_RESULTS = ['flowrate', 'velocity', 'headloss', 'quality', 'status', 'setting', 'reaction_rate',
+                'friction_factor']
+
+
+class BinaryOutput(object):
+    """
+    The results of an EPANET simulation read from its binary output file (see ENopen and ENsaveH).
+
+    The results of all reporting periods are read at once. They are in the units of the input file,
+    in the order of the EPANET node and link indices (index i is at position i-1).
+
+    Attributes
+    ----------
+    version : int
+        The version of EPANET that wrote the file (e.g., 20012)
+    node_names : list of strings
+    link_names : list of strings
+    flow_units : int
+        EN_CFS, EN_GPM, ...
+    pressure_units : int
+        0 = psi, 1 = meters, 2 = kPa
+    quality_flag : int
+        EN_NONE, EN_CHEM, EN_AGE, or EN_TRACE
+    report_start : int
+        The time of the first reporting period (in seconds)
+    report_step : int
+        The time between reporting periods (in seconds)
+    duration : int
+        The duration of the simulation (in seconds)
+    num_periods : int
+        The number of reporting periods
+    warning_flag : int
+        1 if EPANET issued warnings during the simulation
+    node : dict
+        {result name: [period x node] numpy array} for each name in NODE_RESULTS
+    link : dict
+        {result name: [period x link] numpy array} for each name in LINK_RESULTS
+    """
+
+    def __init__(self, filename):
+        """
+        Parameters
+        ----------
+        filename : string
+            The name of the binary output file
+        """
+        with open(filename, 'rb') as f:
+            prolog = np.fromfile(f, dtype='<i4', count=15)
+            if len(prolog) < 15 or prolog[0] != MAGIC_NUMBER:
+                raise IOError(filename + ' is not an EPANET binary output file.')
+            self.version = int(prolog[1])
+            (num_nodes, num_tanks, num_links, num_pumps) = prolog[2:6]
+            self.quality_flag = int(prolog[7])
+            self.flow_units = int(prolog[9])
+            self.pressure_units = int(prolog[10])
+            self.report_start = int(prolog[12])
+            self.report_step = int(prolog[13])
+            self.duration = int(prolog[14])
+
+            # The names of the input and report files were added to the prolog in version 2.00.12
+            filename_size = 2*_FILENAME_SIZE if self.version >= 20012 else 0
+            f.seek(3*_TITLE_SIZE + filename_size + 2*_ID_SIZE, 1)
+            self.node_names = self._read_ids(f, num_nodes)
+            self.link_names = self._read_ids(f, num_links)
+
+            # Skip the network data (link nodes and types, tank indices and areas, node elevations, and
+            # link lengths and diameters) and the energy usage of the pumps
+            f.seek(4*(3*num_links + 2*num_tanks + num_nodes + 2*num_links) + 4*(7*num_pumps + 1), 1)
+            results_offset = f.tell()
+
+            f.seek(-12, 2)
+            epilog = np.fromfile(f, dtype='<i4', count=3)
+            if epilog[2] != MAGIC_NUMBER:
+                raise IOError('The EPANET binary output file ' + filename + ' is incomplete.')
+            self.num_periods = int(epilog[0])
+            self.warning_flag = int(epilog[1])
+
+            period_size = len(NODE_RESULTS)*num_nodes + len(LINK_RESULTS)*num_links
+            f.seek(results_offset)
+            results = np.fromfile(f, dtype='<f4', count=self.num_periods*period_size)
+            results = results.reshape((self.num_periods, period_size)).astype(float)
+
+        self.node = {}
+        for i, name in enumerate(NODE_RESULTS):
+            self.node[name] = results[:, i*num_nodes:(i+1)*num_nodes]
+        offset = len(NODE_RESULTS)*num_nodes
+        self.link = {}
+        for i, name in enumerate(LINK_RESULTS):
+            self.link[name] = results[:, offset+i*num_links:offset+(i+1)*num_links]
+
+    @staticmethod
+    def _read_ids(f, count):
+        ids = np.fromfile(f, dtype='S'+str(_ID_SIZE), count=count)
+        return [str(element_id) for element_id in ids]
+
+    def times(self):
+        """
+        Returns a numpy array with the time (in seconds) of each reporting period.
+        """
+        return self.report_start + np.arange(self.num_periods)*self.report_step
+
+# Factors from the internal units of EPANET (cfs) to each flow unit (EN_CFS, EN_GPM, ..., EN_CMD),
+# as defined in EPANET 2.00.12
+_FLOW_FACTORS = [1.0, 448.831, 0.64632, 0.5382, 1.9837, 28.317, 1699.0, 2.4466, 101.94, 2446.6]
+_MPERFT = 0.3048
+_PSIPERFT = 0.4333
+
+
+class HydraulicsFile(object):
+    """
+    The hydraulic results of an EPANET simulation read from its hydraulics file (see ENsavehydfile).
+
+    The file holds the results of every hydraulic timestep (including the intermediate timesteps of
+    tank and control events) in the internal units of EPANET (feet and cfs), in the order of the
+    EPANET node and link indices. Unlike the binary output file, it is written without ENsaveH,
+    which leaves EPANET 2.00.12 with a dangling output file pointer.
+
+    Attributes
+    ----------
+    num_nodes : int
+    num_links : int
+    duration : int
+        The duration of the simulation (in seconds)
+    time : numpy array
+        The time of each hydraulic timestep (in seconds)
+    node : dict
+        {'demand', 'head'}: [timestep x node] numpy arrays, in cfs and feet
+    link : dict
+        {'flowrate', 'status', 'setting'}: [timestep x link] numpy arrays, in cfs for the flow rates.
+        The flow rate of closed links is 0.
+    """
+
+    def __init__(self, filename):
+        """
+        Parameters
+        ----------
+        filename : string
+            The name of the hydraulics file
+        """
+        with open(filename, 'rb') as f:
+            prolog = np.fromfile(f, dtype='<i4', count=8)
+            if len(prolog) < 8 or prolog[0] != MAGIC_NUMBER:
+                raise IOError(filename + ' is not an EPANET hydraulics file.')
+            self.num_nodes = int(prolog[2])
+            self.num_links = int(prolog[3])
+            self.duration = int(prolog[7])
+            record = np.dtype([('time', '<i4'),
+                               ('demand', '<f4', self.num_nodes),
+                               ('head', '<f4', self.num_nodes),
+                               ('flowrate', '<f4', self.num_links),
+                               ('status', '<f4', self.num_links),
+                               ('setting', '<f4', self.num_links),
+                               ('time_step', '<i4')])
+            # ENsavehydfile copies the file with a trailing end-of-file character
+            data = f.read()
+            count = len(data)//record.itemsize
+            records = np.frombuffer(data, dtype=record, count=count)
+
+        self.time = records['time'].astype(int)
+        self.node = {}
+        for name in ['demand', 'head']:
+            self.node[name] = records[name].astype(float)
+        self.link = {}
+        for name in ['flowrate', 'status', 'setting']:
+            self.link[name] = records[name].astype(float)
+
+    def report_results(self, times, flow_units, elevation, diameter, pump):
+        """
+        Returns the node and link results at the given times in the units of the input file, with
+        the names and definitions of NODE_RESULTS and LINK_RESULTS (as read by the toolkit).
+
+        Parameters
+        ----------
+        times : list of int
+            The times of the results (in seconds)
+        flow_units : int
+            EN_CFS, EN_GPM, ... (the pressures of SI flow units are in meters)
+        elevation : numpy array
+            The elevation of each node (EN_ELEVATION), in the order of the EPANET indices
+        diameter : numpy array
+            The diameter of each link (EN_DIAMETER), in the order of the EPANET indices
+        pump : numpy array of bool
+            True for the pumps, whose velocity is 0
+
+        Returns
+        -------
+        node : dict
+            {'demand', 'head', 'pressure'}: [time x node] numpy arrays
+        link : dict
+            {'flowrate', 'velocity'}: [time x link] numpy arrays
+        """
+        rows = np.in1d(self.time, times)
+        flow_factor = _FLOW_FACTORS[flow_units]
+        if flow_units < 5:
+            length_factor = 1.0
+            diameter_factor = 12.0
+            pressure_factor = _PSIPERFT
+        else:
+            length_factor = _MPERFT
+            diameter_factor = 1000.0*_MPERFT
+            pressure_factor = _MPERFT
+
+        head = self.node['head'][rows]
+        flow = self.link['flowrate'][rows]
+        area = np.pi*(np.asarray(diameter, dtype=float)/diameter_factor)**2/4.0
+        area[np.asarray(pump, dtype=bool)] = np.inf
+        node = {'demand': self.node['demand'][rows]*flow_factor,
+                'head': head*length_factor,
+                'pressure': (head - np.asarray(elevation, dtype=float)/length_factor)*pressure_factor}
+        link = {'flowrate': flow*flow_factor,
+                'velocity': np.abs(flow)/area*length_factor}
+        return node, link
@@ -10,11 +10,102 @@ from pkg_resources import resource_filename
 import platform
 pyepanet_package = 'wntr.pyepanet'
 
+import numpy as np
+
 import logging
 logger = logging.getLogger(__name__)
 
 import warnings
 
+_int = ctypes.c_int
+_long = ctypes.c_long
+_float = ctypes.c_float
+_str = ctypes.c_char_p
+_int_p = ctypes.POINTER(ctypes.c_int)
+_long_p = ctypes.POINTER(ctypes.c_long)
+_float_p = ctypes.POINTER(ctypes.c_float)
+
+# Argument types of the toolkit functions, which all return an error code (int)
+_argtypes = {'ENopen': [_str, _str, _str],
+             'ENsaveinpfile': [_str],
+             'ENclose': [],
+             'ENsolveH': [],
+             'ENsaveH': [],
+             'ENopenH': [],
+             'ENinitH': [_int],
+             'ENrunH': [_long_p],
+             'ENnextH': [_long_p],
+             'ENcloseH': [],
+             'ENsavehydfile': [_str],
+             'ENusehydfile': [_str],
+             'ENsolveQ': [],
+             'ENopenQ': [],
+             'ENinitQ': [_int],
+             'ENrunQ': [_long_p],
+             'ENnextQ': [_long_p],
+             'ENstepQ': [_long_p],
+             'ENcloseQ': [],
+             'ENwriteline': [_str],
+             'ENreport': [],
+             'ENresetreport': [],
+             'ENsetreport': [_str],
+             'ENgetcontrol': [_int, _int_p, _int_p, _float_p, _int_p, _float_p],
+             'ENgetcount': [_int, _int_p],
+             'ENgetoption': [_int, _float_p],
+             'ENgettimeparam': [_int, _long_p],
+             'ENgetflowunits': [_int_p],
+             'ENgetpatternindex': [_str, _int_p],
+             'ENgetpatternid': [_int, _str],
+             'ENgetpatternlen': [_int, _int_p],
+             'ENgetpatternvalue': [_int, _int, _float_p],
+             'ENgetqualtype': [_int_p, _int_p],
+             'ENgeterror': [_int, _str, _int],
+             'ENgetnodeindex': [_str, _int_p],
+             'ENgetnodeid': [_int, _str],
+             'ENgetnodetype': [_int, _int_p],
+             'ENgetnodevalue': [_int, _int, _float_p],
+             'ENgetnumdemands': [_int, _int_p],
+             'ENgetbasedemand': [_int, _int, _float_p],
+             'ENgetdemandpattern': [_int, _int, _int_p],
+             'ENgetlinkindex': [_str, _int_p],
+             'ENgetlinkid': [_int, _str],
+             'ENgetlinktype': [_int, _int_p],
+             'ENgetlinknodes': [_int, _int_p, _int_p],
+             'ENgetlinkvalue': [_int, _int, _float_p],
+             'ENgetversion': [_int_p],
+             'ENsetcontrol': [_int, _int, _int, _float, _int, _float],
+             'ENsetnodevalue': [_int, _int, _float],
+             'ENsetlinkvalue': [_int, _int, _float],
+             'ENaddpattern': [_str],
+             'ENsetpattern': [_int, _float_p, _int],
+             'ENsetpatternvalue': [_int, _int, _float],
+             'ENsettimeparam': [_int, _long],
+             'ENsetoption': [_int, _float],
+             'ENsetstatusreport': [_int],
+             'ENsetqualtype': [_int, _str, _str, _str]}
+
+# {library file name: library}; the prototypes are declared once for each library
+_libraries = {}
+
+def _load_library(filename, loader):
+    """
+    Load an EPANET library (or return the library already loaded from the file) and declare the
+    prototypes of the toolkit functions it provides.
+    """
+    lib = _libraries.get(filename)
+    if lib is None:
+        lib = loader.LoadLibrary(filename)
+        for name, argtypes in _argtypes.iteritems():
+            try:
+                function = getattr(lib, name)
+            except AttributeError:
+                # e.g., the functions of the TEVA libraries
+                continue
+            function.argtypes = argtypes
+            function.restype = ctypes.c_int
+        _libraries[filename] = lib
+    return lib
+
 class EpanetException(Exception):
     pass        
 
@@ -84,6 +175,20 @@ class ENepanet():
         self.inpfile = inpfile
         self.rptfile = rptfile
         self.binfile = binfile
+        # The errors and warnings of this instance (the class attribute is shared by all instances)
+        self.errcodelist = []
+
+        # Output arguments reused by the calls to the library
+        self._int = ctypes.c_int()
+        self._int2 = ctypes.c_int()
+        self._long = ctypes.c_long()
+        self._float = ctypes.c_float()
+        self._id = ctypes.create_string_buffer(256)
+        # {ID: index} of the nodes and links, read from the library the first time an index is needed
+        self._node_indices = None
+        self._link_indices = None
+        # True once results are saved to the output file (see ENclose)
+        self._output_saved = False
 
         libnames = ['epanet2_x86','epanet2','epanet']
         if '64' in platform.machine():
@@ -92,13 +197,13 @@ class ENepanet():
             try:
                 if os.name in ['nt','dos']:
                     libepanet = resource_filename(pyepanet_package,'data/Windows/%s.dll' % lib)
-                    self.ENlib = ctypes.windll.LoadLibrary(libepanet)
+                    self.ENlib = _load_library(libepanet, ctypes.windll)
                 elif sys.platform in ['darwin']:
                     libepanet = resource_filename(pyepanet_package,'data/Darwin/lib%s.dylib' % lib)
-                    self.ENlib = ctypes.cdll.LoadLibrary(libepanet)
+                    self.ENlib = _load_library(libepanet, ctypes.cdll)
                 else:
                     libepanet = resource_filename(pyepanet_package,'data/Linux/lib%s.so' % lib)
-                    self.ENlib = ctypes.cdll.LoadLibrary(libepanet)
+                    self.ENlib = _load_library(libepanet, ctypes.cdll)
                 return # OK!
             except Exception as E1:
                 if lib == libnames[-1]:
@@ -173,6 +278,12 @@ class ENepanet():
         if inpfile is None: inpfile = self.inpfile
         if rptfile is None: rptfile = self.rptfile
         if binfile is None: binfile = self.binfile
+        for filename in [inpfile, rptfile, binfile]:
+            # The file names are passed to the library as char pointers
+            if not isinstance(filename, basestring):
+                raise TypeError('EPANET file names must be strings, not ' + repr(filename))
+        self._node_indices = None
+        self._link_indices = None
         self.errcode = self.ENlib.ENopen(inpfile, rptfile, binfile)
         self._error()
         if self.errcode < 100:
@@ -187,10 +298,24 @@ class ENepanet():
         
     def ENclose(self):
         """frees all memory & files used by EPANET"""
+        self._node_indices = None
+        self._link_indices = None
         self.errcode = self.ENlib.ENclose()
         self._error()
         if self.errcode < 100:
             self.fileLoaded = False
+        # EPANET 2.00.12 closes the output file without resetting TmpOutFile, which points to the same
+        # file once results are saved (ENsaveH, ENsolveQ, or ENinitQ(1)). The next run that saves
+        # results would close it again. The Windows library does not export TmpOutFile, so there the
+        # output file should be used once per process (hydraulics files are not affected).
+        if self._output_saved:
+            self._output_saved = False
+            try:
+                ctypes.c_void_p.in_dll(self.ENlib, 'TmpOutFile').value = None
+            except ValueError:
+                logger.warning('The EPANET library does not export TmpOutFile, which cannot be reset '
+                               'after saving results to the output file. Saving results to an output '
+                               'file again in this process may crash.')
         return
     
     def ENsolveH(self):
@@ -207,6 +332,7 @@ class ENepanet():
         Should not be called if ENsolveQ() will be used.
         
         """
+        self._output_saved = True
         self.errcode = self.ENlib.ENsaveH()
         self._error()
         return
@@ -243,11 +369,10 @@ class ENepanet():
         See ENsolveH() for an example.
 
         """
-        lT = ctypes.c_long()
-        self.errcode = self.ENlib.ENrunH(byref(lT))
+        self.errcode = self.ENlib.ENrunH(byref(self._long))
         self._error()
-        self.cur_time = lT.value
-        return lT.value
+        self.cur_time = self._long.value
+        return self._long.value
         
     def ENnextH(self):
         """
@@ -262,10 +387,9 @@ class ENepanet():
         See ENsolveH() for an example.
         
         """
-        lTstep = ctypes.c_long()
-        self.errcode = self.ENlib.ENnextH(byref(lTstep))
+        self.errcode = self.ENlib.ENnextH(byref(self._long))
         self._error()
-        return lTstep.value
+        return self._long.value
         
     def ENcloseH(self):
         """frees data allocated by hydraulics solver"""
@@ -299,6 +423,7 @@ class ENepanet():
         
     def ENsolveQ(self):
         """solves for network water quality in all time periods"""
+        self._output_saved = True
         self.errcode = self.ENlib.ENsolveQ()
         self._error()
         return
@@ -318,6 +443,8 @@ class ENepanet():
                      EN_NOSAVE (0) if not
         
         """
+        if iSaveflag:
+            self._output_saved = True
         self.errcode = self.ENlib.ENinitQ(iSaveflag)
         self._error()
         return
@@ -334,10 +461,9 @@ class ENepanet():
         an example.
         
         """
-        lT = ctypes.c_long()
-        self.errcode = self.ENlib.ENrunQ(byref(lT))
+        self.errcode = self.ENlib.ENrunQ(byref(self._long))
         self._error()
-        return lT.value
+        return self._long.value
         
     def ENnextQ(self):
         """
@@ -352,10 +478,9 @@ class ENepanet():
         an example.
         
         """
-        lTstep = ctypes.c_long()
-        self.errcode = self.ENlib.ENnextQ(byref(lTstep))
+        self.errcode = self.ENlib.ENnextQ(byref(self._long))
         self._error()
-        return lTstep.value
+        return self._long.value
         
     def ENstepQ(self):
         """
@@ -368,10 +493,9 @@ class ENepanet():
         an extended period WQ simulation.
         
         """
-        lTLeft = ctypes.c_long()
-        self.errcode = self.ENlib.ENstepQ(byref(lTLeft))
+        self.errcode = self.ENlib.ENstepQ(byref(self._long))
         self._error()
-        return lTLeft.value
+        return self._long.value
         
     def ENcloseQ(self):
         """frees data allocated by WQ solver"""
@@ -456,10 +580,9 @@ class ENepanet():
          * number of components in network
         
         """
-        iCount = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetcount(iCode, byref(iCount))
+        self.errcode = self.ENlib.ENgetcount(iCode, byref(self._int))
         self._error()
-        return iCount.value
+        return self._int.value
         
     def ENgetoption(self, iCode):
         """
@@ -472,10 +595,9 @@ class ENepanet():
          * option value
         
         """
-        fValue = ctypes.c_float()
-        self.errcode = self.ENlib.ENgetoption(iCode, byref(fValue))
+        self.errcode = self.ENlib.ENgetoption(iCode, byref(self._float))
         self._error()
-        return fValue.value
+        return self._float.value
         
     def ENgettimeparam(self, iCode):
         """
@@ -485,10 +607,9 @@ class ENepanet():
          * iCode   = time parameter code (see toolkit.optTimeParams)
         
         """
-        lValue = ctypes.c_long()
-        self.errcode = self.ENlib.ENgettimeparam(iCode, byref(lValue))
+        self.errcode = self.ENlib.ENgettimeparam(iCode, byref(self._long))
         self._error()
-        return lValue.value
+        return self._long.value
         
     def ENgetflowunits(self):
         """
@@ -498,10 +619,9 @@ class ENepanet():
          * code of flow units in use (see toolkit.optFlowUnits)
         
         """
-        iCode = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetflowunits(byref(iCode))
+        self.errcode = self.ENlib.ENgetflowunits(byref(self._int))
         self._error()
-        return iCode.value
+        return self._int.value
         
     def ENgetpatternindex(self, sId):
         """
@@ -514,10 +634,9 @@ class ENepanet():
          * index of time pattern in list of patterns
         
         """
-        iIndex = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetpatternindex(sId, byref(iIndex))
+        self.errcode = self.ENlib.ENgetpatternindex(sId, byref(self._int))
         self._error()
-        return iIndex.value
+        return self._int.value
         
     def ENgetpatternid(self, iIndex):
         """
@@ -530,10 +649,9 @@ class ENepanet():
          * pattern ID
         
         """
-        sId = ctypes.create_string_buffer(256)
-        self.errcode = self.ENlib.ENgetpatternid(iIndex, byref(sId))
+        self.errcode = self.ENlib.ENgetpatternid(iIndex, self._id)
         self._error()
-        return sId.value
+        return self._id.value
         
     def ENgetpatternlen(self, iIndex):
         """
@@ -546,10 +664,9 @@ class ENepanet():
          * pattern length (number of multipliers)
         
         """
-        iLen = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetpatternlen(iIndex, byref(iLen))
+        self.errcode = self.ENlib.ENgetpatternlen(iIndex, byref(self._int))
         self._error()
-        return iLen.value
+        return self._int.value
         
     def ENgetpatternvalue(self, iIndex, iPeriod):
         """
@@ -563,11 +680,10 @@ class ENepanet():
          * pattern multiplier
         
         """
-        fValue = ctypes.c_float()
         self.errcode = self.ENlib.ENgetpatternvalue(iIndex, iPeriod, 
-                                                    byref(fValue))
+                                                    byref(self._float))
         self._error()
-        return fValue.value
+        return self._float.value
         
     def ENgetqualtype(self):
         """
@@ -578,12 +694,10 @@ class ENepanet():
          * index of node being traced (if iQualcode = WQ tracing (EN_TRACE))
         
         """
-        iQualcode = ctypes.c_int()
-        iTracenode = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetqualtype(byref(iQualcode), 
-                                                byref(iTracenode))
+        self.errcode = self.ENlib.ENgetqualtype(byref(self._int), 
+                                                byref(self._int2))
         self._error()
-        return (iQualcode.value, iTracenode.value)
+        return (self._int.value, self._int2.value)
         
     def ENgeterror(self, iErrcode):
         """
@@ -596,10 +710,9 @@ class ENepanet():
          * text of error/warning message
         
         """
-        sErrmsg = ctypes.create_string_buffer(256)
-        self.errcode = self.ENlib.ENgeterror(iErrcode, byref(sErrmsg), 256)
+        self.errcode = self.ENlib.ENgeterror(iErrcode, self._id, 256)
         self._error()
-        return sErrmsg.value
+        return self._id.value
         
     def ENgetnodeindex(self, sId):
         """
@@ -612,10 +725,15 @@ class ENepanet():
          * index of node in list of nodes
         
         """
-        iIndex = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetnodeindex(sId, byref(iIndex))
+        if self._node_indices is None:
+            self._node_indices = self._get_indices(EN_NODECOUNT, self.ENgetnodeid)
+        try:
+            return self._node_indices[sId]
+        except KeyError:
+            pass
+        self.errcode = self.ENlib.ENgetnodeindex(sId, byref(self._int))
         self._error()
-        return iIndex.value
+        return self._int.value
         
     def ENgetnodeid(self, iIndex):
         """
@@ -628,10 +746,9 @@ class ENepanet():
          * node ID
         
         """
-        sId = ctypes.create_string_buffer(256)
-        self.errcode = self.ENlib.ENgetnodeid(iIndex, byref(sId))
+        self.errcode = self.ENlib.ENgetnodeid(iIndex, self._id)
         self._error()
-        return sId.value
+        return self._id.value
     
     def ENgetnodetype(self, iIndex):
         """
@@ -644,10 +761,9 @@ class ENepanet():
          * node type code number (see toolkit.optNodeTypes)
         
         """
-        iCode = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetnodetype(iIndex, byref(iCode))
+        self.errcode = self.ENlib.ENgetnodetype(iIndex, byref(self._int))
         self._error()
-        return iCode.value
+        return self._int.value
         
     def ENgetnodevalue(self, iIndex, iCode):
         """
@@ -661,10 +777,9 @@ class ENepanet():
          * value of node's parameter
         
         """
-        fValue = ctypes.c_float()
-        self.errcode = self.ENlib.ENgetnodevalue(iIndex, iCode, byref(fValue))
+        self.errcode = self.ENlib.ENgetnodevalue(iIndex, iCode, byref(self._float))
         self._error()
-        return fValue.value
+        return self._float.value
         
     def ENgetnumdemands(self, iIndex):
         """
@@ -679,11 +794,10 @@ class ENepanet():
         NOTE: TEVAepanet DLL's only
         
         """
-        iNumDemands = ctypes.c_int()
         self.errcode = self.ENlib.ENgetnumdemands(iIndex, 
-                                                  byref(iNumDemands))
+                                                  byref(self._int))
         self._error()
-        return iNumDemands.value
+        return self._int.value
         
     def ENgetbasedemand(self, iIndex, iDemIdx):
         """
@@ -699,11 +813,10 @@ class ENepanet():
         NOTE: TEVAepanet DLL's only
                 
         """
-        fBaseDemand = ctypes.c_float()
         self.errcode = self.ENlib.ENgetbasedemand(iIndex, iDemIdx,
-                                                  byref(fBaseDemand))
+                                                  byref(self._float))
         self._error()
-        return fBaseDemand.value
+        return self._float.value
         
     def ENgetdemandpattern(self, iNodeIndex, iDemandIdx):
         """
@@ -719,11 +832,10 @@ class ENepanet():
         NOTE: TEVAepanet DLL's only
         
         """
-        iPattIdx = ctypes.c_int()
         self.errcode = self.ENlib.ENgetdemandpattern(iNodeIndex, iDemandIdx, 
-                                                     byref(iPattIdx))
+                                                     byref(self._int))
         self._error()
-        return iPattIdx.value
+        return self._int.value
         
     def ENgetlinkindex(self, sId):
         """
@@ -736,10 +848,15 @@ class ENepanet():
          * index of link in list of links
         
         """
-        iIndex = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetlinkindex(sId, byref(iIndex))
+        if self._link_indices is None:
+            self._link_indices = self._get_indices(EN_LINKCOUNT, self.ENgetlinkid)
+        try:
+            return self._link_indices[sId]
+        except KeyError:
+            pass
+        self.errcode = self.ENlib.ENgetlinkindex(sId, byref(self._int))
         self._error()
-        return iIndex.value
+        return self._int.value
         
     def ENgetlinkid(self, iIndex):
         """
@@ -752,10 +869,9 @@ class ENepanet():
          * retrieves ID of a link with specific index
         
         """
-        sId = ctypes.create_string_buffer(256)
-        self.errcode = self.ENlib.ENgetlinkid(iIndex, byref(sId))
+        self.errcode = self.ENlib.ENgetlinkid(iIndex, self._id)
         self._error()
-        return sId.value
+        return self._id.value
         
     def ENgetlinktype(self, iIndex):
         """
@@ -768,10 +884,9 @@ class ENepanet():
          * link type code number (see toolkit.optLinkTypes)
         
         """
-        iCode = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetlinktype(iIndex, byref(iCode))
+        self.errcode = self.ENlib.ENgetlinktype(iIndex, byref(self._int))
         self._error()
-        return iCode.value
+        return self._int.value
         
     def ENgetlinknodes(self, iIndex):
         """
@@ -785,12 +900,10 @@ class ENepanet():
          * index of link's ending node
         
         """
-        iNode1 = ctypes.c_int()
-        iNode2 = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetlinknodes(iIndex, byref(iNode1), 
-                                                 byref(iNode2))
+        self.errcode = self.ENlib.ENgetlinknodes(iIndex, byref(self._int), 
+                                                 byref(self._int2))
         self._error()
-        return (iNode1.value, iNode2.value)
+        return (self._int.value, self._int2.value)
         
     def ENgetlinkvalue(self, iIndex, iCode):
         """
@@ -804,10 +917,57 @@ class ENepanet():
          * value of link's parameter
         
         """
-        fValue = ctypes.c_float()
-        self.errcode = self.ENlib.ENgetlinkvalue(iIndex, iCode, byref(fValue))
+        self.errcode = self.ENlib.ENgetlinkvalue(iIndex, iCode, byref(self._float))
         self._error()
-        return fValue.value
+        return self._float.value
+        
+    def get_node_values(self, iCode, indices=None):
+        """
+        retrieves parameter values for several nodes
+        
+        Arguments:
+         * iCode   = node parameter code (see toolkit.optNodeParams)
+         * indices = node indices (default all nodes, in order of index)
+        
+        Returns: numpy array
+         * values of the nodes' parameter
+        
+        """
+        if indices is None:
+            indices = xrange(1, self.ENgetcount(EN_NODECOUNT)+1)
+        return self._get_values(self.ENlib.ENgetnodevalue, iCode, indices)
+        
+    def get_link_values(self, iCode, indices=None):
+        """
+        retrieves parameter values for several links
+        
+        Arguments:
+         * iCode   = link parameter code (see toolkit.optLinkParams)
+         * indices = link indices (default all links, in order of index)
+        
+        Returns: numpy array
+         * values of the links' parameter
+        
+        """
+        if indices is None:
+            indices = xrange(1, self.ENgetcount(EN_LINKCOUNT)+1)
+        return self._get_values(self.ENlib.ENgetlinkvalue, iCode, indices)
+        
+    def _get_values(self, getvalue, iCode, indices):
+        values = np.empty(len(indices))
+        fValue = self._float
+        pValue = byref(fValue)
+        for k, iIndex in enumerate(indices):
+            errcode = getvalue(iIndex, iCode, pValue)
+            if errcode:
+                self.errcode = errcode
+                self._error()
+            values[k] = fValue.value
+        return values
+        
+    def _get_indices(self, iCountCode, getid):
+        """returns {ID: index} for the nodes or links"""
+        return dict((getid(iIndex), iIndex) for iIndex in xrange(1, self.ENgetcount(iCountCode)+1))
         
     def ENgetversion(self):
         """
@@ -820,10 +980,9 @@ class ENepanet():
          * version number of the DLL source code
         
         """
-        v = ctypes.c_int()
-        self.errcode = self.ENlib.ENgetversion(byref(v))
+        self.errcode = self.ENlib.ENgetversion(byref(self._int))
         self._error()
-        return v.value
+        return self._int.value
         
     def ENsetcontrol(self, iCindex, iCtype, iLindex, fSetting, iNindex, fLevel):
         """
@@ -842,7 +1001,7 @@ class ENepanet():
         
         """
         self.errcode = self.ENlib.ENsetcontrol(iCindex, iCtype, iLindex, 
-                                               ctypes.c_float(fSetting), iNindex, ctypes.c_float(fLevel))
+                                               fSetting, iNindex, fLevel)
         self._error()
         return
         
@@ -856,7 +1015,7 @@ class ENepanet():
          * fValue  = parameter value
         
         """
-        self.errcode = self.ENlib.ENsetnodevalue(iIndex, iCode, ctypes.c_float(fValue))
+        self.errcode = self.ENlib.ENsetnodevalue(iIndex, iCode, fValue)
         self._error()
         return
         
@@ -870,7 +1029,7 @@ class ENepanet():
          * fValue  = parameter value
         
         """
-        self.errcode = self.ENlib.ENsetlinkvalue(iIndex, iCode, ctypes.c_float(fValue))
+        self.errcode = self.ENlib.ENsetlinkvalue(iIndex, iCode, fValue)
         self._error()
         return
         
@@ -910,7 +1069,7 @@ class ENepanet():
          * fValue  = pattern multiplier
         
         """
-        self.errcode = self.ENlib.ENsetpatternvalue(iIndex, iPeriod, ctypes.c_float(fValue))
+        self.errcode = self.ENlib.ENsetpatternvalue(iIndex, iPeriod, fValue)
         self._error()
         return
         
@@ -936,7 +1095,7 @@ class ENepanet():
          * fValue  = option value
         
         """
-        self.errcode = self.ENlib.ENsetoption(iCode, ctypes.c_float(fValue))
+        self.errcode = self.ENlib.ENsetoption(iCode, fValue)
         self._error()
         return
         
@@ -967,6 +1126,9 @@ class ENepanet():
               analysis is source tracing.
         
         """
+        # 0 (NULL) can be given for the arguments that do not apply
+        sChemname, sChemunits, sTracenode = [None if sArg == 0 else sArg
+                                             for sArg in (sChemname, sChemunits, sTracenode)]
         self.errcode = self.ENlib.ENsetqualtype(iQualcode, sChemname, 
                                                 sChemunits, sTracenode)
         self._error()
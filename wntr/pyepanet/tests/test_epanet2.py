@@ -1,5 +1,6 @@
 from nose.tools import *
 import wntr
+import os
 from os.path import abspath, dirname, join
 
 testdir = dirname(abspath(__file__))
@@ -21,3 +22,80 @@ def test_ENgetcount():
     nLinks = enData.ENgetcount(wntr.pyepanet.EN_LINKCOUNT) 
     assert_equal(13, nLinks)
 
+def test_BinaryOutput():
+    enData = wntr.pyepanet.ENepanet()
+    enData.inpfile = join(datadir,'Net1.inp')
+    binfile = join(testdir, 'tmp.bin')
+    enData.ENopen(enData.inpfile,'tmp.rpt',binfile)
+    enData.ENsolveH()
+    enData.ENsolveQ()
+    enData.ENclose()
+
+    output = wntr.pyepanet.BinaryOutput(binfile)
+    os.remove(binfile)
+    assert_equal(output.node_names[0:2], ['10', '11'])
+    assert_equal(len(output.link_names), 13)
+    assert_equal(output.flow_units, wntr.pyepanet.EN_GPM)
+    assert_equal(output.num_periods, 25)
+    assert_equal(list(output.times()[0:2]), [0, 3600])
+    assert_equal(output.node['head'].shape, (25, 11))
+    # The quality of the first node at time 0 is its initial quality
+    assert_almost_equal(output.node['quality'][0, 0], 0.5, 4)
+
+def test_HydraulicsFile():
+    enData = wntr.pyepanet.ENepanet()
+    enData.inpfile = join(datadir,'Net1.inp')
+    hydfile = join(testdir, 'tmp.hyd')
+    enData.ENopen(enData.inpfile,'tmp.rpt')
+    enData.ENsolveH()
+    enData.ENsavehydfile(hydfile)
+    elevation = enData.get_node_values(wntr.pyepanet.EN_ELEVATION)
+    diameter = enData.get_link_values(wntr.pyepanet.EN_DIAMETER)
+    enData.ENclose()
+
+    hydraulics = wntr.pyepanet.HydraulicsFile(hydfile)
+    os.remove(hydfile)
+    assert_equal(hydraulics.num_nodes, 11)
+    assert_equal(hydraulics.num_links, 13)
+    # The hydraulic timesteps include the intermediate timesteps of the tank controls
+    assert_greater(len(hydraulics.time), 25)
+    assert_equal(list(hydraulics.time[0:2]), [0, 3600])
+    pump = [False]*12 + [True]
+    node, link = hydraulics.report_results([0, 3600], wntr.pyepanet.EN_GPM, elevation, diameter, pump)
+    assert_equal(node['head'].shape, (2, 11))
+    assert_equal(list(link['velocity'][:, 12]), [0, 0])
+    # Junction 10 has an elevation of 710 ft
+    assert_almost_equal(node['pressure'][0, 0], (node['head'][0, 0] - 710)*0.4333, 4)
+
+def test_get_node_and_link_values():
+    enData = wntr.pyepanet.ENepanet()
+    enData.inpfile = join(datadir,'Net1.inp')
+    enData.ENopen(enData.inpfile,'tmp.rpt')
+    enData.ENopenH()
+    enData.ENinitH(0)
+    enData.ENrunH()
+    heads = enData.get_node_values(wntr.pyepanet.EN_HEAD)
+    assert_equal(len(heads), 11)
+    for i in range(11):
+        assert_equal(heads[i], enData.ENgetnodevalue(i+1, wntr.pyepanet.EN_HEAD))
+    flows = enData.get_link_values(wntr.pyepanet.EN_FLOW, [3, 1])
+    assert_equal(list(flows), [enData.ENgetlinkvalue(3, wntr.pyepanet.EN_FLOW),
+                               enData.ENgetlinkvalue(1, wntr.pyepanet.EN_FLOW)])
+    assert_raises(wntr.pyepanet.EpanetException, enData.get_node_values, wntr.pyepanet.EN_HEAD, [12])
+    enData.ENcloseH()
+    enData.ENclose()
+
+def test_index_maps():
+    enData = wntr.pyepanet.ENepanet()
+    enData.inpfile = join(datadir,'Net1.inp')
+    enData.ENopen(enData.inpfile,'tmp.rpt')
+    assert_equal(enData.ENgetnodeindex('10'), 1)
+    assert_equal(enData.ENgetnodeid(enData.ENgetnodeindex('9')), '9')
+    assert_equal(enData.ENgetlinkid(enData.ENgetlinkindex('110')), '110')
+    assert_raises(wntr.pyepanet.EpanetException, enData.ENgetnodeindex, 'not a node')
+    enData.ENclose()
+    # The maps are read again for the next network
+    enData.ENopen(join(datadir,'Net3.inp'),'tmp.rpt')
+    assert_equal(enData.ENgetnodeid(enData.ENgetnodeindex('Lake')), 'Lake')
+    assert_raises(wntr.pyepanet.EpanetException, enData.ENgetlinkindex, '110')
+    enData.ENclose()
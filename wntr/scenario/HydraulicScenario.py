@@ -0,0 +1,54 @@
+import wntr
+
+class HydraulicScenario(object):
+    """
+    Hydraulic scenario class. A hydraulic scenario describes changes to a base
+    water network model (leaks, closed links, pump outages, and demand multipliers).
+    """
+
+    def __init__(self, name=None, leaks=None, closed_links=None, pump_outages=None, demand_multiplier=None):
+        self.name = name
+        """ Scenario name"""
+        self.leaks = leaks if leaks is not None else []
+        """ List of (node or pipe name, leak area (m2), start time (s), end time (s)) tuples.
+        A leak on a pipe is added at a new junction in the middle of the pipe (see split_pipe_with_junction).
+        The new pipes are named pipe_name+'__A' and pipe_name+'__B' and the new junction is named 'leak_'+pipe_name"""
+        self.closed_links = closed_links if closed_links is not None else []
+        """ List of link names that are closed for the entire simulation"""
+        self.pump_outages = pump_outages if pump_outages is not None else []
+        """ List of (pump name, start time (s), end time (s)) tuples"""
+        self.demand_multiplier = demand_multiplier
+        """ Multiplier applied to junction base demands, either a float or a dictionary
+        with junction names as keys"""
+
+    def apply(self, wn):
+        """
+        Apply the scenario to a water network model. The water network model is modified.
+
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+        """
+        if self.demand_multiplier is not None:
+            if isinstance(self.demand_multiplier, dict):
+                for junction_name, multiplier in self.demand_multiplier.iteritems():
+                    junction = wn.get_node(junction_name)
+                    junction.base_demand = junction.base_demand*multiplier
+            else:
+                for junction_name, junction in wn.nodes(wntr.network.Junction):
+                    junction.base_demand = junction.base_demand*self.demand_multiplier
+
+        for link_name in self.closed_links:
+            link = wn.get_link(link_name)
+            link.status = wntr.network.LinkStatus.closed
+            link._base_status = wntr.network.LinkStatus.closed
+
+        for pump_name, start_time, end_time in self.pump_outages:
+            wn.add_pump_outage(pump_name, start_time, end_time)
+
+        for name, area, start_time, end_time in self.leaks:
+            if name in wn.pipe_name_list():
+                wn.split_pipe_with_junction(name, name+'__A', name+'__B', 'leak_'+name)
+                name = 'leak_'+name
+            node = wn.get_node(name)
+            node.add_leak(wn, area=area, start_time=start_time, end_time=end_time)
@@ -1,3 +1,4 @@
 from Earthquake import Earthquake
 from Waterquality import Waterquality
-from FragilityCurve import FragilityCurve
\ No newline at end of file
+from FragilityCurve import FragilityCurve
+from HydraulicScenario import HydraulicScenario
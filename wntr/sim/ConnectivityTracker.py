@@ -0,0 +1,171 @@
+import logging
+
+logger = logging.getLogger('wntr.sim.ConnectivityTracker')
+
+class ConnectivityTracker(object):
+    """
+    Keeps track of which nodes are connected to a source (tank or reservoir) through open links.
+
+    The connected components of the graph of open links are stored explicitly along with the
+    number of sources in each component. Opening a link merges two components by relabeling the
+    smaller one. Closing a link searches from both end nodes at the same time (iteratively, one
+    node at a time from each side); the search stops as soon as the two searches meet, or when
+    one side runs out of nodes, in which case only that (smaller) side is relabeled as a new
+    component. The cost of an update is therefore proportional to the size of the smaller part
+    of the network affected by the change rather than the size of the network.
+    """
+
+    def __init__(self, node_names, source_names, links, open_link_names):
+        """
+        Parameters
+        ----------
+        node_names : list of strings
+            All nodes in the network
+        source_names : list of strings
+            Tanks and reservoirs
+        links : list of (link name, start node name, end node name) tuples
+            All links in the network
+        open_link_names : iterable of strings
+            Links that are initially open
+        """
+        self._link_nodes = {}  # {link_name: (start_node_name, end_node_name)}
+        self._all_links_for_node = dict((node_name, []) for node_name in node_names)
+        for link_name, start_node_name, end_node_name in links:
+            self._link_nodes[link_name] = (start_node_name, end_node_name)
+            self._all_links_for_node[start_node_name].append(link_name)
+            self._all_links_for_node[end_node_name].append(link_name)
+
+        self._is_source = dict((node_name, False) for node_name in node_names)
+        for node_name in source_names:
+            self._is_source[node_name] = True
+
+        # {node_name: {link_name: other_node_name}} for open links only
+        self._adjacency = dict((node_name, {}) for node_name in node_names)
+        self._open_links = set()
+
+        # component labels
+        self._component = {}  # {node_name: component id}
+        self._members = {}  # {component id: set of node names}
+        self._num_sources = {}  # {component id: number of tanks and reservoirs in the component}
+        self._unsourced = set()  # component ids without any sources
+        self._next_component_id = 0
+
+        for node_name in node_names:
+            component_id = self._new_component_id()
+            self._component[node_name] = component_id
+            self._members[component_id] = set([node_name])
+            self._num_sources[component_id] = 1 if self._is_source[node_name] else 0
+            if not self._is_source[node_name]:
+                self._unsourced.add(component_id)
+
+        for link_name in open_link_names:
+            self.open_link(link_name)
+
+    def _new_component_id(self):
+        self._next_component_id += 1
+        return self._next_component_id
+
+    def is_open(self, link_name):
+        """
+        Returns True if the link is open (i.e., it connects its end nodes).
+        """
+        return link_name in self._open_links
+
+    def open_link(self, link_name):
+        """
+        Add a link to the graph of open links. Nothing happens if the link is already open.
+        """
+        if link_name in self._open_links:
+            return
+        self._open_links.add(link_name)
+        start_node_name, end_node_name = self._link_nodes[link_name]
+        self._adjacency[start_node_name][link_name] = end_node_name
+        self._adjacency[end_node_name][link_name] = start_node_name
+
+        c1 = self._component[start_node_name]
+        c2 = self._component[end_node_name]
+        if c1 == c2:
+            return
+        if len(self._members[c1]) < len(self._members[c2]):
+            c1, c2 = c2, c1
+        # merge the smaller component c2 into c1
+        for node_name in self._members[c2]:
+            self._component[node_name] = c1
+        self._members[c1].update(self._members[c2])
+        self._num_sources[c1] += self._num_sources[c2]
+        if self._num_sources[c1] > 0:
+            self._unsourced.discard(c1)
+        self._unsourced.discard(c2)
+        del self._members[c2]
+        del self._num_sources[c2]
+
+    def close_link(self, link_name):
+        """
+        Remove a link from the graph of open links. Nothing happens if the link is already closed.
+        """
+        if link_name not in self._open_links:
+            return
+        self._open_links.remove(link_name)
+        start_node_name, end_node_name = self._link_nodes[link_name]
+        del self._adjacency[start_node_name][link_name]
+        del self._adjacency[end_node_name][link_name]
+        if start_node_name == end_node_name:
+            return
+
+        split_nodes = self._find_split(start_node_name, end_node_name)
+        if split_nodes is None:
+            return
+
+        old_id = self._component[start_node_name]
+        new_id = self._new_component_id()
+        num_new_sources = 0
+        for node_name in split_nodes:
+            self._component[node_name] = new_id
+            if self._is_source[node_name]:
+                num_new_sources += 1
+        self._members[old_id].difference_update(split_nodes)
+        self._members[new_id] = split_nodes
+        self._num_sources[old_id] -= num_new_sources
+        self._num_sources[new_id] = num_new_sources
+        if self._num_sources[old_id] == 0:
+            self._unsourced.add(old_id)
+        if num_new_sources == 0:
+            self._unsourced.add(new_id)
+
+    def _find_split(self, node1, node2):
+        """
+        Search from node1 and node2 at the same time. Returns None if node1 and node2 are still
+        connected. Otherwise, returns the set of nodes on the side that was fully explored first.
+        """
+        visited = [set([node1]), set([node2])]
+        stacks = [[node1], [node2]]
+        side = 0
+        while True:
+            stack = stacks[side]
+            if len(stack) == 0:
+                return visited[side]
+            node_name = stack.pop()
+            for other_node_name in self._adjacency[node_name].itervalues():
+                if other_node_name in visited[1-side]:
+                    return None
+                if other_node_name not in visited[side]:
+                    visited[side].add(other_node_name)
+                    stack.append(other_node_name)
+            side = 1 - side
+
+    def get_isolated_junctions_and_links(self):
+        """
+        Returns
+        -------
+        isolated_junctions : list of strings
+            Nodes that are not connected to any tank or reservoir through open links
+        isolated_links : list of strings
+            Links connected to isolated junctions
+        """
+        isolated_junctions = []
+        isolated_links = set()
+        for component_id in self._unsourced:
+            for node_name in self._members[component_id]:
+                isolated_junctions.append(node_name)
+                isolated_links.update(self._all_links_for_node[node_name])
+        return isolated_junctions, list(isolated_links)
@@ -0,0 +1,130 @@
+from QualityScenarioRunner import QualityScenarioRunner
+from wntr.network.WaterNetworkModel import Pipe
+from wntr.metrics.health_impacts import mass_contaminant_consumed, volume_contaminant_consumed
+from wntr.scenario import Waterquality
+import numpy as np
+import pandas as pd
+
+import logging
+logger = logging.getLogger(__name__)
+
+IMPACT_NAMES = ['mass_consumed', 'volume_consumed', 'extent']
+
+class _HealthImpacts(object):
+    """
+    Reduces the results of an injection to its health impacts in the worker process (see the
+    reduce_func argument of QualityScenarioRunner).
+    """
+
+    def __init__(self, detection_limit):
+        self.detection_limit = detection_limit
+        self._pipes = None
+
+    def _pipe_arrays(self, wn):
+        if self._pipes is None:
+            names = []
+            start_nodes = []
+            end_nodes = []
+            lengths = []
+            for name, pipe in wn.links(Pipe):
+                names.append(name)
+                start_nodes.append(pipe.start_node())
+                end_nodes.append(pipe.end_node())
+                lengths.append(pipe.length)
+            self._pipes = (names, start_nodes, end_nodes, np.array(lengths, dtype=float))
+        return self._pipes
+
+    def __call__(self, wn, results):
+        junctions = wn.junction_name_list()
+        node_results = results.node.loc[:, :, junctions]
+        mass = mass_contaminant_consumed(node_results).values.sum()
+        volume = volume_contaminant_consumed(node_results, self.detection_limit).values.sum()
+
+        # Extent of contamination (see extent_contaminant): the length of the pipes whose upstream
+        # node (given the direction of the flow) is contaminated, maximized over time
+        names, start_nodes, end_nodes, lengths = self._pipe_arrays(wn)
+        quality = results.node['quality']
+        flow = results.link['flowrate'].loc[:, names].values
+        start_contaminated = np.greater(quality.loc[:, start_nodes].values, self.detection_limit)
+        end_contaminated = np.greater(quality.loc[:, end_nodes].values, self.detection_limit)
+        upstream_contaminated = np.where(flow < 0, end_contaminated, start_contaminated)
+        extent = np.dot(upstream_contaminated, lengths).max()
+
+        return {'mass_consumed': mass, 'volume_consumed': volume, 'extent': extent}
+
+class ContaminantEnsemble(object):
+    """
+    Health impacts of an ensemble of contaminant injections, simulated with EPANET.
+
+    Each injection is a CHEM water quality scenario at one node. The hydraulics are solved once
+    (see HydraulicsCache) and the water quality simulations are run in parallel processes (see
+    QualityScenarioRunner). The results of each injection are reduced to its health impacts in
+    the worker process, so only a few numbers per injection are kept and the memory used does
+    not grow with the full results of the injections:
+
+    - mass_consumed: the mass of contaminant consumed at the junctions (kg), see
+      metrics.mass_contaminant_consumed
+    - volume_consumed: the volume of contaminated water consumed at the junctions (m3), see
+      metrics.volume_contaminant_consumed
+    - extent: the largest length of contaminated pipes during the simulation (m), see
+      metrics.extent_contaminant
+    """
+
+    def __init__(self, wn, injections, source_type='MASS', detection_limit=0.0, hydraulics=None):
+        """
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+            The water network. It is simulated as written by write_inpfile (see HydraulicsCache).
+        injections : list of (string, int, int, float) tuples
+            (node name, start time, end time, source quality) of each injection. The times are in
+            seconds (an end time of -1 is the end of the simulation).
+        source_type : string
+            The source type of the injections: MASS (the source quality is in kg/s), CONCEN,
+            FLOWPACED, or SETPOINT (see scenario.Waterquality)
+        detection_limit : float
+            The contaminant concentration (kg/m3) above which the water is contaminated
+        hydraulics : HydraulicsCache
+            The cache of the hydraulics files (see QualityScenarioRunner)
+        """
+        self._wn = wn
+        self.injections = injections
+        self.source_type = source_type
+        self.detection_limit = detection_limit
+        self._hydraulics = hydraulics
+        self.errors = {}
+
+    def run(self, num_processes=None, chunksize=1):
+        """
+        Simulate all injections.
+
+        Parameters
+        ----------
+        num_processes : int
+            Number of worker processes (see QualityScenarioRunner.iter_results)
+        chunksize : int
+            Number of injections sent to a worker at a time
+
+        Returns
+        -------
+        impacts : pd.DataFrame
+            The injection (node, start_time, end_time, source_quality) and its health impacts
+            (mass_consumed, volume_consumed, extent) in each row, in the order of the injections.
+            The impacts are NaN for failed injections (see ContaminantEnsemble.errors).
+        """
+        scenarios = [Waterquality('CHEM', [node_name], self.source_type, source_quality, start_time, end_time)
+                     for node_name, start_time, end_time, source_quality in self.injections]
+        runner = QualityScenarioRunner(self._wn, scenarios, hydraulics=self._hydraulics,
+                                       reduce_func=_HealthImpacts(self.detection_limit))
+
+        impacts = np.empty((len(scenarios), len(IMPACT_NAMES)))
+        impacts.fill(np.nan)
+        for index, value, error in runner.iter_results(num_processes, chunksize):
+            if error is None:
+                impacts[index] = [value[name] for name in IMPACT_NAMES]
+        self.errors = runner.errors
+
+        data = pd.DataFrame(list(self.injections), columns=['node', 'start_time', 'end_time', 'source_quality'])
+        for i, name in enumerate(IMPACT_NAMES):
+            data[name] = impacts[:, i]
+        return data
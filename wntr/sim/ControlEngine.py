@@ -0,0 +1,545 @@
+import math
+import numpy as np
+from wntr.network.WaterNetworkModel import Node, Link, Tank, Pump, LinkStatus
+from wntr.network.NetworkControls import TimeControl, ConditionalControl, MultiConditionalControl, \
+    _CheckValveHeadControl, _PRVControl
+from wntr.network.AttributeStore import stored_attribute_names
+
+import logging
+
+logger = logging.getLogger('wntr.sim.ControlEngine')
+
+# Comparisons that can be applied to arrays of values
+_comparisons = [np.greater, np.greater_equal, np.less, np.less_equal, np.equal, np.not_equal]
+
+
+class _Operands(object):
+    """
+    The values of a list of operands (constants, stored attributes of nodes or links, or attributes of the
+    water network model), read all at once from the attribute stores of the model. None is read as NaN.
+    """
+
+    def __init__(self, wn):
+        self._wn = wn
+        self._stores = [wn._node_attributes, wn._link_attributes]
+        self._constants = []
+        self._stored = {}  # {(store index, attribute): ([rows], [store ids])}
+        self._model = {}  # {attribute of the model: [rows]}
+
+    def __len__(self):
+        return len(self._constants)
+
+    def supports(self, operand):
+        """
+        Returns True if the operand (a number or an (object, attribute) tuple) can be added.
+        """
+        if isinstance(operand, (int, float)) and not isinstance(operand, bool):
+            return True
+        if not isinstance(operand, tuple) or len(operand) != 2:
+            return False
+        obj, attribute = operand
+        if obj is self._wn:
+            return isinstance(getattr(obj, attribute, None), (int, float))
+        if isinstance(obj, (Node, Link)):
+            store = obj.__dict__.get('_store')
+            return (store is not None and any(store is s for s in self._stores) and
+                    attribute in stored_attribute_names(type(obj)) and store.dtype(attribute) == float)
+        return False
+
+    def add(self, operand):
+        """
+        Add an operand (see supports) and return its row.
+        """
+        row = len(self._constants)
+        if not isinstance(operand, tuple):
+            self._constants.append(float(operand))
+            return row
+        self._constants.append(np.nan)
+        obj, attribute = operand
+        if obj is self._wn:
+            self._model.setdefault(attribute, []).append(row)
+        else:
+            store_index = 0 if obj._store is self._stores[0] else 1
+            rows, ids = self._stored.setdefault((store_index, attribute), ([], []))
+            rows.append(row)
+            ids.append(obj._store_id)
+        return row
+
+    def compile(self):
+        self._constants = np.array(self._constants, dtype=float)
+        self._stored = [(self._stores[store_index], attribute, np.array(rows, dtype=int), np.array(ids, dtype=int))
+                        for (store_index, attribute), (rows, ids) in self._stored.iteritems()]
+        self._model = [(attribute, np.array(rows, dtype=int)) for attribute, rows in self._model.iteritems()]
+
+    def evaluate(self):
+        values = self._constants.copy()
+        for store, attribute, rows, ids in self._stored:
+            values[rows] = store.values(attribute, ids)
+        for attribute, rows in self._model:
+            value = getattr(self._wn, attribute)
+            values[rows] = np.nan if value is None else value
+        return values
+
+
+class _Comparisons(object):
+    """
+    A table of comparisons operation(value, threshold) that are evaluated all at once.
+    """
+
+    def __init__(self, wn):
+        self._values = _Operands(wn)
+        self._thresholds = _Operands(wn)
+        self._operations = []
+
+    def __len__(self):
+        return len(self._operations)
+
+    def supports(self, value, operation, threshold):
+        return (any(operation is comparison for comparison in _comparisons) and
+                self._values.supports(value) and self._thresholds.supports(threshold))
+
+    def add(self, value, operation, threshold):
+        self._values.add(value)
+        self._thresholds.add(threshold)
+        self._operations.append(_comparisons.index(operation))
+        return len(self._operations) - 1
+
+    def compile(self):
+        self._values.compile()
+        self._thresholds.compile()
+        operations = np.array(self._operations, dtype=int)
+        self._operation_rows = [(_comparisons[k], np.flatnonzero(operations == k)) for k in set(self._operations)]
+
+    def evaluate(self):
+        """
+        Returns
+        -------
+        result : numpy array of bools
+            The result of each comparison
+        unknown : numpy array of bools
+            True for the comparisons of a None value (the comparison must then be done in python)
+        values : numpy array
+            The values
+        thresholds : numpy array
+            The thresholds
+        """
+        values = self._values.evaluate()
+        thresholds = self._thresholds.evaluate()
+        return (_compare(self._operation_rows, values, thresholds), np.isnan(values) | np.isnan(thresholds),
+                values, thresholds)
+
+
+def _compare(operation_rows, values, thresholds):
+    result = np.zeros(len(values), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        for operation, rows in operation_rows:
+            result[rows] = operation(values[rows], thresholds[rows])
+    return result
+
+
+class ControlEngine(object):
+    """
+    Evaluates the controls of a simulation (the controls of the water network model along with the tank,
+    check valve, pump, and PRV controls generated by the simulator) all at once.
+
+    The controls are compiled into arrays when the engine is created: the node and link ids (in the
+    attribute stores of the model), attributes, comparisons, and thresholds of the conditions of the
+    conditional controls, the fire times of the time controls, the end nodes of check valves and pumps,
+    and the end nodes and coefficients of PRVs. Every time the controls are checked, the conditions of all
+    controls are evaluated with a few numpy operations on the state arrays of the model. Only the controls
+    whose conditions are satisfied (or involve values that are None) are then checked individually with
+    IsControlActionRequired, which gives exactly the same backup times and actions as checking every
+    control. Controls of other classes, or whose conditions use other attributes or operations, are always
+    checked individually.
+
+    Firing the actions calls FireControlAction once for each control (at the priority of the control)
+    instead of once per priority.
+    """
+
+    def __init__(self, wn, controls):
+        """
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+            The water network model being simulated
+        controls : list of Control objects
+            The controls to evaluate. The indices of this list identify the controls.
+        """
+        self._wn = wn
+        self._controls = controls
+        num_controls = len(controls)
+        # Priority of each control, or -1 for controls whose FireControlAction is called for every priority
+        self._priorities = np.zeros(num_controls, dtype=int) - 1
+        generic = []
+
+        time_controls = []
+        conditional_controls = []
+        multi_conditional_controls = []
+        check_valve_controls = []
+        prv_controls = []
+        comparisons = _Comparisons(wn)
+        # Checked for each control so that unsupported controls are not added to the comparison table
+        probe = _Comparisons(wn)
+        for i, control in enumerate(controls):
+            control_type = type(control)
+            if control_type is TimeControl:
+                time_controls.append(i)
+            elif control_type is ConditionalControl and \
+                    probe.supports((control._source_obj, control._source_attr), control._operation, control._threshold):
+                conditional_controls.append(i)
+            elif control_type is MultiConditionalControl and len(control._source) > 0 and \
+                    all(probe.supports(source, operation, threshold) for source, operation, threshold in
+                        zip(control._source, control._operation, control._threshold)):
+                multi_conditional_controls.append(i)
+            elif control_type is _CheckValveHeadControl and self._supports_check_valve(control):
+                check_valve_controls.append(i)
+            elif control_type is _PRVControl and self._supports_prv(control):
+                prv_controls.append(i)
+            else:
+                generic.append(i)
+                continue
+            if control._priority in (0, 1, 2, 3):
+                self._priorities[i] = control._priority
+        self._generic = np.array(generic, dtype=int)
+
+        # Time controls
+        self._time_controls = np.array(time_controls, dtype=int)
+        self._time_control_is_shifted = np.array([controls[i]._time_flag == 'SHIFTED_TIME' for i in time_controls],
+                                                 dtype=bool)
+        self._fire_times = np.array([controls[i]._fire_time for i in time_controls], dtype=float)
+        self._time_control_positions = dict((i, k) for k, i in enumerate(time_controls))
+        # Positions of the time controls whose fire times have not been given by time_control_events yet
+        self._unqueued_time_controls = list(range(len(time_controls)))
+
+        # Conditional controls: one comparison per control (rows 0 to n-1), along with the ids of the prev_demand
+        # and diameter of tank sources for the partial step prediction of tank heads.
+        self._conditional_controls = np.array(conditional_controls, dtype=int)
+        head_partial = []
+        tank_partial = []
+        for i in conditional_controls:
+            control = controls[i]
+            comparisons.add((control._source_obj, control._source_attr), control._operation, control._threshold)
+            head_partial.append(control._source_attr == 'head' and bool(control._partial_step_for_tanks))
+            tank_partial.append(head_partial[-1] and type(control._source_obj) == Tank)
+        self._head_partial = np.array(head_partial, dtype=bool)
+        self._tank_partial = np.flatnonzero(tank_partial)
+        self._tank_ids = np.array([controls[conditional_controls[k]]._source_obj._store_id
+                                   for k in self._tank_partial], dtype=int)
+        tank_operations = np.array([_comparisons.index(controls[conditional_controls[k]]._operation)
+                                    for k in self._tank_partial], dtype=int)
+        self._tank_operation_rows = [(_comparisons[op], np.flatnonzero(tank_operations == op))
+                                     for op in set(tank_operations.tolist())]
+
+        # Multi-conditional controls: the comparisons of control k are in rows self._multi_rows == k
+        self._multi_conditional_controls = np.array(multi_conditional_controls, dtype=int)
+        multi_rows = []
+        for k, i in enumerate(multi_conditional_controls):
+            control = controls[i]
+            for source, operation, threshold in zip(control._source, control._operation, control._threshold):
+                comparisons.add(source, operation, threshold)
+                multi_rows.append(k)
+        self._num_conditional_rows = len(conditional_controls)
+        self._multi_rows = np.array(multi_rows, dtype=int)
+        comparisons.compile()
+        self._comparisons = comparisons
+
+        # Check valve and pump head controls
+        self._check_valve_controls = np.array(check_valve_controls, dtype=int)
+        self._check_valve_start_ids = np.array([controls[i]._start_node._store_id for i in check_valve_controls],
+                                               dtype=int)
+        self._check_valve_end_ids = np.array([controls[i]._end_node._store_id for i in check_valve_controls],
+                                             dtype=int)
+        pump_A = [controls[i]._pump_A for i in check_valve_controls]
+        is_pump = [isinstance(controls[i]._cv, Pump) for i in check_valve_controls]
+        self._check_valve_with_A = np.array([A is not None for A in pump_A], dtype=bool)
+        self._check_valve_pump_A = np.array([np.nan if A is None else A for A in pump_A], dtype=float)
+        self._check_valve_reversed = np.array(is_pump, dtype=bool) & np.logical_not(self._check_valve_with_A)
+        self._check_valve_thresholds = np.array([controls[i]._threshold for i in check_valve_controls], dtype=float)
+        operations = np.array([_comparisons.index(controls[i]._operation) for i in check_valve_controls], dtype=int)
+        self._check_valve_operation_rows = [(_comparisons[op], np.flatnonzero(operations == op))
+                                            for op in set(operations.tolist())]
+
+        # PRV controls
+        self._prv_controls = np.array(prv_controls, dtype=int)
+        self._prv_valves = [controls[i]._valve for i in prv_controls]
+        self._prv_valve_ids = np.array([valve._store_id for valve in self._prv_valves], dtype=int)
+        self._prv_start_ids = np.array([controls[i]._start_node._store_id for i in prv_controls], dtype=int)
+        self._prv_end_ids = np.array([controls[i]._end_node._store_id for i in prv_controls], dtype=int)
+        self._prv_resistance_coefficients = np.array([controls[i]._resistance_coefficient for i in prv_controls],
+                                                     dtype=float)
+        self._prv_Htol = np.array([controls[i]._Htol for i in prv_controls], dtype=float)
+        self._prv_Qtol = np.array([controls[i]._Qtol for i in prv_controls], dtype=float)
+
+        logger.debug('{0} controls compiled, {1} checked individually'.format(num_controls, len(generic)))
+
+    def _supports_check_valve(self, control):
+        nodes = [control._start_node, control._end_node]
+        return (any(control._operation is comparison for comparison in _comparisons) and
+                isinstance(control._threshold, (int, float)) and
+                all(self._is_stored(node, self._wn._node_attributes, ['head']) for node in nodes))
+
+    def _supports_prv(self, control):
+        node_store = self._wn._node_attributes
+        return (self._is_stored(control._start_node, node_store, ['head']) and
+                self._is_stored(control._end_node, node_store, ['head', 'elevation']) and
+                self._is_stored(control._valve, self._wn._link_attributes, ['flow']))
+
+    @staticmethod
+    def _is_stored(obj, store, attributes):
+        names = stored_attribute_names(type(obj))
+        return obj.__dict__.get('_store') is store and all(attribute in names for attribute in attributes)
+
+    def presolve_events(self):
+        """
+        Check the controls before a solve at the current simulation time.
+
+        Returns
+        -------
+        events : list of (int, int) tuples
+            (backup time, control index) for each control whose action should have been fired backup time
+            seconds before the current simulation time (e.g., the fire time of a time control or the time at
+            which the head of a tank crosses the threshold of a conditional control), in order of the control
+            indices
+        controls_to_activate_regardless_of_time : list of ints
+            The indices of the controls that should be fired whenever any other control is fired
+        """
+        wn = self._wn
+        candidates = [self._generic]
+
+        if len(self._time_controls) > 0:
+            fire_times = self._fire_times
+            shifted = self._time_control_is_shifted
+            previous_time = np.where(shifted, wn.prev_shifted_time(), wn.prev_sim_time)
+            current_time = np.where(shifted, wn.shifted_time(), wn.sim_time)
+            candidates.append(self._time_controls[(previous_time < fire_times) & (fire_times <= current_time)])
+
+        if len(self._conditional_controls) > 0:
+            if wn.sim_time == 0:
+                result, unknown = self._evaluate_conditional_controls()
+                candidates.append(self._conditional_controls[self._head_partial & (result | unknown)])
+            elif len(self._tank_partial) > 0:
+                candidates.append(self._conditional_controls[self._tank_partial[self._partial_step_candidates()]])
+
+        events = []
+        controls_to_activate_regardless_of_time = []
+        for i in np.unique(np.concatenate(candidates)).tolist():
+            control_tuple = self._controls[i].IsControlActionRequired(wn, True)
+            assert type(control_tuple[1]) == int or control_tuple[1] == None, 'control backup time should be an int. back up time = '+str(control_tuple[1])
+            if control_tuple[0] and control_tuple[1]==None:
+                controls_to_activate_regardless_of_time.append(i)
+            elif control_tuple[0] and control_tuple[1] >= 0:
+                events.append((control_tuple[1], i))
+        return events, controls_to_activate_regardless_of_time
+
+    def time_control_events(self):
+        """
+        Returns the upcoming fire times of the time controls that have not been returned before (all of
+        them the first time, and then those of the daily controls fired since the last call).
+
+        Returns
+        -------
+        events : list of (int, int) tuples
+            (simulation time, control index) for each fire time after the current simulation time. Shifted
+            fire times are converted to simulation times and rounded up to whole seconds.
+        """
+        wn = self._wn
+        positions = np.unique(np.array(self._unqueued_time_controls, dtype=int))
+        self._unqueued_time_controls = []
+        if len(positions) == 0:
+            return []
+        event_times = self._fire_times[positions] - np.where(self._time_control_is_shifted[positions],
+                                                              wn.options.start_clocktime, 0)
+        event_times = np.ceil(event_times)
+        upcoming = event_times > wn.sim_time
+        return zip(event_times[upcoming].astype(int).tolist(), self._time_controls[positions[upcoming]].tolist())
+
+    def tank_events(self):
+        """
+        Predict the times at which the heads of tanks cross the thresholds of conditional controls after a
+        solve, with the same extrapolation from the net inflow of the tanks (prev_demand) as
+        ConditionalControl.
+
+        Returns
+        -------
+        events : list of (int, int) tuples
+            (simulation time, control index) for each control whose condition becomes satisfied before the
+            end of the simulation, at the first whole second at which it is satisfied
+        """
+        wn = self._wn
+        rows = self._tank_partial
+        if len(rows) == 0:
+            return []
+        values = self._comparisons._values.evaluate()[rows]
+        thresholds = self._comparisons._thresholds.evaluate()[rows]
+        store = wn._node_attributes
+        q_net = store.values('prev_demand', self._tank_ids)
+        diameter = store.values('diameter', self._tank_ids)
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            rate = 4.0*q_net/(math.pi*np.power(diameter, 2.0))
+            event_times = np.ceil(wn.sim_time + (thresholds-values)/rate)
+            satisfied = _compare(self._tank_operation_rows, values, thresholds)
+            satisfied_at_event = _compare(self._tank_operation_rows, values + rate*(event_times-wn.sim_time),
+                                          thresholds)
+            # A strict comparison is satisfied one second after the head reaches the threshold
+            event_times[np.logical_not(satisfied_at_event)] += 1
+            satisfied_at_event = _compare(self._tank_operation_rows, values + rate*(event_times-wn.sim_time),
+                                          thresholds)
+            predicted = satisfied_at_event & np.logical_not(satisfied) & (event_times > wn.sim_time) & \
+                (event_times <= wn.options.duration)
+        controls = self._conditional_controls[rows]
+        return zip(event_times[predicted].astype(int).tolist(), controls[predicted].tolist())
+
+    def check_postsolve(self):
+        """
+        Check the controls after a solve.
+
+        Returns
+        -------
+        resolve : bool
+            True if any control should be fired (and the timestep solved again)
+        controls_to_activate : list of ints
+            The indices of the controls that should be fired
+        """
+        wn = self._wn
+        # Controls whose conditions are satisfied (and are then known to require action)
+        active = []
+        # Controls that must be checked individually
+        candidates = [self._generic]
+
+        if len(self._comparisons) > 0:
+            result, unknown, values, thresholds = self._comparisons.evaluate()
+            num_rows = self._num_conditional_rows
+            if num_rows > 0:
+                satisfied = result[:num_rows]
+                if wn.sim_time == 0:
+                    checked = np.logical_not(self._head_partial)
+                else:
+                    checked = np.ones(num_rows, dtype=bool)
+                active.append(self._conditional_controls[checked & satisfied & np.logical_not(unknown[:num_rows])])
+                candidates.append(self._conditional_controls[checked & unknown[:num_rows]])
+            if len(self._multi_rows) > 0:
+                num_controls = len(self._multi_conditional_controls)
+                multi_result = result[num_rows:]
+                multi_unknown = unknown[num_rows:]
+                num_failed = np.bincount(self._multi_rows, weights=np.logical_not(multi_result | multi_unknown),
+                                         minlength=num_controls)
+                num_unknown = np.bincount(self._multi_rows, weights=multi_unknown, minlength=num_controls)
+                possible = num_failed == 0
+                active.append(self._multi_conditional_controls[possible & (num_unknown == 0)])
+                candidates.append(self._multi_conditional_controls[possible & (num_unknown > 0)])
+
+        if len(self._check_valve_controls) > 0:
+            heads = self._wn._node_attributes.values('head', self._check_valve_start_ids), \
+                self._wn._node_attributes.values('head', self._check_valve_end_ids)
+            start_head, end_head = heads
+            # Same operations as _CheckValveHeadControl
+            headloss = start_head - end_head
+            reversed_headloss = end_head - start_head
+            headloss[self._check_valve_reversed] = reversed_headloss[self._check_valve_reversed]
+            with_A = self._check_valve_with_A
+            headloss[with_A] = start_head[with_A] + self._check_valve_pump_A[with_A] - end_head[with_A]
+            satisfied = _compare(self._check_valve_operation_rows, headloss,
+                                 self._check_valve_thresholds)
+            unknown = np.isnan(start_head) | np.isnan(end_head)
+            active.append(self._check_valve_controls[satisfied & np.logical_not(unknown)])
+            candidates.append(self._check_valve_controls[unknown])
+
+        if len(self._prv_controls) > 0:
+            candidates.append(self._prv_controls[self._prv_candidates()])
+
+        required = set(np.concatenate(active + [self._generic[:0]]).tolist())
+        for i in np.unique(np.concatenate(candidates)).tolist():
+            if self._controls[i].IsControlActionRequired(wn, False)[0]:
+                required.add(i)
+        controls_to_activate = sorted(required)
+        return len(controls_to_activate) > 0, controls_to_activate
+
+    def _evaluate_conditional_controls(self):
+        result, unknown, values, thresholds = self._comparisons.evaluate()
+        num_rows = self._num_conditional_rows
+        return result[:num_rows], unknown[:num_rows]
+
+    def _partial_step_candidates(self):
+        """
+        Returns a boolean array indicating which conditional controls on tank heads predict (with the
+        same operations as ConditionalControl) that the condition becomes satisfied during the timestep.
+        """
+        wn = self._wn
+        rows = self._tank_partial
+        values = self._comparisons._values.evaluate()[rows]
+        thresholds = self._comparisons._thresholds.evaluate()[rows]
+        store = wn._node_attributes
+        q_net = store.values('prev_demand', self._tank_ids)
+        diameter = store.values('diameter', self._tank_ids)
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            delta_h = 4.0*q_net*(wn.sim_time-wn.prev_sim_time)/(math.pi*np.power(diameter, 2.0))
+            next_values = values+delta_h
+        satisfied_next = _compare(self._tank_operation_rows, next_values, thresholds)
+        satisfied = _compare(self._tank_operation_rows, values, thresholds)
+        unknown = np.isnan(next_values) | np.isnan(values) | np.isnan(thresholds)
+        return (satisfied_next & np.logical_not(satisfied)) | unknown
+
+    def _prv_candidates(self):
+        """
+        Returns a boolean array indicating which PRV controls require action (with the same operations as
+        _PRVControl) or cannot be evaluated with arrays.
+        """
+        node_store = self._wn._node_attributes
+        flow = self._wn._link_attributes.values('flow', self._prv_valve_ids)
+        start_head = node_store.values('head', self._prv_start_ids)
+        end_head = node_store.values('head', self._prv_end_ids)
+        end_elevation = node_store.values('elevation', self._prv_end_ids)
+        status = np.array([valve._status for valve in self._prv_valves], dtype=object)
+        setting = np.array([valve.setting for valve in self._prv_valves], dtype=float)
+        Htol = self._prv_Htol
+        with np.errstate(invalid='ignore'):
+            head_setting = setting + end_elevation
+            Hl = self._prv_resistance_coefficients*np.power(np.abs(flow), 2.0)
+            reverse_flow = flow < -self._prv_Qtol
+            is_active = status == LinkStatus.active
+            is_opened = status == LinkStatus.opened
+            is_closed = status == LinkStatus.closed
+            required = np.logical_not(is_active | is_opened | is_closed)
+            required |= (is_active | is_opened) & reverse_flow
+            required |= is_active & (start_head < head_setting + Hl - Htol)
+            required |= is_opened & (start_head > head_setting + Hl + Htol)
+            required |= is_closed & (start_head > end_head + Htol) & \
+                ((start_head < head_setting - Htol) | (end_head < head_setting - Htol))
+        unknown = np.isnan(flow) | np.isnan(start_head) | np.isnan(end_head) | np.isnan(head_setting)
+        return required | unknown
+
+    def fire(self, controls_to_activate):
+        """
+        Fire the actions of the controls in order of priority (and in the order given for controls of the
+        same priority).
+
+        Returns
+        -------
+        change_dict : dict
+            {(object, attribute): (original value, control name)} for each attribute changed
+        """
+        wn = self._wn
+        controls = self._controls
+        priorities = self._priorities
+        by_priority = [[], [], [], []]
+        for i in controls_to_activate:
+            priority = priorities[i]
+            if priority < 0:
+                for p in range(4):
+                    by_priority[p].append(i)
+            else:
+                by_priority[priority].append(i)
+
+        change_dict = {}
+        for priority, indices in enumerate(by_priority):
+            for i in indices:
+                control = controls[i]
+                change_flag, change_tuple, orig_value = control.FireControlAction(wn, priority)
+                if change_flag and change_tuple not in change_dict:
+                    change_dict[change_tuple] = (orig_value, control.name)
+                if i in self._time_control_positions:
+                    k = self._time_control_positions[i]
+                    if control._fire_time != self._fire_times[k]:
+                        self._fire_times[k] = control._fire_time
+                        self._unqueued_time_controls.append(k)
+        return change_dict
@@ -0,0 +1,112 @@
+import numpy as np
+from wntr.network.WaterNetworkModel import Junction
+
+import logging
+
+logger = logging.getLogger('wntr.sim.DemandEngine')
+
+
+class DemandEngine(object):
+    """
+    Computes the expected demands of the junctions of a water network model at each hydraulic timestep
+    from their base demands and demand patterns.
+
+    The demand of a junction is the sum of the demands of its demand categories: the base demand and
+    demand pattern of the junction and any additional categories (see Junction.add_demand_category).
+    The engine keeps the base demand, junction, and pattern of each category in arrays, along with a
+    [timestep x pattern] matrix of the multipliers of each pattern at each hydraulic timestep. The demands
+    at a timestep are then computed with a few numpy operations on one row of the multipliers, and the
+    [timestep x junction] matrix of the demands at all timesteps can be built at once (see demand_matrix).
+    """
+
+    def __init__(self, wn, junction_names=None):
+        """
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+            A water network model
+        junction_names : list of strings
+            The junctions (and their order in the arrays of demands). Default is all junctions of the model.
+        """
+        options = wn.options
+        assert(options.pattern_start == 0.0), "Only 0.0 Pattern Start time is currently supported. "
+        if junction_names is None:
+            junction_names = [junction_name for junction_name, junction in wn.nodes(Junction)]
+        self.junction_names = junction_names
+        self.num_junctions = len(junction_names)
+        self.hydraulic_timestep = options.hydraulic_timestep
+        self.num_timesteps = int(round(options.duration / options.hydraulic_timestep)) + 1
+
+        # The first category of each junction is given by its base demand and demand pattern, so the
+        # categories 0 to num_junctions-1 are in the order of the junctions
+        columns = []
+        base_demands = []
+        pattern_names = []
+        for junction_name in junction_names:
+            junction = wn.get_node(junction_name)
+            columns.append(len(columns))
+            base_demands.append(junction.base_demand)
+            pattern_names.append(junction.demand_pattern_name)
+        for column, junction_name in enumerate(junction_names):
+            for base_demand, demand_pattern_name, category_name in wn.get_node(junction_name).demand_categories:
+                columns.append(column)
+                base_demands.append(base_demand)
+                pattern_names.append(demand_pattern_name)
+        pattern_names = [options.pattern if name is None else name for name in pattern_names]
+
+        pattern_ids = {}
+        for name in pattern_names:
+            if name not in pattern_ids:
+                pattern_ids[name] = len(pattern_ids)
+        self._columns = np.array(columns, dtype=int)
+        self._base_demands = np.array(base_demands, dtype=float)
+        self._pattern_ids = np.array([pattern_ids[name] for name in pattern_names], dtype=int)
+
+        # Multipliers of each pattern at each hydraulic timestep
+        times = np.arange(self.num_timesteps)*options.hydraulic_timestep
+        pattern_steps = np.floor_divide(times, options.pattern_timestep).astype(int)
+        self._multipliers = np.zeros((self.num_timesteps, len(pattern_ids)))
+        for name, pattern_id in pattern_ids.iteritems():
+            pattern = np.array(wn.get_pattern(name), dtype=float)
+            self._multipliers[:, pattern_id] = pattern[pattern_steps % len(pattern)]
+
+    def demands(self, timestep):
+        """
+        Returns the demands of the junctions at a hydraulic timestep.
+
+        Parameters
+        ----------
+        timestep : int
+            The index of the hydraulic timestep (the simulation time divided by the hydraulic timestep)
+
+        Returns
+        -------
+        demands : numpy array
+        """
+        n = self.num_junctions
+        category_demands = self._base_demands*self._multipliers[timestep, self._pattern_ids]
+        demands = category_demands[:n]
+        if len(category_demands) > n:
+            np.add.at(demands, self._columns[n:], category_demands[n:])
+        return demands
+
+    def demand_matrix(self):
+        """
+        Returns a [timestep x junction] numpy array of the demands of the junctions at every hydraulic
+        timestep.
+        """
+        n = self.num_junctions
+        matrix = self._multipliers[:, self._pattern_ids[:n]]*self._base_demands[:n]
+        if len(self._columns) > n:
+            np.add.at(matrix, (slice(None), self._columns[n:]),
+                      self._multipliers[:, self._pattern_ids[n:]]*self._base_demands[n:])
+        return matrix
+
+    def breakpoints(self):
+        """
+        Returns the indices of the hydraulic timesteps at which the demand of any junction changes.
+        """
+        used = np.unique(self._pattern_ids[self._base_demands != 0.0])
+        multipliers = self._multipliers[:, used]
+        changed = np.any(multipliers[1:] != multipliers[:-1], axis=1)
+        return np.flatnonzero(changed) + 1
@@ -0,0 +1,318 @@
+try:
+    from wntr import pyepanet
+except ImportError:
+    raise ImportError('Error importing pyepanet while running epanet simulator.'
+                      'Make sure pyepanet is installed and added to path.')
+from WaterNetworkSimulator import *
+from EpanetSimulator import _append_hydraulic_results
+import pandas as pd
+from wntr.utils import convert
+import tempfile
+import shutil
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (node class, attribute, EPANET parameter code, parameter type for convert) of the node attributes
+# that are copied to EPANET before each run
+_NODE_PARAMETERS = [(Junction, 'elevation', pyepanet.EN_ELEVATION, 'Elevation'),
+                    (Junction, 'base_demand', pyepanet.EN_BASEDEMAND, 'Demand'),
+                    (Tank, 'elevation', pyepanet.EN_ELEVATION, 'Elevation'),
+                    (Tank, 'init_level', pyepanet.EN_TANKLEVEL, 'Length'),
+                    (Tank, 'diameter', pyepanet.EN_TANKDIAM, 'Tank Diameter'),
+                    (Tank, 'min_level', pyepanet.EN_MINLEVEL, 'Length'),
+                    (Tank, 'max_level', pyepanet.EN_MAXLEVEL, 'Length'),
+                    (Reservoir, 'base_head', pyepanet.EN_ELEVATION, 'Hydraulic Head')]
+
+# The same for the link attributes (the roughness and minor loss coefficients are unitless)
+_LINK_PARAMETERS = [(Pipe, 'length', pyepanet.EN_LENGTH, 'Length'),
+                    (Pipe, 'diameter', pyepanet.EN_DIAMETER, 'Pipe Diameter'),
+                    (Pipe, 'roughness', pyepanet.EN_ROUGHNESS, None),
+                    (Pipe, 'minor_loss', pyepanet.EN_MINORLOSS, None),
+                    (Valve, 'diameter', pyepanet.EN_DIAMETER, 'Pipe Diameter'),
+                    (Valve, 'minor_loss', pyepanet.EN_MINORLOSS, None)]
+
+
+class EpanetSession(WaterNetworkSimulator):
+    """
+    A water network model loaded once into EPANET and simulated many times.
+
+    EpanetSimulator reads the inp file of the model (wn.name) at every run, so each run pays for
+    parsing the file and ignores the changes made to the model in memory. A session instead writes the
+    model to an inp file in its own temporary directory (along with the EPANET report file, so that
+    sessions of different processes do not share files) and opens it once. Before each run, the node
+    and link parameters, link statuses, and patterns that changed in the model since the previous run
+    are copied to EPANET with ENsetnodevalue, ENsetlinkvalue, and ENsetpattern, and the hydraulics
+    are then initialized with ENinitH and solved again. This suits sensitivity and calibration studies that
+    simulate the same network many times with different parameters.
+
+    The parameters copied to EPANET are the elevation, base demand, and demand pattern of the
+    junctions, the elevation, initial level, diameter, and minimum and maximum levels of the tanks,
+    the head of the reservoirs, the length, diameter, roughness, and minor loss coefficient of the
+    pipes, the diameter and minor loss coefficient of the valves, the initial status of the links
+    (get_base_status), the initial setting of the valves, and the multipliers of the patterns. Other
+    changes (adding or removing nodes, links, patterns, or controls, changing the options, changing
+    the demands of a junction with additional demand categories, changing the status of a pipe with
+    a check valve, or changing the setting of a GPV) require a new session.
+
+    The EPANET toolkit keeps the network in global variables, so only one session can be open in a
+    process at a time. Close the session (or use it in a with statement) before opening another one
+    or running an EpanetSimulator.
+    """
+
+    _open_session = None
+
+    def __init__(self, wn):
+        """
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+            A water network model
+        """
+        WaterNetworkSimulator.__init__(self, wn)
+        if EpanetSession._open_session is not None:
+            raise RuntimeError('Another EpanetSession is open in this process. Close it before opening '
+                               'a new session.')
+        self.tempdir = tempfile.mkdtemp(prefix='wntr_epanet_')
+        self._en = None
+        try:
+            inpfile = os.path.join(self.tempdir, 'network.inp')
+            wn.write_inpfile(inpfile)
+            en = pyepanet.ENepanet()
+            en.inpfile = inpfile
+            en.ENopen(inpfile, os.path.join(self.tempdir, 'network.rpt'), '')
+        except:
+            shutil.rmtree(self.tempdir, ignore_errors=True)
+            raise
+        self._en = en
+        EpanetSession._open_session = self
+        self._flowunits = en.ENgetflowunits()
+        # EPANET keeps the duration and the hydraulic timestep of the inp file
+        self._duration = wn.options.duration
+        self._hydraulic_timestep = wn.options.hydraulic_timestep
+        self._times = np.arange(0, self._duration+self._hydraulic_timestep, self._hydraulic_timestep)
+
+        self._node_names = [name for name, node in wn.nodes()]
+        self._link_names = [name for name, link in wn.links()]
+        self._node_types = [self._get_node_type(name) for name in self._node_names]
+        self._link_types = [self._get_link_type(name) for name in self._link_names]
+        self._node_indices = [en.ENgetnodeindex(name) for name in self._node_names]
+        self._link_indices = [en.ENgetlinkindex(name) for name in self._link_names]
+
+        # The values of the parameters in EPANET (in SI units), which are compared with the model at
+        # every run
+        self._node_parameters = self._parameter_values(wn._node_attributes, _NODE_PARAMETERS,
+                                                       self._node_names, self._node_indices)
+        self._link_parameters = self._parameter_values(wn._link_attributes, _LINK_PARAMETERS,
+                                                       self._link_names, self._link_indices)
+        self._demand_patterns = dict((name, junction.demand_pattern_name) for name, junction in wn.nodes(Junction))
+        self._patterns = dict((name, list(pattern)) for name, pattern in wn._patterns.iteritems())
+        self._demand_categories = set(name for name, junction in wn.nodes(Junction)
+                                      if len(junction.demand_categories) > 0)
+        self._link_statuses = dict((name, link.get_base_status()) for name, link in wn.links())
+        self._valve_settings = dict((name, valve._base_setting) for name, valve in wn.links(Valve))
+
+    @staticmethod
+    def _parameter_values(store, parameters, names, en_indices):
+        """
+        Returns a list of (store ids, EPANET indices, EPANET code, parameter type, attribute, values)
+        tuples, one for each parameter.
+        """
+        position = dict((name, i) for i, name in enumerate(names))
+        result = []
+        for cls, attribute, code, param_type in parameters:
+            ids = store.find_ids(cls)
+            indices = np.array([en_indices[position[name]] for name in store.names(ids)], dtype=int)
+            result.append((ids, indices, code, param_type, attribute, store.values(attribute, ids).copy()))
+        return result
+
+    def _check_open(self):
+        if self._en is None:
+            raise RuntimeError('The EpanetSession is closed.')
+
+    def _update_parameters(self, store, parameters, setvalue):
+        for ids, indices, code, param_type, attribute, values in parameters:
+            new_values = store.values(attribute, ids)
+            changed = np.flatnonzero(new_values != values)
+            if len(changed) == 0:
+                continue
+            en_values = new_values[changed]
+            if param_type is not None:
+                en_values = convert(param_type, self._flowunits, en_values, MKS=False)
+            for index, value in zip(indices[changed], en_values):
+                setvalue(int(index), code, float(value))
+            values[changed] = new_values[changed]
+            logger.debug('Updated the {0} of {1} elements in EPANET'.format(attribute, len(changed)))
+
+    def _valve_setting(self, valve):
+        """
+        Returns the initial setting of a valve in the units of EPANET.
+        """
+        if valve.valve_type in ['PRV', 'PSV', 'PBV']:
+            return convert('Pressure', self._flowunits, valve._base_setting, MKS=False)
+        elif valve.valve_type == 'FCV':
+            return convert('Flow', self._flowunits, valve._base_setting, MKS=False)
+        elif valve.valve_type == 'TCV':
+            return valve._base_setting
+        raise RuntimeError('The setting of valve ' + valve.name() + ' (a ' + valve.valve_type + ') cannot '
+                           'be changed in an EpanetSession.')
+
+    def _update_link_statuses(self):
+        """
+        Copy the initial statuses of the links and settings of the valves that changed to EPANET.
+        """
+        en = self._en
+        wn = self._wn
+        for name, setting in self._valve_settings.iteritems():
+            valve = wn.get_link(name)
+            if valve._base_setting != setting:
+                en.ENsetlinkvalue(en.ENgetlinkindex(name), pyepanet.EN_INITSETTING, self._valve_setting(valve))
+                self._valve_settings[name] = valve._base_setting
+                # Setting a valve makes it active in EPANET
+                self._link_statuses[name] = LinkStatus.active
+
+        for name, status in self._link_statuses.iteritems():
+            link = wn.get_link(name)
+            new_status = link.get_base_status()
+            if new_status == status:
+                continue
+            if isinstance(link, Pipe) and link.cv:
+                raise RuntimeError('The status of pipe ' + name + ', which has a check valve, cannot be '
+                                   'changed in an EpanetSession.')
+            if new_status == LinkStatus.active:
+                en.ENsetlinkvalue(en.ENgetlinkindex(name), pyepanet.EN_INITSETTING, self._valve_setting(link))
+            else:
+                # LinkStatus.closed and LinkStatus.opened are the EPANET codes (0 and 1)
+                en.ENsetlinkvalue(en.ENgetlinkindex(name), pyepanet.EN_INITSTATUS, new_status)
+            self._link_statuses[name] = new_status
+
+    def _update_network(self):
+        """
+        Copy the parameters, link statuses, and patterns that changed in the water network model to
+        EPANET.
+        """
+        en = self._en
+        wn = self._wn
+        if wn.options.duration != self._duration or wn.options.hydraulic_timestep != self._hydraulic_timestep:
+            raise RuntimeError('The duration or the hydraulic timestep of the water network model were '
+                               'changed after the EpanetSession was opened.')
+        for name, pattern in wn._patterns.iteritems():
+            if self._patterns.get(name) != list(pattern):
+                if name not in self._patterns:
+                    raise RuntimeError('Pattern ' + name + ' was added after the EpanetSession was opened.')
+                en.ENsetpattern(en.ENgetpatternindex(name), pattern)
+                self._patterns[name] = list(pattern)
+
+        # EPANET sets the base demand and demand pattern of the last demand category of a junction
+        store = wn._node_attributes
+        for ids, indices, code, param_type, attribute, values in self._node_parameters:
+            if attribute != 'base_demand':
+                continue
+            for name in store.names(ids[store.values(attribute, ids) != values]):
+                if name in self._demand_categories:
+                    raise RuntimeError('The base demand of junction ' + name + ', which has demand '
+                                       'categories, cannot be changed in an EpanetSession.')
+        for name, junction in wn.nodes(Junction):
+            pattern_name = junction.demand_pattern_name
+            if self._demand_patterns[name] != pattern_name:
+                if name in self._demand_categories:
+                    raise RuntimeError('The demand pattern of junction ' + name + ', which has demand '
+                                       'categories, cannot be changed in an EpanetSession.')
+                pattern_index = 0 if pattern_name is None else en.ENgetpatternindex(pattern_name)
+                en.ENsetnodevalue(en.ENgetnodeindex(name), pyepanet.EN_PATTERN, pattern_index)
+                self._demand_patterns[name] = pattern_name
+
+        self._update_parameters(store, self._node_parameters, en.ENsetnodevalue)
+        self._update_parameters(wn._link_attributes, self._link_parameters, en.ENsetlinkvalue)
+        self._update_link_statuses()
+
+    def run_sim(self, convert_units=True):
+        """
+        Copy the changes of the water network model to EPANET and run a hydraulic simulation.
+
+        Parameters
+        ----------
+        convert_units : bool
+            If True, the results are converted to SI units
+
+        Returns
+        -------
+        results : NetResults
+        """
+        self._check_open()
+        en = self._en
+        wn = self._wn
+        if wn.num_nodes() != len(self._node_names) or wn.num_links() != len(self._link_names):
+            raise RuntimeError('Nodes or links were added to or removed from the water network model '
+                               'after the EpanetSession was opened.')
+        self._update_network()
+
+        # The warnings and errors of the previous runs
+        en.Warnflag = False
+        en.Errflag = False
+        en.errcodelist = []
+
+        results = NetResults()
+        results.time = self._times.copy()
+        results.error_code = 0
+        flowunits = self._flowunits
+
+        node_dictonary = {'demand': [],
+                          'expected_demand': [],
+                          'head': [],
+                          'pressure':[],
+                          'type': []}
+        link_dictonary = {'flowrate': [],
+                          'velocity': [],
+                          'type': []}
+
+        en.ENopenH()
+        try:
+            en.ENinitH(0)
+            while True:
+                t = en.ENrunH()
+                if t in results.time:
+                    _append_hydraulic_results(en, self._node_indices, self._link_indices, self._node_types,
+                                              self._link_types, flowunits, convert_units, node_dictonary,
+                                              link_dictonary)
+
+                tstep = en.ENnextH()
+                if tstep <= 0:
+                    break
+
+                if en.Warnflag:
+                    results.error_code = 1
+                if en.Errflag:
+                    results.error_code = 2
+        finally:
+            en.ENcloseH()
+        self.warning_list = en.errcodelist
+
+        ntimes = len(results.time)
+        for key, value in node_dictonary.iteritems():
+            node_dictonary[key] = np.array(value).reshape((ntimes, len(self._node_names)))
+        results.node = pd.Panel(node_dictonary, major_axis=results.time, minor_axis=self._node_names)
+        for key, value in link_dictonary.iteritems():
+            link_dictonary[key] = np.array(value).reshape((ntimes, len(self._link_names)))
+        results.link = pd.Panel(link_dictonary, major_axis=results.time, minor_axis=self._link_names)
+
+        return results
+
+    def close(self):
+        """
+        Close EPANET and remove the temporary directory of the session.
+        """
+        if self._en is not None:
+            try:
+                self._en.ENclose()
+            finally:
+                self._en = None
+                EpanetSession._open_session = None
+                shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -6,11 +6,62 @@ except ImportError:
 from WaterNetworkSimulator import *
 import pandas as pd
 from wntr.utils import convert
+import tempfile
+import shutil
+import os
 import logging
 
 logger = logging.getLogger(__name__)
 from wntr.pyepanet.epanet2 import EpanetException, ENgetwarning
 
+
+def _append_hydraulic_results(enData, node_indices, link_indices, node_types, link_types, flowunits,
+                              convert_units, node_dictonary, link_dictonary):
+    """
+    Append the hydraulic results of the current period, read through the toolkit, to the node and
+    link dictionaries (used by EpanetSimulator and EpanetSession).
+    """
+    head = enData.get_node_values(pyepanet.EN_HEAD, node_indices)
+    demand = enData.get_node_values(pyepanet.EN_DEMAND, node_indices)
+    pressure = enData.get_node_values(pyepanet.EN_PRESSURE, node_indices)
+    flow = enData.get_link_values(pyepanet.EN_FLOW, link_indices)
+    velocity = enData.get_link_values(pyepanet.EN_VELOCITY, link_indices)
+
+    if convert_units:
+        head = convert('Hydraulic Head', flowunits, head) # m
+        demand = convert('Demand', flowunits, demand) # m3/s
+        pressure = convert('Pressure', flowunits, pressure) # Pa
+        flow = convert('Flow', flowunits, flow) # m3/s
+        velocity = convert('Velocity', flowunits, velocity) # m/s
+
+    node_dictonary['demand'].append(demand)
+    node_dictonary['expected_demand'].append(demand)
+    node_dictonary['head'].append(head)
+    node_dictonary['pressure'].append(pressure)
+    node_dictonary['type'].append(node_types)
+    link_dictonary['flowrate'].append(flow)
+    link_dictonary['velocity'].append(velocity)
+    link_dictonary['type'].append(link_types)
+
+
+def _check_no_open_session():
+    """
+    Raise a RuntimeError if an EpanetSession is open. The EPANET toolkit holds one network per
+    process, so opening another network would replace the network of the session.
+    """
+    from EpanetSession import EpanetSession
+    if EpanetSession._open_session is not None:
+        raise RuntimeError('An EpanetSession is open in this process. Close it before running '
+                           'another EPANET simulation.')
+
+
+def _is_inp_file(name):
+    """
+    Returns True if name is the name of an (uncompressed) inp file that EPANET can read.
+    """
+    return isinstance(name, basestring) and not name.endswith('.gz') and os.path.isfile(name)
+
+
 class EpanetSimulator(WaterNetworkSimulator):
     """
     Epanet simulator inherited from Water Network Simulator.
@@ -27,27 +78,91 @@ class EpanetSimulator(WaterNetworkSimulator):
         """
         WaterNetworkSimulator.__init__(self, wn)
 
+        # The EPANET report file
+        self.report_file = 'tmp.rpt'
+
         # Timing
         self.prep_time_before_main_loop = 0.0
         self.solve_step = {}
         self.warning_list = None
     
-    def run_sim(self, WQ=None, convert_units=True):
+    def run_sim(self, WQ=None, convert_units=True, binary_output=False, hydfile=None):
         """
         Run water network simulation using epanet.
 
+        Parameters
+        ----------
+        WQ : Waterquality or list of Waterquality
+            Water quality scenario(s)
+        convert_units : bool
+            If True, the results are converted to SI units
+        binary_output : bool
+            If True, the results are read at once from a temporary file after the simulation.
+            Otherwise the results of each node and link are read through the toolkit at every
+            timestep, which is much slower for large networks. Without a water quality scenario,
+            the hydraulics are saved to a hydraulics file (see pyepanet.HydraulicsFile). With a
+            water quality scenario, EPANET writes the results of every hydraulic timestep to a
+            binary output file (see pyepanet.BinaryOutput). EPANET 2.00.12 leaves a dangling
+            pointer to that file, which is reset by ENepanet.ENclose except on Windows, where the
+            pointer is not exported by the library. On Windows, only one water quality simulation
+            with binary_output should be run in a process.
+        hydfile : string
+            The name of a hydraulics file of the same network (see HydraulicsCache). If provided, the
+            hydraulics are read from the file instead of being solved, which requires a water quality
+            scenario. The hydraulic results are read during the water quality simulation. If an inp
+            file with the same name and the .inp extension exists (see HydraulicsCache.get), it is
+            simulated instead of the inp file of the model, so that the nodes and links are in the
+            same order as in the hydraulics file.
+
+        The inp file of the model (wn.name) is simulated. If the model was not read from an inp file
+        (e.g., it was read from a gzip file or a file-like object, or it was built in memory), it is
+        written to a temporary inp file with write_inpfile. A RuntimeError is raised while an
+        EpanetSession is open.
         """
+        _check_no_open_session()
+        inpfile = self._wn.name
+        if hydfile is not None and _is_inp_file(os.path.splitext(hydfile)[0] + '.inp'):
+            inpfile = os.path.splitext(hydfile)[0] + '.inp'
+        tempdir = None
+        if not _is_inp_file(inpfile):
+            tempdir = tempfile.mkdtemp(prefix='wntr_epanet_')
+            inpfile = os.path.join(tempdir, 'network.inp')
+        try:
+            if tempdir is not None:
+                self._wn.write_inpfile(inpfile)
+            return self._run_sim(inpfile, WQ, convert_units, binary_output, hydfile)
+        finally:
+            if tempdir is not None:
+                shutil.rmtree(tempdir, ignore_errors=True)
+
+    def _run_sim(self, inpfile, WQ, convert_units, binary_output, hydfile):
+        if hydfile is not None and not WQ:
+            raise ValueError('A hydraulics file can only be used with a water quality scenario.')
 
         start_run_sim_time = time.time()
         logger.debug('Starting run')
         # Create enData
         enData = pyepanet.ENepanet()
-        enData.inpfile = self._wn.name
-        enData.ENopen(enData.inpfile, 'tmp.rpt')
+        enData.inpfile = inpfile
+        if binary_output:
+            # The temporary results file: the binary output file of a water quality simulation, or
+            # the hydraulics file otherwise
+            binfile_handle, binfile = tempfile.mkstemp(suffix='.bin' if WQ else '.hyd')
+            os.close(binfile_handle)
+        else:
+            binfile = ''
+        enData.ENopen(enData.inpfile, self.report_file, binfile if WQ else '')
         flowunits = enData.ENgetflowunits()
+        if binary_output and WQ:
+            # Report the results at every hydraulic timestep
+            enData.ENsettimeparam(pyepanet.EN_REPORTSTART, 0)
+            enData.ENsettimeparam(pyepanet.EN_REPORTSTEP, int(self._wn.options.hydraulic_timestep))
         
-        enData.ENopenH()
-        enData.ENinitH(1)
+        if hydfile is None:
+            enData.ENopenH()
+            enData.ENinitH(1)
+        else:
+            enData.ENusehydfile(hydfile)
         
         # Create results object and load general simulation options. 
         results = NetResults()
@@ -60,6 +175,11 @@ class EpanetSimulator(WaterNetworkSimulator):
         node_names = [name for name, node in self._wn.nodes()]
         link_names = [name for name, link in self._wn.links()]
         
+        node_types = [self._get_node_type(name) for name in node_names]
+        link_types = [self._get_link_type(name) for name in link_names]
+        node_indices = [enData.ENgetnodeindex(name) for name in node_names]
+        link_indices = [enData.ENgetlinkindex(name) for name in link_names]
+
         node_dictonary = {'demand': [],
                           'expected_demand': [],
                           'head': [],
@@ -72,44 +192,14 @@ class EpanetSimulator(WaterNetworkSimulator):
 
         start_main_loop_time = time.time()
         self.prep_time_before_main_loop = start_main_loop_time - start_run_sim_time
-        while True:
+        while hydfile is None:
             start_solve_step = time.time()
             t = enData.ENrunH()
             end_solve_step = time.time()
             self.solve_step[t/self._wn.options.hydraulic_timestep] = end_solve_step - start_solve_step
-            if t in results.time:
-                for name in node_names:
-                    nodeindex = enData.ENgetnodeindex(name)
-                    head = enData.ENgetnodevalue(nodeindex, pyepanet.EN_HEAD)
-                    demand = enData.ENgetnodevalue(nodeindex, pyepanet.EN_DEMAND)
-                    expected_demand = demand
-                    pressure = enData.ENgetnodevalue(nodeindex, pyepanet.EN_PRESSURE)
-                    
-                    if convert_units: # expected demand is already converted
-                        head = convert('Hydraulic Head', flowunits, head) # m
-                        demand = convert('Demand', flowunits, demand) # m3/s
-                        expected_demand = convert('Demand', flowunits, expected_demand) # m3/s
-                        pressure = convert('Pressure', flowunits, pressure) # Pa
-                    
-                    node_dictonary['demand'].append(demand)
-                    node_dictonary['expected_demand'].append(expected_demand)
-                    node_dictonary['head'].append(head)
-                    node_dictonary['pressure'].append(pressure)
-                    node_dictonary['type'].append(self._get_node_type(name))
-                    
-                for name in link_names:
-                    linkindex = enData.ENgetlinkindex(name)
-                    
-                    flow = enData.ENgetlinkvalue(linkindex, pyepanet.EN_FLOW)
-                    velocity = enData.ENgetlinkvalue(linkindex, pyepanet.EN_VELOCITY)
-                    
-                    if convert_units:
-                        flow = convert('Flow', flowunits, flow) # m3/s
-                        velocity = convert('Velocity', flowunits, velocity) # m/s
-                        
-                    link_dictonary['flowrate'].append(flow)
-                    link_dictonary['velocity'].append(velocity)
-                    link_dictonary['type'].append(self._get_link_type(name))
+            if t in results.time and not binary_output:
+                _append_hydraulic_results(enData, node_indices, link_indices, node_types, link_types,
+                                          flowunits, convert_units, node_dictonary, link_dictonary)
 
             tstep = enData.ENnextH()
             if tstep <= 0:
@@ -119,7 +209,8 @@ class EpanetSimulator(WaterNetworkSimulator):
                 results.error_code = 1
             if enData.Errflag:
                 results.error_code = 2
-        enData.ENcloseH()
+        if hydfile is None:
+            enData.ENcloseH()
         self.warning_list = enData.errcodelist
         
         if WQ:
@@ -187,32 +278,67 @@ class EpanetSimulator(WaterNetworkSimulator):
                 else:
                     logger.error('Invalid Quality Type')
             enData.ENopenQ()
-            enData.ENinitQ(0)
+            # With a binary output file, the quality results are saved to the file
+            enData.ENinitQ(1 if binary_output else 0)
             
             while True:
                 t = enData.ENrunQ()
-                if t in results.time:
-                    for name in node_names:
-                        nodeindex = enData.ENgetnodeindex(name)
-                        quality = enData.ENgetnodevalue(nodeindex, pyepanet.EN_QUALITY)
+                if t in results.time and not binary_output:
+                    if hydfile is not None:
+                        # The hydraulics of the period are loaded from the hydraulics file by ENrunQ
+                        _append_hydraulic_results(enData, node_indices, link_indices, node_types,
+                                                  link_types, flowunits, convert_units, node_dictonary,
+                                                  link_dictonary)
+                    quality = enData.get_node_values(pyepanet.EN_QUALITY, node_indices)
                     
-                        if convert_units:
-                            if WQ.quality_type == 'CHEM':
-                                quality = convert('Concentration', flowunits, quality) # kg/m3
-                            elif WQ.quality_type == 'AGE':
-                                quality = convert('Water Age', flowunits, quality) # s
-                        
-                        node_dictonary['quality'].append(quality)
+                    if convert_units:
+                        if WQ.quality_type == 'CHEM':
+                            quality = convert('Concentration', flowunits, quality) # kg/m3
+                        elif WQ.quality_type == 'AGE':
+                            quality = convert('Water Age', flowunits, quality) # s
+                    
+                    node_dictonary['quality'].append(quality)
                         
                 tstep = enData.ENnextQ()
                 if tstep <= 0:
                     break
 
             enData.ENcloseQ()
+            if hydfile is not None and enData.Warnflag:
+                results.error_code = 1
+        elif binary_output:
+            # The hydraulics file is written without ENsaveH, which leaves a dangling pointer to the
+            # binary output file
+            enData.ENsavehydfile(binfile)
+            elevation = enData.get_node_values(pyepanet.EN_ELEVATION)
+            diameter = enData.get_link_values(pyepanet.EN_DIAMETER)
+            pump = np.array([enData.ENgetlinktype(i) == pyepanet.EN_PUMP
+                             for i in range(1, len(diameter)+1)])
             
         # close epanet 
         enData.ENclose()
         
+        if binary_output:
+            try:
+                if WQ:
+                    output = pyepanet.BinaryOutput(binfile)
+                else:
+                    output = pyepanet.HydraulicsFile(binfile)
+            finally:
+                os.remove(binfile)
+            if WQ:
+                results.time = output.times()
+                node_results = output.node
+                link_results = output.link
+            else:
+                node_results, link_results = output.report_results(results.time, flowunits, elevation,
+                                                                   diameter, pump)
+            quality_type = WQ.quality_type if WQ else None
+            self._read_binary_output(node_results, link_results, node_indices, link_indices, node_types,
+                                     link_types, flowunits, convert_units, quality_type, node_dictonary,
+                                     link_dictonary)
+            ntimes = len(results.time)
+        
         # Create Panel
         for key, value in node_dictonary.iteritems():
             node_dictonary[key] = np.array(value).reshape((ntimes, nnodes))
@@ -223,3 +349,43 @@ class EpanetSimulator(WaterNetworkSimulator):
         results.link = pd.Panel(link_dictonary, major_axis=results.time, minor_axis=link_names)
         
         return results
+
+    def _read_binary_output(self, node_results, link_results, node_indices, link_indices, node_types,
+                            link_types, flowunits, convert_units, quality_type, node_dictonary, link_dictonary):
+        """
+        Fill the node and link dictionaries with [time x node] and [time x link] arrays read from the
+        binary output file or the hydraulics file. The columns are in the order of node_indices and
+        link_indices (EPANET indices).
+        """
+        node_columns = np.array(node_indices, dtype=int) - 1
+        link_columns = np.array(link_indices, dtype=int) - 1
+
+        head = node_results['head'][:, node_columns]
+        ntimes = head.shape[0]
+        demand = node_results['demand'][:, node_columns]
+        pressure = node_results['pressure'][:, node_columns]
+        flow = link_results['flowrate'][:, link_columns]
+        velocity = link_results['velocity'][:, link_columns]
+        if quality_type is not None:
+            quality = node_results['quality'][:, node_columns]
+        if convert_units:
+            head = convert('Hydraulic Head', flowunits, head) # m
+            demand = convert('Demand', flowunits, demand) # m3/s
+            pressure = convert('Pressure', flowunits, pressure) # Pa
+            flow = convert('Flow', flowunits, flow) # m3/s
+            velocity = convert('Velocity', flowunits, velocity) # m/s
+            if quality_type == 'CHEM':
+                quality = convert('Concentration', flowunits, quality) # kg/m3
+            elif quality_type == 'AGE':
+                quality = convert('Water Age', flowunits, quality) # s
+
+        node_dictonary['head'] = head
+        node_dictonary['demand'] = demand
+        node_dictonary['expected_demand'] = demand.copy()
+        node_dictonary['pressure'] = pressure
+        node_dictonary['type'] = np.tile(np.array(node_types), (ntimes, 1))
+        if quality_type is not None:
+            node_dictonary['quality'] = quality
+        link_dictonary['flowrate'] = flow
+        link_dictonary['velocity'] = velocity
+        link_dictonary['type'] = np.tile(np.array(link_types), (ntimes, 1))
@@ -0,0 +1,221 @@
+import heapq
+import bisect
+import math
+import numpy as np
+from wntr.network.WaterNetworkModel import Tank
+
+import logging
+
+logger = logging.getLogger('wntr.sim.EventScheduler')
+
+
+class EventScheduler(object):
+    """
+    Schedules the times at which the hydraulics of a simulation are solved.
+
+    The simulation advances from one event to the next. The regular events are the multiples of the
+    hydraulic timestep and the reporting times. The control events are known ahead of time and are kept in
+    priority queues ordered by time: the fire times of the time controls (queued once, and again whenever a
+    daily control is fired) and the times at which the tank heads cross the thresholds of conditional
+    controls (extrapolated from the net inflows of the tanks and replaced after every solve). A timestep
+    therefore ends at the earliest control event or regular event, whichever comes first, and is never
+    longer than the hydraulic timestep. If nothing changes when the controls of a control event are fired,
+    the simulation steps on to the next event without solving (see skip_time).
+
+    Controls whose events cannot be predicted (e.g., controls of other classes) are found when the
+    controls are checked before a solve (see ControlEngine.presolve_events). These events are given as
+    backup times and are popped in groups of simultaneous events, so the simulation backs up to the time of
+    the earliest group of events whose actions change the network.
+
+    With an adaptive timestep, the regular events are chosen from the rate of change of the tank levels
+    instead: the step is the largest one (between min_timestep and max_timestep) for which the level of
+    every tank changes by at most level_tolerance, shortened to end at the next breakpoint (the times at
+    which the junction demands change) or at the end of the simulation. Control events are found in the
+    same way as with a fixed timestep.
+    """
+
+    def __init__(self, wn, adaptive=False, min_timestep=60, max_timestep=12*3600, level_tolerance=0.5,
+                 breakpoints=[]):
+        """
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+            The water network model being simulated
+        adaptive : bool
+            If True, the timestep is chosen from the rate of change of the tank levels
+        min_timestep : int
+            The smallest adaptive timestep (in seconds)
+        max_timestep : int
+            The largest adaptive timestep (in seconds)
+        level_tolerance : float
+            The largest change in the level of a tank (in meters) during an adaptive timestep
+        breakpoints : list of ints
+            The times (in seconds) at which an adaptive timestep must end
+        """
+        self._wn = wn
+        self._control_events = []
+        # (time, control index) of the upcoming fire times of time controls and tank threshold crossings
+        self._time_control_events = []
+        self._tank_events = []
+        self._regular_time = None
+        self._at_control_event = False
+        # The last control event since the last solve at which nothing changed
+        self._skipped_time = None
+        self._adaptive = adaptive
+        if adaptive:
+            if min_timestep <= 0 or max_timestep < min_timestep:
+                raise ValueError('The adaptive timestep requires 0 < min_timestep <= max_timestep.')
+            if level_tolerance <= 0:
+                raise ValueError('level_tolerance must be positive.')
+            self._min_timestep = min_timestep
+            self._max_timestep = max_timestep
+            self._level_tolerance = level_tolerance
+            self._breakpoints = sorted(breakpoints)
+            self._tank_ids = np.array([tank._store_id for tank_name, tank in wn.nodes(Tank)], dtype=int)
+
+    def next_time(self):
+        """
+        Returns the time of the next event (regular or control event) after the current simulation time.
+        """
+        if self._adaptive:
+            self._regular_time = self._next_adaptive_time()
+        else:
+            self._regular_time = self._next_regular_time()
+        self._skipped_time = None
+        return self._next_event_time()
+
+    def skip_time(self):
+        """
+        Returns the time of the next event after a control event at which nothing changed. The regular
+        event found by the last call to next_time is kept, as the network has not changed since then.
+        """
+        self._skipped_time = self._wn.sim_time
+        return self._next_event_time()
+
+    def _next_event_time(self):
+        sim_time = self._wn.sim_time
+        next_time = self._regular_time
+        self._at_control_event = False
+        for events in (self._time_control_events, self._tank_events):
+            while len(events) > 0 and events[0][0] <= sim_time:
+                heapq.heappop(events)
+            if len(events) > 0 and events[0][0] < next_time:
+                next_time = events[0][0]
+                self._at_control_event = True
+        return next_time
+
+    def at_control_event(self):
+        """
+        Returns True if the last time returned by next_time or skip_time is a control event (and not a
+        regular event).
+        """
+        return self._at_control_event
+
+    def _next_regular_time(self):
+        options = self._wn.options
+        sim_time = self._wn.sim_time
+        next_time = sim_time + options.hydraulic_timestep
+        next_time -= float(next_time) % options.hydraulic_timestep
+        report_timestep = options.report_timestep
+        if (type(report_timestep) == float or type(report_timestep) == int) and report_timestep > 0:
+            next_report_time = sim_time + report_timestep
+            next_report_time -= float(next_report_time) % report_timestep
+            if next_report_time < next_time:
+                next_time = next_report_time
+        return next_time
+
+    def _next_adaptive_time(self):
+        wn = self._wn
+        sim_time = wn.sim_time
+        duration = wn.options.duration
+        if sim_time >= duration:
+            return sim_time + self._max_timestep
+
+        timestep = self._max_timestep
+        if len(self._tank_ids) > 0:
+            store = wn._node_attributes
+            net_inflow = store.values('demand', self._tank_ids)
+            diameter = store.values('diameter', self._tank_ids)
+            level_rate = np.abs(4.0*net_inflow/(math.pi*np.power(diameter, 2.0)))
+            max_level_rate = np.max(level_rate)
+            if max_level_rate > 0:
+                timestep = min(timestep, self._level_tolerance/max_level_rate)
+        timestep = int(max(timestep, self._min_timestep))
+
+        next_time = min(sim_time + timestep, duration)
+        k = bisect.bisect_right(self._breakpoints, sim_time)
+        if k < len(self._breakpoints) and self._breakpoints[k] < next_time:
+            next_time = self._breakpoints[k]
+        return next_time
+
+    def queue_time_control_events(self, events):
+        """
+        Add the fire times of time controls to the queue of control events.
+
+        Parameters
+        ----------
+        events : list of (int, int) tuples
+            (simulation time, control index) for each fire time (see ControlEngine.time_control_events)
+        """
+        for event in events:
+            heapq.heappush(self._time_control_events, event)
+
+    def schedule_tank_events(self, events):
+        """
+        Replace the queued times at which the tank heads cross the thresholds of conditional controls.
+
+        Parameters
+        ----------
+        events : list of (int, int) tuples
+            (simulation time, control index) for each crossing (see ControlEngine.tank_events)
+        """
+        self._tank_events = list(events)
+        heapq.heapify(self._tank_events)
+
+    def schedule_control_events(self, events):
+        """
+        Replace the scheduled control events. The events at or before a control event that was skipped since
+        the last solve (see skip_time) are dropped, as their controls were fired then and changed nothing.
+
+        Parameters
+        ----------
+        events : list of (int, int) tuples
+            (backup time, control index) for each event, where the event occurred backup time seconds before
+            the current simulation time
+        """
+        sim_time = self._wn.sim_time
+        self._control_events = [(sim_time - backup_time, i, backup_time) for backup_time, i in events]
+        if self._skipped_time is not None:
+            self._control_events = [event for event in self._control_events if event[0] > self._skipped_time]
+        heapq.heapify(self._control_events)
+
+    def pop_control_events(self):
+        """
+        Remove the earliest group of simultaneous control events from the queue.
+
+        Returns
+        -------
+        backup_time : int
+            The time (in seconds before the current simulation time) of the events, or 0 if no events are left
+        controls_to_activate : list of ints
+            The indices of the controls of the events, in increasing order
+        """
+        events = self._control_events
+        if len(events) == 0:
+            return 0, []
+        event_time, i, backup_time = heapq.heappop(events)
+        controls_to_activate = [i]
+        while len(events) > 0 and events[0][0] == event_time:
+            controls_to_activate.append(heapq.heappop(events)[1])
+        if self._adaptive:
+            assert backup_time <= self._max_timestep, 'Backup time is larger than the maximum timestep'
+        else:
+            assert backup_time <= self._wn.options.hydraulic_timestep, 'Backup time is larger than hydraulic timestep'
+        logger.debug('{0} control events at {1}'.format(len(controls_to_activate), event_time))
+        return backup_time, controls_to_activate
+
+    def has_control_events(self):
+        """
+        Returns True if control events are left in the queue.
+        """
+        return len(self._control_events) > 0
@@ -0,0 +1,247 @@
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg
+from LinearSolver import LinearSolver
+import logging
+try:
+    from sksparse.cholmod import cholesky, CholmodError
+except ImportError:
+    cholesky = None
+
+logger = logging.getLogger('wntr.sim.GGALinearSolver')
+
+class GGALinearSolver(object):
+    """
+    Linear solver that exploits the block structure of the jacobian built by HydraulicModel
+    (see HydraulicModel._set_jacobian_structure), as in the Global Gradient Algorithm used by
+    EPANET.
+
+    The headloss block of the jacobian (jac_G) and the demand block of the demand/head equations
+    (jac_E) are diagonal, and the leak equations have an identity block (jac_I). The flow,
+    demand, and leak demand steps are therefore eliminated analytically, leaving a system in the
+    heads of the non-isolated junctions only. The reduced matrix is the negative of a weighted
+    graph laplacian (plus diagonal pressure-driven demand and leak terms), so its negative is
+    symmetric positive definite when all headloss derivatives have the same sign. It is
+    factorized with CHOLMOD (if scikits.sparse is installed) or with LinearSolver using a
+    symmetric fill-reducing ordering. The structure of the reduced system only changes when the
+    set of isolated junctions changes, so the symbolic analysis is reused between iterations and
+    timesteps. The flows, demands, and leak demands are then recovered from the heads.
+
+    The elimination requires every headloss derivative to be nonzero. If any derivative is
+    smaller (in absolute value) than GGA_MIN_DERIVATIVE (e.g., for active PRVs, whose headloss
+    equation does not depend on the flow, or for pumps operating beyond their curve), or if the
+    reduced system cannot be factorized, the full jacobian is solved with LinearSolver instead.
+
+    The reduced matrix is assembled from the jacobian blocks of the model, so solve must be
+    called with the jacobian most recently returned by model.get_jacobian.
+    """
+
+    def __init__(self, model, options={}):
+        """
+        Parameters
+        ----------
+        model: HydraulicModel
+        options: dict
+            GGA_FACTORIZATION: 'CHOLMOD' or 'SUPERLU' (default = 'CHOLMOD' if scikits.sparse is installed,
+                               otherwise 'SUPERLU')
+            GGA_MIN_DERIVATIVE: the smallest absolute headloss derivative for which the reduced system
+                                is used (default = 1e-6)
+        """
+        self._options = options
+        self.model = model
+
+        if 'GGA_FACTORIZATION' not in self._options:
+            self.factorization = 'CHOLMOD' if cholesky is not None else 'SUPERLU'
+        else:
+            self.factorization = self._options['GGA_FACTORIZATION'].upper()
+        if self.factorization == 'CHOLMOD' and cholesky is None:
+            raise ImportError('Error importing scikits.sparse while creating the GGA linear solver.'
+                              'Make sure scikits.sparse is installed and added to path.')
+        if self.factorization not in ['CHOLMOD', 'SUPERLU']:
+            raise ValueError('GGA_FACTORIZATION must be "CHOLMOD" or "SUPERLU".')
+
+        if 'GGA_MIN_DERIVATIVE' not in self._options:
+            self.min_derivative = 1e-6
+        else:
+            self.min_derivative = self._options['GGA_MIN_DERIVATIVE']
+
+        self._full_solver = LinearSolver(self._options)
+        reduced_options = dict(self._options)
+        reduced_options['PERMC_SPEC'] = 'MMD_AT_PLUS_A'
+        self._reduced_solver = LinearSolver(reduced_options)
+        self._set_structure()
+        self.reset()
+
+    def _set_structure(self):
+        """
+        Each link contributes four entries to the reduced matrix (start/end node rows and
+        columns), and each node contributes one diagonal entry.
+        """
+        model = self.model
+        start = np.array(model.link_start_nodes, dtype=int)
+        end = np.array(model.link_end_nodes, dtype=int)
+        nodes = np.arange(model.num_nodes)
+        self._start = start
+        self._end = end
+        self._rows = np.concatenate((start, start, end, end, nodes))
+        self._cols = np.concatenate((start, end, start, end, nodes))
+        self._leak_nodes = np.array(model._leak_ids, dtype=int)
+
+    def reset(self):
+        """
+        Discard the factorizations.
+        """
+        self._full_solver.reset()
+        self._reduced_solver.reset()
+        self._factor = None
+        self._free_key = None
+        self.last_solve_reused = False
+
+        self.num_reduced_solves = 0
+        self.num_full_solves = 0
+
+    def refactorize(self):
+        """
+        Force the next solve to compute a new numeric factorization.
+        """
+        self._full_solver.refactorize()
+        self._reduced_solver.refactorize()
+
+    def solve(self, A, b):
+        """
+        Solve A*x = b, where A is the jacobian of the model.
+
+        Parameters
+        ----------
+        A : scipy.sparse matrix
+            The jacobian (only used if the reduced system cannot be solved)
+        b : numpy array
+            The right hand side
+
+        Returns
+        -------
+        x : numpy array
+        """
+        model = self.model
+        G = model.jac_G.data
+        if len(G) > 0 and np.min(np.abs(G)) < self.min_derivative:
+            return self._full_solve(A, b)
+
+        x = self._reduced_solve(b)
+        if x is None:
+            return self._full_solve(A, b)
+        self.num_reduced_solves += 1
+        return x
+
+    def _full_solve(self, A, b):
+        self.num_full_solves += 1
+        self.last_solve_reused = False
+        x = self._full_solver.solve(A, b)
+        self.last_solve_reused = self._full_solver.last_solve_reused
+        return x
+
+    def _set_free_nodes(self, free):
+        """
+        Set up the reduced system for a new set of unknown heads. K (the negative of the reduced
+        matrix restricted to the free nodes) is stored as a coo_matrix whose structure does not
+        change until the set of free nodes changes.
+        """
+        self._free_key = free.tostring()
+        free_ids = np.flatnonzero(free)
+        position = -np.ones(self.model.num_nodes, dtype=int)
+        position[free_ids] = np.arange(len(free_ids))
+        self._free_ids = free_ids
+        self._ff_mask = free[self._rows] & free[self._cols]
+        self._fx_mask = free[self._rows] & np.logical_not(free[self._cols])
+        self._fx_rows = position[self._rows[self._fx_mask]]
+        self._fx_cols = self._cols[self._fx_mask]
+        n_f = len(free_ids)
+        self._K = sp.coo_matrix((np.zeros(np.sum(self._ff_mask)),
+                                 (position[self._rows[self._ff_mask]], position[self._cols[self._ff_mask]])),
+                                shape=(n_f, n_f))
+        self._factor = None
+
+    def _reduced_solve(self, b):
+        model = self.model
+        n_n = model.num_nodes
+        n_l = model.num_links
+        r1 = b[:n_n]
+        r2 = b[n_n:2*n_n]
+        r3 = b[2*n_n:2*n_n+n_l]
+        r4 = b[2*n_n+n_l:]
+
+        D = model.jac_D.data
+        E = model.jac_E.data
+        F_start = model.jac_F.data[:n_l]
+        F_end = model.jac_F.data[n_l:]
+        W = 1.0/model.jac_G.data
+        leak_derivatives = model.jac_H.data
+
+        # Nodes with a zero demand derivative (tanks, reservoirs, and isolated junctions) have
+        # a known head step; the remaining junctions are the unknowns of the reduced system.
+        free = E != 0.0
+        fixed = np.logical_not(free)
+        if free.tostring() != self._free_key:
+            self._set_free_nodes(free)
+
+        diag = np.zeros(n_n)
+        diag[free] = D[free]/E[free]
+        if len(self._leak_nodes) > 0:
+            np.add.at(diag, self._leak_nodes, leak_derivatives)
+        # -B*diag(W)*F - C*H + diag(D/E); the node balance matrix B has -1 at the start node
+        # and 1 at the end node of each link, and C is -1 at the leak nodes.
+        values = np.concatenate((W*F_start, W*F_end, -W*F_start, -W*F_end, diag))
+
+        dh = np.zeros(n_n)
+        dh[fixed] = r2[fixed]/D[fixed]
+
+        # -B*diag(W)*r3 - C*r4
+        link_rhs = W*r3
+        rhs = r1 + np.bincount(self._start, weights=link_rhs, minlength=n_n) - \
+              np.bincount(self._end, weights=link_rhs, minlength=n_n)
+        rhs[free] += r2[free]/E[free]
+        if len(r4) > 0:
+            rhs += np.bincount(self._leak_nodes, weights=r4, minlength=n_n)
+
+        free_ids = self._free_ids
+        if len(free_ids) > 0:
+            rhs_f = rhs[free_ids] - np.bincount(self._fx_rows, weights=values[self._fx_mask]*dh[self._fx_cols],
+                                                minlength=len(free_ids))
+            # K = -S_ff is symmetric positive definite
+            self._K.data = -values[self._ff_mask]
+            dh_free = self._factorize_and_solve(self._K, -rhs_f)
+            if dh_free is None:
+                return None
+            dh[free_ids] = dh_free
+
+        df = W*(r3 - F_start*dh[self._start] - F_end*dh[self._end])
+        dl = r4 - leak_derivatives*dh[self._leak_nodes]
+
+        dd = np.zeros(n_n)
+        dd[free] = (r2[free] - D[free]*dh[free])/E[free]
+        node_flow = np.bincount(self._end, weights=df, minlength=n_n) - \
+                    np.bincount(self._start, weights=df, minlength=n_n)
+        if len(dl) > 0:
+            node_flow -= np.bincount(self._leak_nodes, weights=dl, minlength=n_n)
+        dd[fixed] = node_flow[fixed] - r1[fixed]
+
+        return np.concatenate((dh, dd, df, dl))
+
+    def _factorize_and_solve(self, K, rhs):
+        if self.factorization == 'CHOLMOD':
+            try:
+                if self._factor is None:
+                    self._factor = cholesky(K.tocsc())
+                else:
+                    self._factor.cholesky_inplace(K.tocsc())
+                return self._factor(rhs)
+            except CholmodError as e:
+                logger.debug('Reduced system could not be factorized ({0}); solving the full system.'.format(e))
+                self._factor = None
+                return None
+        else:
+            try:
+                return self._reduced_solver.solve(K, rhs)
+            except sp.linalg.MatrixRankWarning:
+                logger.debug('Reduced system is singular; solving the full system.')
+                return None
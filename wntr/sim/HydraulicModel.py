@@ -56,13 +56,88 @@ class HydraulicModel(object):
         # Global constants
         self._initialize_global_constants()
 
+        # {pump curve points: (A, B, C)}; the fits are kept when the model is recompiled
+        self._head_curve_coefficients_cache = {}
+
+        self._compile(self._get_topology())
+
+    def reset(self):
+        """
+        Prepare the model for another simulation of the network.
+
+        The parameters that can change without changing the structure of the model (elevations,
+        minimum and nominal pressures, leak coefficients and areas, pipe roughnesses, diameters and
+        lengths, pump curves and powers) are read from the network again. Demands and statuses are
+        read from the network at every timestep, so they need no reset.
+
+        Structural changes are recompiled as locally as possible:
+
+        - If leaks were added or removed, only the leak ids and the leak blocks of the jacobian
+          are rebuilt.
+        - If pump or valve types changed, only the ids of the pumps and valves of each type are
+          rebuilt.
+        - If nodes or links were added or removed, or their connectivity changed, the node and
+          link ids change, so the whole model is recompiled (the fits of the pump curves are
+          reused).
+
+        Returns
+        -------
+        recompiled : bool
+            True if any part of the model was recompiled (the size or structure of the jacobian
+            may have changed)
+        """
+        topology = self._get_topology()
+        structure, leak_nodes, link_types = topology
+        if structure != self._topology[0]:
+            self._compile(topology)
+            return True
+        recompiled = False
+        if link_types != self._topology[2]:
+            self._initialize_link_type_maps()
+            recompiled = True
+        if leak_nodes != self._topology[1]:
+            self._initialize_leak_maps()
+            self._set_leak_jacobian_structure()
+            recompiled = True
+        self._topology = topology
+        self._set_node_parameters()
+        self._set_link_parameters()
+        return recompiled
+
+    def _get_topology(self):
+        """
+        Returns a tuple (structure, leak nodes, link types) describing the structure of the model.
+        The structure holds the nodes and links (in the order of their ids), their ids in the
+        attribute stores, and the start and end nodes of the links. The leak nodes are the names of
+        the nodes that can leak, and the link types are the types of the pumps and valves.
+        """
+        nodes = []
+        leak_nodes = []
+        for node_type in [Junction, Tank, Reservoir]:
+            for node_name, node in self._wn.nodes(node_type):
+                nodes.append((node_type, node_name, node._store_id))
+                if node_type != Reservoir and node._leak:
+                    leak_nodes.append(node_name)
+        links = []
+        link_types = []
+        for link_type in [Pipe, Pump, Valve]:
+            for link_name, link in self._wn.links(link_type):
+                links.append((link_type, link_name, link._store_id, link.start_node(), link.end_node()))
+                if link_type == Pump:
+                    link_types.append(link.info_type)
+                elif link_type == Valve:
+                    link_types.append(link.valve_type)
+        return (tuple(nodes), tuple(links)), tuple(leak_nodes), tuple(link_types)
+
+    def _compile(self, topology):
+        self._topology = topology
+
         # Initialize dictionaries to map between node/link names and ids
         self._initialize_name_id_maps()
 
         # Number of nodes and links
         self.num_nodes = self._wn.num_nodes()
         self.num_links = self._wn.num_links()
-        self.num_leaks = len(self._leak_ids)
         self.num_junctions = self._wn.num_junctions()
         self.num_tanks = self._wn.num_tanks()
         self.num_reservoirs = self._wn.num_reservoirs()
@@ -70,6 +145,9 @@ class HydraulicModel(object):
         self.num_pumps = self._wn.num_pumps()
         self.num_valves = self._wn.num_valves()
 
+        self._initialize_leak_maps()
+        self._initialize_link_type_maps()
+
         # Initialize residuals
         # Equations will be ordered:
         #    1.) Node mass balance residuals
@@ -78,7 +156,6 @@ class HydraulicModel(object):
         self.node_balance_residual = np.ones(self.num_nodes)
         self.demand_or_head_residual = np.ones(self.num_nodes)
         self.headloss_residual = np.ones(self.num_links)
-        self.leak_demand_residual = np.ones(self.num_leaks)
 
         # Set miscelaneous link and node attributes
         self._set_node_attributes()
@@ -167,9 +244,6 @@ class HydraulicModel(object):
         self._junction_ids = []
         self._tank_ids = []
         self._reservoir_ids = []
-        self._leak_ids = []
-        # {node_id: index_of_node_in_leak_ids}; e.g. _leak_ids = [0, 4, 18], _leak_idx = {0:0, 4:1, 18:2}
-        self._leak_idx = {}
 
         # Lists of types of links
         # self._link_ids is ordered by increasing id. In fact, the index equals the id.
@@ -179,25 +253,13 @@ class HydraulicModel(object):
         self._link_ids = []  # ordering is viatl! Must be pipes the pumps then valves
         self._pipe_ids = []
         self._pump_ids = []
-        self.power_pump_ids = []
-        self.head_pump_ids = []
         self._valve_ids = []
-        self._prv_ids = []
-        self._psv_ids = []
-        self._pbv_ids = []
-        self._fcv_ids = []
-        self._tcv_ids = []
 
         # Lists of types of nodes and links.
         # The values in the lists are attributes of the classes NodeTypes and LinkTypes
         # found in WaterNetworkModel.py. The index is the node/link id.
         self.node_types = []
         self.link_types = []
-        # Dictionary indicating whether or not the leak is active. False means inactive, True means active. 
-        self.leak_status = {}
-        # Dictionary indicating whether or not the node could have a leak; True if node._leak is True;
-        # False if node._leak is False
-        self.could_have_leak = {}
 
         n = 0
         for node_name, node in self._wn.nodes(Junction):
@@ -206,14 +268,6 @@ class HydraulicModel(object):
             self._node_ids.append(n)
             self._junction_ids.append(n)
             self.node_types.append(NodeTypes.junction)
-            if node._leak:
-                self._leak_idx[n] = len(self._leak_ids)
-                self._leak_ids.append(n)
-                self.leak_status[n] = False
-                self.could_have_leak[n] = True
-            else:
-                self.leak_status[n] = False
-                self.could_have_leak[n] = False
             n += 1
 
         for node_name, node in self._wn.nodes(Tank):
@@ -222,14 +276,6 @@ class HydraulicModel(object):
             self._node_ids.append(n)
             self._tank_ids.append(n)
             self.node_types.append(NodeTypes.tank)
-            if node._leak:
-                self._leak_idx[n] = len(self._leak_ids)
-                self._leak_ids.append(n)
-                self.leak_status[n] = False
-                self.could_have_leak[n] = True
-            else:
-                self.leak_status[n] = False
-                self.could_have_leak[n] = False
             n += 1
 
         for node_name, node in self._wn.nodes(Reservoir):
@@ -238,8 +284,6 @@ class HydraulicModel(object):
             self._node_ids.append(n)
             self._reservoir_ids.append(n)
             self.node_types.append(NodeTypes.reservoir)
-            self.leak_status[n] = False
-            self.could_have_leak[n] = False
             n += 1
 
         l = 0
@@ -257,12 +301,6 @@ class HydraulicModel(object):
             self._link_ids.append(l)
             self._pump_ids.append(l)
             self.link_types.append(LinkTypes.pump)
-            if link.info_type == 'POWER':
-                self.power_pump_ids.append(l)
-            elif link.info_type == 'HEAD':
-                self.head_pump_ids.append(l)
-            else:
-                raise RuntimeError('Pump type not recognized.')
             l += 1
 
         for link_name, link in self._wn.links(Valve):
@@ -271,23 +309,111 @@ class HydraulicModel(object):
             self._link_ids.append(l)
             self._valve_ids.append(l)
             self.link_types.append(LinkTypes.valve)
+            l += 1
+
+        # Ids of the nodes and links in the attribute stores of the network (see AttributeStore),
+        # indexed by node/link id. These are used to read and write the attributes of all nodes
+        # or links at once.
+        self._node_store_ids = np.array([self._wn.get_node(self._node_id_to_name[node_id])._store_id
+                                         for node_id in self._node_ids], dtype=int)
+        self._link_store_ids = np.array([self._wn.get_link(self._link_id_to_name[link_id])._store_id
+                                         for link_id in self._link_ids], dtype=int)
+
+    def _initialize_leak_maps(self):
+        """
+        Set the ids of the nodes that can leak. These only change the leak demand variables and
+        equations of the model.
+        """
+        self._leak_ids = []
+        # {node_id: index_of_node_in_leak_ids}; e.g. _leak_ids = [0, 4, 18], _leak_idx = {0:0, 4:1, 18:2}
+        self._leak_idx = {}
+        # Dictionary indicating whether or not the leak is active. False means inactive, True means active. 
+        self.leak_status = {}
+        # Dictionary indicating whether or not the node could have a leak; True if node._leak is True;
+        # False if node._leak is False
+        self.could_have_leak = {}
+
+        for node_id in self._node_ids:
+            node = self._wn.get_node(self._node_id_to_name[node_id])
+            could_have_leak = self.node_types[node_id] != NodeTypes.reservoir and node._leak
+            if could_have_leak:
+                self._leak_idx[node_id] = len(self._leak_ids)
+                self._leak_ids.append(node_id)
+            self.leak_status[node_id] = False
+            self.could_have_leak[node_id] = could_have_leak
+
+        self.num_leaks = len(self._leak_ids)
+        self.leak_demand_residual = np.ones(self.num_leaks)
+        # Arrays indexed by leak index (the position of the node in self._leak_ids)
+        self._leak_ids_array = np.array(self._leak_ids, dtype=int)
+        self._leak_junction_mask = self._leak_ids_array < self.num_junctions
+
+    def _initialize_link_type_maps(self):
+        """
+        Set the ids of the pumps and valves of each type. These only change which equations are
+        used for the pumps and valves, not the structure of the jacobian.
+        """
+        self.power_pump_ids = []
+        self.head_pump_ids = []
+        self._prv_ids = []
+        self._psv_ids = []
+        self._pbv_ids = []
+        self._fcv_ids = []
+        self._tcv_ids = []
+
+        for link_id in self._pump_ids:
+            link = self._wn.get_link(self._link_id_to_name[link_id])
+            if link.info_type == 'POWER':
+                self.power_pump_ids.append(link_id)
+            elif link.info_type == 'HEAD':
+                self.head_pump_ids.append(link_id)
+            else:
+                raise RuntimeError('Pump type not recognized.')
+
+        for link_id in self._valve_ids:
+            link = self._wn.get_link(self._link_id_to_name[link_id])
             if link.valve_type == 'PRV':
-                self._prv_ids.append(l)
+                self._prv_ids.append(link_id)
             elif link.valve_type == 'PSV':
-                self._psv_ids.append(l)
+                self._psv_ids.append(link_id)
             elif link.valve_type == 'PBV':
-                self._pbv_ids.append(l)
+                self._pbv_ids.append(link_id)
             elif link.valve_type == 'FCV':
-                self._fcv_ids.append(l)
+                self._fcv_ids.append(link_id)
             elif link.valve_type == 'TCV':
-                self._tcv_ids.append(l)
+                self._tcv_ids.append(link_id)
             else:
                 raise RuntimeError('Valve type not recognized: '+link.valve_type)
-            l += 1
+
+        self._power_pump_ids_array = np.array(self.power_pump_ids, dtype=int)
+        self._prv_ids_array = np.array(self._prv_ids, dtype=int)
+        self._head_pump_ids_array = np.array(self.head_pump_ids, dtype=int)
 
     def _set_node_attributes(self):
         self.out_link_ids_for_nodes = [[] for i in xrange(self.num_nodes)]
         self.in_link_ids_for_nodes = [[] for i in xrange(self.num_nodes)]
+
+        for node_type in [Junction, Tank, Reservoir]:
+            for node_name, node in self._wn.nodes(node_type):
+                node_id = self._node_name_to_id[node_name]
+                connected_links = self._wn.get_links_for_node(node_name)
+                for link_name in connected_links:
+                    link = self._wn.get_link(link_name)
+                    link_id = self._link_name_to_id[link_name]
+                    if link.start_node() == node_name:
+                        self.out_link_ids_for_nodes[node_id].append(link_id)
+                    elif link.end_node() == node_name:
+                        self.in_link_ids_for_nodes[node_id].append(link_id)
+                    else:
+                        raise RuntimeError('Node is neither start nor end node.')
+
+        self._set_node_parameters()
+
+    def _set_node_parameters(self):
+        """
+        Set the node attributes that do not change the structure of the model: elevations, minimum and
+        nominal pressures, and leak coefficients and areas.
+        """
         self.node_elevations = np.zeros(self.num_nodes)
         self.nominal_pressures = np.ones(self.num_junctions)
         self.minimum_pressures = np.zeros(self.num_junctions)
@@ -312,16 +438,6 @@ class HydraulicModel(object):
 
         for node_name, node in self._wn.nodes(wntr.network.Junction):
             node_id = self._node_name_to_id[node_name]
-            connected_links = self._wn.get_links_for_node(node_name)
-            for link_name in connected_links:
-                link = self._wn.get_link(link_name)
-                link_id = self._link_name_to_id[link_name]
-                if link.start_node() == node_name:
-                    self.out_link_ids_for_nodes[node_id].append(link_id)
-                elif link.end_node() == node_name:
-                    self.in_link_ids_for_nodes[node_id].append(link_id)
-                else:
-                    raise RuntimeError('Node is neither start nor end node.')
             self.node_elevations[node_id] = node.elevation
             self.nominal_pressures[node_id] = node.nominal_pressure
             self.minimum_pressures[node_id] = node.minimum_pressure
@@ -334,46 +450,19 @@ class HydraulicModel(object):
 
         for node_name, node in self._wn.nodes(wntr.network.Tank):
             node_id = self._node_name_to_id[node_name]
-            connected_links = self._wn.get_links_for_node(node_name)
-            for link_name in connected_links:
-                link = self._wn.get_link(link_name)
-                link_id = self._link_name_to_id[link_name]
-                if link.start_node() == node_name:
-                    self.out_link_ids_for_nodes[node_id].append(link_id)
-                elif link.end_node() == node_name:
-                    self.in_link_ids_for_nodes[node_id].append(link_id)
-                else:
-                    raise RuntimeError('Node is neither start nor end node.')
             self.node_elevations[node_id] = node.elevation
             if node._leak:
                 self.leak_Cd[node_id] = node.leak_discharge_coeff
                 self.leak_area[node_id] = node.leak_area
                 self.get_leak_poly_coeffs(node, node_id)
 
-        for node_name, node in self._wn.nodes(wntr.network.Reservoir):
-            node_id = self._node_name_to_id[node_name]
-            connected_links = self._wn.get_links_for_node(node_name)
-            for link_name in connected_links:
-                link = self._wn.get_link(link_name)
-                link_id = self._link_name_to_id[link_name]
-                if link.start_node() == node_name:
-                    self.out_link_ids_for_nodes[node_id].append(link_id)
-                elif link.end_node() == node_name:
-                    self.in_link_ids_for_nodes[node_id].append(link_id)
-                else:
-                    raise RuntimeError('Node is neither start nor end node.')
-            self.node_elevations[node_id] = 0.0
+        self.leak_Cd_array = np.array([self.leak_Cd[node_id] for node_id in self._leak_ids])
+        self.leak_area_array = np.array([self.leak_area[node_id] for node_id in self._leak_ids])
+        self.leak_poly_coeffs_array = np.array([self.leak_poly_coeffs[node_id] for node_id in self._leak_ids]).reshape((self.num_leaks, 4))
 
     def _set_link_attributes(self):
         self.link_start_nodes = range(self.num_links)
         self.link_end_nodes = range(self.num_links)
-        self.pipe_resistance_coefficients = np.zeros(self.num_links)
-        self.pipe_diameters = {}
-        self.head_curve_coefficients = {}
-        self.max_pump_flows = {}
-        self.pump_poly_coefficients = {}  # {pump_id: (a,b,c,d)} a*x**3 + b*x**2 + c*x + d
-        self.pump_line_params = {} # {pump_id: (q_bar, h_bar)} h = pump_m*(q-q_bar)+h_bar
-        self.pump_powers = {}
 
         for link_name, link in self._wn.links():
             link_id = self._link_name_to_id[link_name]
@@ -383,28 +472,77 @@ class HydraulicModel(object):
             end_node_id = self._node_name_to_id[end_node_name]
             self.link_start_nodes[link_id] = start_node_id
             self.link_end_nodes[link_id] = end_node_id
-            if link_id in self._pipe_ids:
-                self.pipe_resistance_coefficients[link_id] = (self._Hw_k*(link.roughness**(-1.852)) *
-                                                              (link.diameter**(-4.871))*link.length)  # Hazen-Williams
-                self.pipe_diameters[link_id] = link.diameter
-            elif link_id in self._valve_ids:
-                self.pipe_resistance_coefficients[link_id] = self._Dw_k*0.02*link.diameter**(-5)*link.diameter*2
-            else:
-                self.pipe_resistance_coefficients[link_id] = 0
-            if link_id in self._pump_ids:
-                if link.info_type == 'HEAD':
-                    A, B, C = link.get_head_curve_coefficients()
-                    self.head_curve_coefficients[link_id] = (A, B, C)
-                    self.max_pump_flows[link_id] = (A/B)**(1.0/C)
-                    if C <= 1:
-                        a, b, c, d = self.get_pump_poly_coefficients(A, B, C)
-                        self.pump_poly_coefficients[link_id] = (a, b, c, d)
-                    else:
-                        q_bar, h_bar = self.get_pump_line_params(A, B, C)
-                        self.pump_line_params[link_id] = (q_bar, h_bar)
-                elif link.info_type == 'POWER':
-                    self.pump_powers[link_id] = link.power
-                    self.max_pump_flows[link_id] = None
+
+        self.link_start_nodes = np.array(self.link_start_nodes, dtype=int)
+        self.link_end_nodes = np.array(self.link_end_nodes, dtype=int)
+
+        self._pump_ids_array = np.array(self._pump_ids, dtype=int)
+
+        self._set_link_parameters()
+
+    def _set_link_parameters(self):
+        """
+        Set the link attributes that do not change the structure of the model: pipe resistance
+        coefficients and diameters, pump curves, and pump powers.
+        """
+        self.pipe_resistance_coefficients = np.zeros(self.num_links)
+        self.pipe_diameters = {}
+        self.head_curve_coefficients = {}
+        self.max_pump_flows = {}
+        self.pump_poly_coefficients = {}  # {pump_id: (a,b,c,d)} a*x**3 + b*x**2 + c*x + d
+        self.pump_line_params = {} # {pump_id: (q_bar, h_bar)} h = pump_m*(q-q_bar)+h_bar
+        self.pump_powers = {}
+
+        for link_name, link in self._wn.links(Pipe):
+            link_id = self._link_name_to_id[link_name]
+            self.pipe_resistance_coefficients[link_id] = (self._Hw_k*(link.roughness**(-1.852)) *
+                                                          (link.diameter**(-4.871))*link.length)  # Hazen-Williams
+            self.pipe_diameters[link_id] = link.diameter
+
+        for link_name, link in self._wn.links(Valve):
+            link_id = self._link_name_to_id[link_name]
+            self.pipe_resistance_coefficients[link_id] = self._Dw_k*0.02*link.diameter**(-5)*link.diameter*2
+
+        for link_name, link in self._wn.links(Pump):
+            link_id = self._link_name_to_id[link_name]
+            if link.info_type == 'HEAD':
+                A, B, C = self._get_head_curve_coefficients(link)
+                self.head_curve_coefficients[link_id] = (A, B, C)
+                self.max_pump_flows[link_id] = (A/B)**(1.0/C)
+                if C <= 1:
+                    a, b, c, d = self.get_pump_poly_coefficients(A, B, C)
+                    self.pump_poly_coefficients[link_id] = (a, b, c, d)
+                else:
+                    q_bar, h_bar = self.get_pump_line_params(A, B, C)
+                    self.pump_line_params[link_id] = (q_bar, h_bar)
+            elif link.info_type == 'POWER':
+                self.pump_powers[link_id] = link.power
+                self.max_pump_flows[link_id] = None
+
+        # Index arrays used to evaluate the pump and valve equations with numpy masks.
+        # Head pumps are grouped by the type of smoothing used for the pump curve:
+        #     C > 1:  the curve is extended with a line for flows below q_bar
+        #     C <= 1: a polynomial connects a line for negative flows with the curve
+        self.power_pump_powers = np.array([self.pump_powers[link_id] for link_id in self.power_pump_ids])
+        line_ids = [link_id for link_id in self.head_pump_ids if self.head_curve_coefficients[link_id][2] > 1]
+        poly_ids = [link_id for link_id in self.head_pump_ids if self.head_curve_coefficients[link_id][2] <= 1]
+        self._line_pump_ids_array = np.array(line_ids, dtype=int)
+        self._line_pump_coeffs = np.array([self.head_curve_coefficients[link_id] for link_id in line_ids]).reshape((len(line_ids), 3))
+        self._line_pump_params = np.array([self.pump_line_params[link_id] for link_id in line_ids]).reshape((len(line_ids), 2))
+        self._poly_pump_ids_array = np.array(poly_ids, dtype=int)
+        self._poly_pump_coeffs = np.array([self.head_curve_coefficients[link_id] for link_id in poly_ids]).reshape((len(poly_ids), 3))
+        self._poly_pump_poly_coeffs = np.array([self.pump_poly_coefficients[link_id] for link_id in poly_ids]).reshape((len(poly_ids), 4))
+        self._pipe_diameter_array = np.array([self.pipe_diameters[link_id] for link_id in self._pipe_ids])
+        self._max_head_pump_flows = np.array([self.max_pump_flows[link_id] for link_id in self.head_pump_ids])
+
+    def _get_head_curve_coefficients(self, pump):
+        # Fitting a pump curve can require a call to fsolve, so the fits are cached by the points of the curve
+        key = tuple(tuple(point) for point in pump.curve.points)
+        coefficients = self._head_curve_coefficients_cache.get(key)
+        if coefficients is None:
+            coefficients = pump.get_head_curve_coefficients()
+            self._head_curve_coefficients_cache[key] = coefficients
+        return coefficients
 
     def _form_node_balance_matrix(self):
         # The node balance matrix should never be modified! It is also used in the jacobian!
@@ -423,11 +561,13 @@ class HydraulicModel(object):
         self.node_balance_matrix = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_nodes, self.num_links))
 
     def _form_link_headloss_matrix(self):
-        headloss_matrix = np.matrix(np.zeros((self.num_links, self.num_nodes)))
-        for link_id in self._link_ids:
-            headloss_matrix[link_id, self.link_start_nodes[link_id]] = 1.0
-            headloss_matrix[link_id, self.link_end_nodes[link_id]] = -1.0
-        self.link_headloss_matrix = sparse.coo_matrix(headloss_matrix)
+        # Entries are ordered by row and then by column
+        rows = np.repeat(np.arange(self.num_links), 2)
+        cols = np.column_stack((self.link_start_nodes, self.link_end_nodes)).ravel()
+        values = np.tile([1.0, -1.0], self.num_links)
+        order = np.lexsort((cols, rows))
+        self.link_headloss_matrix = sparse.coo_matrix((values[order], (rows[order], cols[order])),
+                                                      shape=(self.num_links, self.num_nodes))
 
     def _set_jacobian_structure(self):
         """
@@ -493,47 +633,23 @@ class HydraulicModel(object):
             f(H-z) otherwise
         """
 
-        big_jac_values = np.array([])
-        big_jac_rows = np.array([])
-        big_jac_cols = np.array([])
-
         values = -1.0*np.ones(self.num_nodes)
         rows = range(self.num_nodes)
         cols = range(self.num_nodes)
         self.jac_A = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_nodes, self.num_nodes))
-        big_jac_values = np.concatenate((big_jac_values, self.jac_A.data))
-        big_jac_rows = np.concatenate((big_jac_rows, self.jac_A.row))
-        big_jac_cols = np.concatenate((big_jac_cols, self.jac_A.col+self.num_nodes))
 
         # This object is used for things other than the jacobian; Don't modify it!
         self.jac_B = self.node_balance_matrix
-        big_jac_values = np.concatenate((big_jac_values, self.jac_B.data))
-        big_jac_rows = np.concatenate((big_jac_rows, self.jac_B.row))
-        big_jac_cols = np.concatenate((big_jac_cols, self.jac_B.col+2*self.num_nodes))
-
-        values = -1.0*np.ones(self.num_leaks)
-        rows = list(self._leak_ids)
-        cols = range(self.num_leaks)
-        self.jac_C = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_nodes, self.num_leaks))
-        big_jac_values = np.concatenate((big_jac_values, self.jac_C.data))
-        big_jac_rows = np.concatenate((big_jac_rows, self.jac_C.row))
-        big_jac_cols = np.concatenate((big_jac_cols, self.jac_C.col+(2*self.num_nodes+self.num_links)))
 
         values = [0.0 for i in self._junction_ids]+[1.0 for i in self._tank_ids]+[1.0 for i in self._reservoir_ids]
         rows = range(self.num_nodes)
         cols = range(self.num_nodes)
         self.jac_D = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_nodes, self.num_nodes))
-        big_jac_values = np.concatenate((big_jac_values, self.jac_D.data))
-        big_jac_rows = np.concatenate((big_jac_rows, self.jac_D.row+self.num_nodes))
-        big_jac_cols = np.concatenate((big_jac_cols, self.jac_D.col))
 
         values = [1.0 for i in self._junction_ids]+[0.0 for i in self._tank_ids]+[0.0 for i in self._reservoir_ids]
         rows = range(self.num_nodes)
         cols = range(self.num_nodes)
         self.jac_E = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_nodes, self.num_nodes))
-        big_jac_values = np.concatenate((big_jac_values, self.jac_E.data))
-        big_jac_rows = np.concatenate((big_jac_rows, self.jac_E.row+self.num_nodes))
-        big_jac_cols = np.concatenate((big_jac_cols, self.jac_E.col+self.num_nodes))
 
         # jac_F will be a coo_matrix for easy updating.
         # Note that it might need to be converted to csr before doing arithmetic
@@ -566,37 +682,47 @@ class HydraulicModel(object):
             cols.append(self.link_end_nodes[link_id])
         self.jac_F = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_links, self.num_nodes))
         self.standard_jac_F_data = np.array(values)
-        big_jac_values = np.concatenate((big_jac_values, self.jac_F.data))
-        big_jac_rows = np.concatenate((big_jac_rows, self.jac_F.row+(2*self.num_nodes)))
-        big_jac_cols = np.concatenate((big_jac_cols, self.jac_F.col))
 
         values = np.ones(self.num_links)
         rows = range(self.num_links)
         cols = range(self.num_links)
         self.jac_G = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_links, self.num_links))
-        big_jac_values = np.concatenate((big_jac_values, self.jac_G.data))
-        big_jac_rows = np.concatenate((big_jac_rows, self.jac_G.row+(2*self.num_nodes)))
-        big_jac_cols = np.concatenate((big_jac_cols, self.jac_G.col+(2*self.num_nodes)))
+
+        self._set_leak_jacobian_structure()
+
+    def _set_leak_jacobian_structure(self):
+        """
+        Create the blocks of the jacobian for the leak demands (jac_C, jac_H, and jac_I) and assemble
+        the jacobian from all of the blocks. Only these blocks change when leaks are added or removed.
+        """
+        values = -1.0*np.ones(self.num_leaks)
+        rows = list(self._leak_ids)
+        cols = range(self.num_leaks)
+        self.jac_C = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_nodes, self.num_leaks))
 
         values = np.zeros(self.num_leaks)
         rows = range(self.num_leaks)
         cols = list(self._leak_ids)
         self.jac_H = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_leaks, self.num_nodes))
-        big_jac_values = np.concatenate((big_jac_values, self.jac_H.data))
-        big_jac_rows = np.concatenate((big_jac_rows, self.jac_H.row+(2*self.num_nodes+self.num_links)))
-        big_jac_cols = np.concatenate((big_jac_cols, self.jac_H.col))
 
         values = np.ones(self.num_leaks)
         rows = range(self.num_leaks)
         cols = range(self.num_leaks)
         self.jac_I = sparse.coo_matrix((values, (rows, cols)), shape=(self.num_leaks, self.num_leaks))
-        big_jac_values = np.concatenate((big_jac_values, self.jac_I.data))
-        big_jac_rows = np.concatenate((big_jac_rows, self.jac_I.row+(2*self.num_nodes+self.num_links)))
-        big_jac_cols = np.concatenate((big_jac_cols, self.jac_I.col+(2*self.num_nodes+self.num_links)))
 
+        # (block, row offset, column offset) in the order used by get_jacobian
+        heads, demands = 0, self.num_nodes
+        flows = 2*self.num_nodes
+        leaks = 2*self.num_nodes+self.num_links
+        blocks = [(self.jac_A, heads, demands), (self.jac_B, heads, flows), (self.jac_C, heads, leaks),
+                  (self.jac_D, demands, heads), (self.jac_E, demands, demands),
+                  (self.jac_F, flows, heads), (self.jac_G, flows, flows),
+                  (self.jac_H, leaks, heads), (self.jac_I, leaks, leaks)]
+        big_jac_values = np.concatenate([block.data for block, row, col in blocks])
+        big_jac_rows = np.concatenate([block.row+row for block, row, col in blocks])
+        big_jac_cols = np.concatenate([block.col+col for block, row, col in blocks])
         self.jacobian = sparse.coo_matrix((big_jac_values, (big_jac_rows, big_jac_cols)),
-                                          shape=(2*self.num_nodes+self.num_links+self.num_leaks,
-                                                 2*self.num_nodes+self.num_links+self.num_leaks))
+                                          shape=(leaks+self.num_leaks, leaks+self.num_leaks))
 
         # self.jac_AinvB = self.jac_A*self.jac_B
         # self.jac_AinvC = self.jac_A*self.jac_C
@@ -657,9 +783,8 @@ class HydraulicModel(object):
                                             self.standard_jac_F_data[:self.num_links])
         self.jac_F.data[self.num_links:] = ((1.0-self.isolated_link_array)*self.closed_link_array *
                                             self.standard_jac_F_data[self.num_links:])
-        for link_id in self._prv_ids:
-            if self.link_status[link_id] == LinkStatus.active:
-                self.jac_F.data[link_id] = 0
+        prv_status = np.array([self.link_status[link_id] for link_id in self._prv_ids])
+        self.jac_F.data[self._prv_ids_array[prv_status == LinkStatus.active]] = 0
 
         # self.jac_G.data = (self.isolated_link_array + (1.0 - self.closed_link_array) -
         #                        self.isolated_link_array * (1.0 - self.closed_link_array))
@@ -706,9 +831,9 @@ class HydraulicModel(object):
             last_segment[np.bitwise_not((P > (minP+delta))*(P <= (nomP-delta)))] = 0.0
             self.jac_D.data[:n_j] = self.jac_D.data[:n_j] + last_segment*(1-self.isolated_junction_array)
 
-        for link_id in self.power_pump_ids:
-            self.jac_F.data[link_id] = 1000.0*self._g*flows[link_id]
-            self.jac_F.data[self.num_links+link_id] = -1000.0*self._g*flows[link_id]
+        power_ids = self._power_pump_ids_array
+        self.jac_F.data[power_ids] = 1000.0*self._g*flows[power_ids]
+        self.jac_F.data[self.num_links+power_ids] = -1000.0*self._g*flows[power_ids]
 
         pf = abs(flows[:self.num_pipes])
         coeff = self.pipe_resistance_coefficients[:self.num_pipes]
@@ -728,71 +853,9 @@ class HydraulicModel(object):
                                             )
                                             )
 
-        for link_id in self.head_pump_ids:
-            if self.isolated_link_array[link_id] == 1 or self.closed_link_array[link_id] == 0:
-                self.jac_G.data[link_id] = 1.0
-            else:
-                A,B,C = self.head_curve_coefficients[link_id]
-                if C > 1:
-                    q_bar, h_bar = self.pump_line_params[link_id]
-                    if flows[link_id] >= q_bar:
-                        self.jac_G.data[link_id] = (-B * C * flows[link_id] ** (C - 1.0))
-                    else:
-                        self.jac_G.data[link_id] = self.pump_m
-                else:
-                    if flows[link_id] <= self.pump_q1:
-                        self.jac_G.data[link_id] = self.pump_m
-                    elif flows[link_id] <= self.pump_q2:
-                        a,b,c,d = self.pump_poly_coefficients[link_id]
-                        self.jac_G.data[link_id] = (3.0 * a * flows[link_id] ** 2 + 2.0 * b * flows[link_id] + c)
-                    else:
-                        self.jac_G.data[link_id] = (-B * C * flows[link_id] ** (C - 1.0))
-                # self.jac_G_inv.data[link_id] = 1.0 / self.jac_G_inv.data[link_id]
-        for link_id in self.power_pump_ids:
-            if self.isolated_link_array[link_id] == 1 or self.closed_link_array[link_id] == 0:
-                self.jac_G.data[link_id] = 1.0
-            else:
-                start_node_id = self.link_start_nodes[link_id]
-                end_node_id = self.link_end_nodes[link_id]
-                self.jac_G.data[link_id] = (1000.0*self._g*heads[start_node_id] - 1000.0*self._g*heads[end_node_id])
-                # self.jac_G_inv.data[link_id] = 1.0 / self.jac_G_inv.data[link_id]
-        for link_id in self._prv_ids:
-            if self.isolated_link_array[link_id] ==1 or self.closed_link_array[link_id] == 0:
-                self.jac_G.data[link_id] = 1.0
-            elif self.link_status[link_id] == LinkStatus.opened:
-                self.jac_G.data[link_id] = 2.0*self.pipe_resistance_coefficients[link_id]*abs(flows[link_id])
-                # self.jac_G_inv.data[link_id] = 1.0 / self.jac_G_inv.data[link_id]
-            elif self.link_status[link_id] == LinkStatus.active:
-                self.jac_G.data[link_id] = 0.0
-
-        for ndx, node_id in enumerate(self._leak_ids):
-            if not self.leak_status[node_id]:
-                self.jac_H.data[ndx] = 0.0
-            elif self.node_types[node_id] == NodeTypes.junction:
-                if self.isolated_junction_array[node_id] == 1:
-                    self.jac_H.data[ndx] = 0.0
-                else:
-                    m = 1.0e-11
-                    P = heads[node_id] - self.node_elevations[node_id]
-                    if P <= 0.0:
-                        self.jac_H.data[ndx] = -m
-                    elif P <= 1.0e-4:
-                        a,b,c,d = self.leak_poly_coeffs[node_id]
-                        self.jac_H.data[ndx] = -3.0*a*P**2 - 2.0*b*P - c
-                    else:
-                        self.jac_H.data[ndx] = -0.5*self.leak_Cd[node_id]*self.leak_area[node_id]*\
-                                               math.sqrt(2.0*self._g)*P**(-0.5)
-            else:
-                m = 1.0e-11
-                P = heads[node_id] - self.node_elevations[node_id]
-                if P <= 0.0:
-                    self.jac_H.data[ndx] = -m
-                elif P <= 1.0e-4:
-                    a,b,c,d = self.leak_poly_coeffs[node_id]
-                    self.jac_H.data[ndx] = -3.0*a*P**2 - 2.0*b*P - c
-                else:
-                    self.jac_H.data[ndx] = -0.5*self.leak_Cd[node_id]*self.leak_area[node_id]*\
-                                           math.sqrt(2.0*self._g)*P**(-0.5)
+        self.get_pump_jacobian(heads, flows)
+        self.get_prv_jacobian(flows)
+        self.get_leak_jacobian(heads)
 
         self.jacobian.data = np.concatenate((self.jac_A.data,self.jac_B.data,self.jac_C.data,self.jac_D.data,
                                              self.jac_E.data,self.jac_F.data,self.jac_G.data,self.jac_H.data,
@@ -803,6 +866,70 @@ class HydraulicModel(object):
         # self.check_jac(x)
         return self.jacobian
 
+    def get_pump_jacobian(self, heads, flows):
+        """
+        Set the derivatives of the pump headloss equations with respect to flow (jac_G).
+        Derivatives for closed and isolated pumps are 1.
+        """
+        ids = self._line_pump_ids_array
+        if len(ids) > 0:
+            A, B, C = self._line_pump_coeffs.T
+            q_bar = self._line_pump_params[:, 0]
+            f = flows[ids]
+            values = self.pump_m*np.ones(len(ids))
+            curve = f >= q_bar
+            values[curve] = -B[curve]*C[curve]*f[curve]**(C[curve]-1.0)
+            values[self._line_pump_inactive_mask] = 1.0
+            self.jac_G.data[ids] = values
+
+        ids = self._poly_pump_ids_array
+        if len(ids) > 0:
+            A, B, C = self._poly_pump_coeffs.T
+            a, b, c, d = self._poly_pump_poly_coeffs.T
+            f = flows[ids]
+            values = self.pump_m*np.ones(len(ids))
+            poly = (f > self.pump_q1) & (f <= self.pump_q2)
+            values[poly] = 3.0*a[poly]*f[poly]**2 + 2.0*b[poly]*f[poly] + c[poly]
+            curve = f > self.pump_q2
+            values[curve] = -B[curve]*C[curve]*f[curve]**(C[curve]-1.0)
+            values[self._poly_pump_inactive_mask] = 1.0
+            self.jac_G.data[ids] = values
+
+        ids = self._power_pump_ids_array
+        if len(ids) > 0:
+            values = 1000.0*self._g*(heads[self.link_start_nodes[ids]] - heads[self.link_end_nodes[ids]])
+            values[self._power_pump_inactive_mask] = 1.0
+            self.jac_G.data[ids] = values
+
+    def get_prv_jacobian(self, flows):
+        """
+        Set the derivatives of the PRV headloss equations with respect to flow (jac_G).
+        """
+        ids = self._prv_ids_array
+        values = self.jac_G.data[ids]
+        values[self._prv_inactive_mask] = 1.0
+        open_ids = ids[self._prv_open_mask]
+        values[self._prv_open_mask] = 2.0*self.pipe_resistance_coefficients[open_ids]*abs(flows[open_ids])
+        values[self._prv_active_mask] = 0.0
+        self.jac_G.data[ids] = values
+
+    def get_leak_jacobian(self, heads):
+        """
+        Set the derivatives of the leak demand equations with respect to head (jac_H).
+        Derivatives for inactive leaks and leaks at isolated junctions are 0.
+        """
+        m = 1.0e-11
+        P = heads[self._leak_ids_array] - self.node_elevations[self._leak_ids_array]
+        a, b, c, d = self.leak_poly_coeffs_array.T
+        values = -m*np.ones(self.num_leaks)
+        poly = (P > 0.0) & (P <= 1.0e-4)
+        values[poly] = -3.0*a[poly]*P[poly]**2 - 2.0*b[poly]*P[poly] - c[poly]
+        orifice = P > 1.0e-4
+        values[orifice] = (-0.5*self.leak_Cd_array[orifice]*self.leak_area_array[orifice]*
+                           math.sqrt(2.0*self._g)*P[orifice]**(-0.5))
+        values[np.logical_not(self._active_leak_mask)] = 0.0
+        self.jac_H.data[:] = values
+
     def get_node_balance_residual(self, flow, demand, leak_demand):
         """
         Mass balance at all the nodes
@@ -818,8 +945,7 @@ class HydraulicModel(object):
         """
 
         self.node_balance_residual = self.node_balance_matrix*flow - demand
-        for node_id in self._leak_ids:
-            self.node_balance_residual[node_id] -= leak_demand[self._leak_idx[node_id]]
+        self.node_balance_residual[self._leak_ids_array] -= leak_demand
 
     def get_headloss_residual(self, head, flow):
 
@@ -851,56 +977,60 @@ class HydraulicModel(object):
 
         get_pipe_headloss_residual()
 
-        def get_pump_headloss_residual():
-            for link_id in self._pump_ids:
-                link_flow = flow[link_id]
-                if self.link_status[link_id] == wntr.network.LinkStatus.closed or link_id in self.isolated_link_ids:
-                    self.headloss_residual[link_id] = link_flow
-                else:
-                    start_node_id = self.link_start_nodes[link_id]
-                    end_node_id = self.link_end_nodes[link_id]
-
-                    if link_id in self.head_curve_coefficients.keys():
-                        A,B,C = self.head_curve_coefficients[link_id]
-                        if C > 1:
-                            q_bar, h_bar = self.pump_line_params[link_id]
-                            if link_flow >= q_bar:
-                                pump_headgain = A - B*link_flow**C
-                            else:
-                                pump_headgain = self.pump_m*(link_flow - q_bar) + h_bar
-                        else:
-                            if link_flow <= self.pump_q1:
-                                pump_headgain = self.pump_m*link_flow + A
-                            elif link_flow <= self.pump_q2:
-                                a, b, c, d = self.pump_poly_coefficients[link_id]
-                                pump_headgain = a*link_flow**3 + b*link_flow**2 + c*link_flow + d
-                            else:
-                                pump_headgain = A - B*link_flow**C
-                        self.headloss_residual[link_id] = pump_headgain - (head[end_node_id] - head[start_node_id])
-                    elif link_id in self.pump_powers.keys():
-                        self.headloss_residual[link_id] = self.pump_powers[link_id] + (head_diff_vector[link_id])*flow[link_id]*self._g*1000.0
-                    else:
-                        raise RuntimeError('Only power and head pumps are currently supported.')
-        get_pump_headloss_residual()
-
-        def get_valve_headloss_residual():
-            for link_id in self._prv_ids:
-                link_flow = flow[link_id]
-                start_node_id = self.link_start_nodes[link_id]
-                end_node_id = self.link_end_nodes[link_id]
-
-                if self.link_status[link_id] == wntr.network.LinkStatus.closed or link_id in self.isolated_link_ids:
-                    self.headloss_residual[link_id] = link_flow
-                elif self.link_status[link_id] == LinkStatus.active:
-                    self.headloss_residual[link_id] = head[end_node_id] - (self.valve_settings[link_id]+self.node_elevations[end_node_id])
-                elif self.link_status[link_id] == LinkStatus.opened:
-                    pipe_resistance_coeff = self.pipe_resistance_coefficients[link_id]
-                    pipe_headloss = pipe_resistance_coeff*abs(flow[link_id])**2
-                    self.headloss_residual[link_id] = pipe_headloss - (head_diff_vector[link_id])
-        get_valve_headloss_residual()
+        self.get_pump_headloss_residual(head, flow, head_diff_vector)
+        self.get_valve_headloss_residual(head, flow, head_diff_vector)
         # print self.headloss_residual
         # raise RuntimeError('just stopping')
 
+    def get_pump_headloss_residual(self, head, flow, head_diff_vector):
+        """
+        Headloss residuals for pumps. The residual for closed and isolated pumps is the flow.
+        """
+        ids = self._line_pump_ids_array
+        if len(ids) > 0:
+            A, B, C = self._line_pump_coeffs.T
+            q_bar, h_bar = self._line_pump_params.T
+            f = flow[ids]
+            pump_headgain = self.pump_m*(f - q_bar) + h_bar
+            curve = f >= q_bar
+            pump_headgain[curve] = A[curve] - B[curve]*f[curve]**C[curve]
+            self.headloss_residual[ids] = pump_headgain + head_diff_vector[ids]
+
+        ids = self._poly_pump_ids_array
+        if len(ids) > 0:
+            A, B, C = self._poly_pump_coeffs.T
+            a, b, c, d = self._poly_pump_poly_coeffs.T
+            f = flow[ids]
+            pump_headgain = self.pump_m*f + A
+            poly = (f > self.pump_q1) & (f <= self.pump_q2)
+            pump_headgain[poly] = a[poly]*f[poly]**3 + b[poly]*f[poly]**2 + c[poly]*f[poly] + d[poly]
+            curve = f > self.pump_q2
+            pump_headgain[curve] = A[curve] - B[curve]*f[curve]**C[curve]
+            self.headloss_residual[ids] = pump_headgain + head_diff_vector[ids]
+
+        ids = self._power_pump_ids_array
+        self.headloss_residual[ids] = self.power_pump_powers + head_diff_vector[ids]*flow[ids]*self._g*1000.0
+
+        inactive_ids = self._pump_ids_array[self._pump_inactive_mask]
+        self.headloss_residual[inactive_ids] = flow[inactive_ids]
+
+    def get_valve_headloss_residual(self, head, flow, head_diff_vector):
+        """
+        Headloss residuals for PRVs. The residual for closed and isolated PRVs is the flow.
+        """
+        ids = self._prv_ids_array
+        inactive_ids = ids[self._prv_inactive_mask]
+        self.headloss_residual[inactive_ids] = flow[inactive_ids]
+
+        active_ids = ids[self._prv_active_mask]
+        end_node_ids = self.link_end_nodes[active_ids]
+        self.headloss_residual[active_ids] = head[end_node_ids] - (self.prv_settings[self._prv_active_mask] +
+                                                                   self.node_elevations[end_node_ids])
+
+        open_ids = ids[self._prv_open_mask]
+        self.headloss_residual[open_ids] = (self.pipe_resistance_coefficients[open_ids]*abs(flow[open_ids])**2 -
+                                            head_diff_vector[open_ids])
+
     def get_demand_or_head_residual(self, head, demand):
 
         if self.pressure_driven:
@@ -953,19 +1083,15 @@ class HydraulicModel(object):
 
     def get_leak_demand_residual(self, head, leak_demand):
         m = 1.0e-11
-        for node_id in self._leak_ids:
-            leak_idx = self._leak_idx[node_id]
-            if self.leak_status[node_id] and node_id not in self.isolated_junction_ids:
-                p = head[node_id] - self.node_elevations[node_id]
-                if p <= 0:
-                    self.leak_demand_residual[leak_idx] = leak_demand[leak_idx] - m*p
-                elif p <= 1.0e-4:
-                    a,b,c,d = self.leak_poly_coeffs[node_id]
-                    self.leak_demand_residual[leak_idx] = leak_demand[leak_idx] - (a*p**3+b*p**2+c*p+d)
-                else:
-                    self.leak_demand_residual[leak_idx] = leak_demand[leak_idx] - self.leak_Cd[node_id]*self.leak_area[node_id]*math.sqrt(2.0*self._g*p)
-            else:
-                self.leak_demand_residual[leak_idx] = leak_demand[leak_idx]
+        p = head[self._leak_ids_array] - self.node_elevations[self._leak_ids_array]
+        a, b, c, d = self.leak_poly_coeffs_array.T
+        leak_flow = m*p
+        poly = (p > 0.0) & (p <= 1.0e-4)
+        leak_flow[poly] = a[poly]*p[poly]**3 + b[poly]*p[poly]**2 + c[poly]*p[poly] + d[poly]
+        orifice = p > 1.0e-4
+        leak_flow[orifice] = self.leak_Cd_array[orifice]*self.leak_area_array[orifice]*np.sqrt(2.0*self._g*p[orifice])
+        leak_flow[np.logical_not(self._active_leak_mask)] = 0.0
+        self.leak_demand_residual = leak_demand - leak_flow
 
     def correct_step(self,d_head,d_demand,d_flow,d_leak,x):
         heads = x[:self.num_nodes]
@@ -1089,120 +1215,100 @@ class HydraulicModel(object):
         return x
 
     def initialize_results_dict(self):
-        # Data for results object
+        """
+        Preallocate the arrays used to store results. Each array is indexed by [time, node id]
+        or [time, link id]. The arrays are sized for the number of reporting times and grow
+        in chunks if more results are saved (e.g., when report_timestep is 'ALL').
+        """
+        options = self._wn.options
+        if type(options.report_timestep) == float or type(options.report_timestep) == int:
+            num_times = int(options.duration // options.report_timestep) + 1
+        else:
+            num_times = int(options.duration // options.hydraulic_timestep) + 1
+        num_times = max(num_times, 1)
+
+        self._num_saved_results = 0
         self._sim_results = {}
-        self._sim_results['node_name'] = []
-        self._sim_results['node_type'] = []
-        self._sim_results['node_times'] = []
-        self._sim_results['node_head'] = []
-        self._sim_results['node_demand'] = []
-        self._sim_results['node_expected_demand'] = []
-        self._sim_results['node_pressure'] = []
-        self._sim_results['leak_demand'] = []
-        self._sim_results['link_name'] = []
-        self._sim_results['link_type'] = []
-        self._sim_results['link_times'] = []
-        self._sim_results['link_flowrate'] = []
-        self._sim_results['link_velocity'] = []
-        self._sim_results['link_status'] = []
-
-    def save_results(self, x, results):
+        for key in ['node_head', 'node_demand', 'node_expected_demand', 'node_pressure', 'leak_demand']:
+            self._sim_results[key] = np.zeros((num_times, self.num_nodes))
+        for key in ['link_flowrate', 'link_velocity']:
+            self._sim_results[key] = np.zeros((num_times, self.num_links))
+        self._sim_results['link_status'] = np.zeros((num_times, self.num_links), dtype=int)
+
+        node_type_names = {NodeTypes.junction: 'Junction', NodeTypes.tank: 'Tank', NodeTypes.reservoir: 'Reservoir'}
+        self._node_type_names = np.array([node_type_names[node_type] for node_type in self.node_types], dtype=object)
+        self._link_type_names = np.array([LinkTypes.link_type_to_str(link_type) for link_type in self.link_types],
+                                         dtype=object)
+
+    def _grow_results(self):
+        for key, value in self._sim_results.iteritems():
+            self._sim_results[key] = np.concatenate((value, np.zeros_like(value)), axis=0)
+
+    def save_results(self, x, results, junction_demand=None, link_status=None, isolated_junctions=None):
+        """
+        Save the solution x (or a solution interpolated between timesteps, along with the expected
+        junction demands, the link statuses, and the isolated junctions at that time) as the next set
+        of results.
+        """
         head = x[:self.num_nodes]
         demand = x[self.num_nodes:2*self.num_nodes]
         flow = x[2*self.num_nodes:(2*self.num_nodes+self.num_links)]
         leak_demand = x[(2*self.num_nodes+self.num_links):]
-        for node_id in self._junction_ids:
-            head_n = head[node_id]
-            self._sim_results['node_type'].append('Junction')
-            self._sim_results['node_head'].append(head_n)
-            self._sim_results['node_demand'].append(demand[node_id])
-            self._sim_results['node_expected_demand'].append(self.junction_demand[node_id])
-            if node_id in self.isolated_junction_ids:
-                self._sim_results['node_pressure'].append(0.0)
-            else:
-                self._sim_results['node_pressure'].append(head_n - self.node_elevations[node_id])
-            if node_id in self._leak_ids:
-                leak_idx = self._leak_ids.index(node_id)
-                leak_demand_n = leak_demand[leak_idx]
-                self._sim_results['leak_demand'].append(leak_demand_n)
-            else:
-                self._sim_results['leak_demand'].append(0.0)
-        for node_id in self._tank_ids:
-            head_n = head[node_id]
-            demand_n = demand[node_id]
-            self._sim_results['node_type'].append('Tank')
-            self._sim_results['node_head'].append(head_n)
-            self._sim_results['node_demand'].append(demand_n)
-            self._sim_results['node_expected_demand'].append(demand_n)
-            self._sim_results['node_pressure'].append(head_n - self.node_elevations[node_id])
-            if node_id in self._leak_ids:
-                leak_idx = self._leak_ids.index(node_id)
-                leak_demand_n = leak_demand[leak_idx]
-                self._sim_results['leak_demand'].append(leak_demand_n)
-            else:
-                self._sim_results['leak_demand'].append(0.0)
-        for node_id in self._reservoir_ids:
-            demand_n = demand[node_id]
-            self._sim_results['node_type'].append('Reservoir')
-            self._sim_results['node_head'].append(head[node_id])
-            self._sim_results['node_demand'].append(demand_n)
-            self._sim_results['node_expected_demand'].append(demand_n)
-            self._sim_results['node_pressure'].append(0.0)
-            self._sim_results['leak_demand'].append(0.0)
 
-        for link_id in self._pipe_ids:
-            self._sim_results['link_type'].append(LinkTypes.link_type_to_str(self.link_types[link_id]))
-            self._sim_results['link_flowrate'].append(flow[link_id])
-            self._sim_results['link_velocity'].append(abs(flow[link_id])*4.0/(math.pi*self.pipe_diameters[link_id]**2.0))
-            self._sim_results['link_status'].append(self.link_status[link_id])
-        for link_id in self._pump_ids:
-            self._sim_results['link_type'].append(LinkTypes.link_type_to_str(self.link_types[link_id]))
-            self._sim_results['link_flowrate'].append(flow[link_id])
-            self._sim_results['link_velocity'].append(0.0)
-            self._sim_results['link_status'].append(self.link_status[link_id])
-            if self.max_pump_flows[link_id] is not None:
-                if flow[link_id]>self.max_pump_flows[link_id]:
-                    link_name = self._link_id_to_name[link_id]
-                    link = self._wn.get_link(link_name)
-                    start_node_name = link.start_node()
-                    end_node_name = link.end_node()
-                    start_node_id = self._node_name_to_id[start_node_name]
-                    end_node_id = self._node_name_to_id[end_node_name]
-                    start_head = head[start_node_id]
-                    end_head = head[end_node_id]
-                    warnings.warn('Pump '+link_name+' has exceeded its maximum flow.')
-                    logger.warning('Pump {0} has exceeded its maximum flow. Pump head: {1}; Pump flow: {2}; Max pump flow: {3}'.format(link_name,end_head-start_head, flow[link_id], self.max_pump_flows[link_id]))
-        for link_id in self._valve_ids:
-            self._sim_results['link_type'].append(LinkTypes.link_type_to_str(self.link_types[link_id]))
-            self._sim_results['link_flowrate'].append(flow[link_id])
-            self._sim_results['link_velocity'].append(0.0)
-            self._sim_results['link_status'].append(self.link_status[link_id])
+        if self._num_saved_results >= self._sim_results['node_head'].shape[0]:
+            self._grow_results()
+        t = self._num_saved_results
+        self._num_saved_results += 1
+
+        n_j = self.num_junctions
+        n_jt = self.num_junctions + self.num_tanks
+        self._sim_results['node_head'][t] = head
+        self._sim_results['node_demand'][t] = demand
+        expected_demand = self._sim_results['node_expected_demand'][t]
+        if junction_demand is None:
+            junction_demand = self.junction_demand
+        expected_demand[:n_j] = junction_demand
+        expected_demand[n_j:] = demand[n_j:]
+        pressure = self._sim_results['node_pressure'][t]
+        pressure[:n_jt] = head[:n_jt] - self.node_elevations[:n_jt]
+        if isolated_junctions is None:
+            isolated_junctions = self.isolated_junction_array
+        pressure[:n_j][isolated_junctions == 1.0] = 0.0
+        pressure[n_jt:] = 0.0
+        self._sim_results['leak_demand'][t][self._leak_ids_array] = leak_demand
+
+        self._sim_results['link_flowrate'][t] = flow
+        velocity = self._sim_results['link_velocity'][t]
+        velocity[:self.num_pipes] = abs(flow[:self.num_pipes])*4.0/(math.pi*self._pipe_diameter_array**2.0)
+        if link_status is None:
+            link_status = self.link_status_array
+        self._sim_results['link_status'][t] = link_status
+
+        pump_ids = self._head_pump_ids_array
+        for link_id in pump_ids[flow[pump_ids] > self._max_head_pump_flows]:
+            link_name = self._link_id_to_name[link_id]
+            start_head = head[self.link_start_nodes[link_id]]
+            end_head = head[self.link_end_nodes[link_id]]
+            warnings.warn('Pump '+link_name+' has exceeded its maximum flow.')
+            logger.warning('Pump {0} has exceeded its maximum flow. Pump head: {1}; Pump flow: {2}; Max pump flow: {3}'.format(link_name,end_head-start_head, flow[link_id], self.max_pump_flows[link_id]))
 
     def get_results(self,results):
         ntimes = len(results.time)
-        nnodes = self.num_nodes
-        nlinks = self.num_links
-        tmp_node_names = self._junction_ids+self._tank_ids+self._reservoir_ids
-        tmp_link_names = self._pipe_ids+self._pump_ids+self._valve_ids
-        node_names = [self._node_id_to_name[i] for i in tmp_node_names]
-        link_names = [self._link_id_to_name[i] for i in tmp_link_names]
-
-        node_dictionary = {'demand': self._sim_results['node_demand'],
-                           'expected_demand': self._sim_results['node_expected_demand'],
-                           'head': self._sim_results['node_head'],
-                           'pressure': self._sim_results['node_pressure'],
-                           'leak_demand': self._sim_results['leak_demand'],
-                           'type': self._sim_results['node_type']}
-        for key,value in node_dictionary.iteritems():
-            node_dictionary[key] = np.array(value).reshape((ntimes,nnodes))
+        node_names = [self._node_id_to_name[i] for i in self._node_ids]
+        link_names = [self._link_id_to_name[i] for i in self._link_ids]
+
+        node_dictionary = {'demand': self._sim_results['node_demand'][:ntimes],
+                           'expected_demand': self._sim_results['node_expected_demand'][:ntimes],
+                           'head': self._sim_results['node_head'][:ntimes],
+                           'pressure': self._sim_results['node_pressure'][:ntimes],
+                           'leak_demand': self._sim_results['leak_demand'][:ntimes],
+                           'type': np.tile(self._node_type_names, (ntimes, 1))}
         results.node = pd.Panel(node_dictionary, major_axis=results.time, minor_axis=node_names)
 
-        link_dictionary = {'flowrate':self._sim_results['link_flowrate'],
-                           'velocity':self._sim_results['link_velocity'],
-                           'type':self._sim_results['link_type'],
-                           'status':self._sim_results['link_status']}
-        for key, value in link_dictionary.iteritems():
-            link_dictionary[key] = np.array(value).reshape((ntimes, nlinks))
+        link_dictionary = {'flowrate': self._sim_results['link_flowrate'][:ntimes],
+                           'velocity': self._sim_results['link_velocity'][:ntimes],
+                           'type': np.tile(self._link_type_names, (ntimes, 1)),
+                           'status': self._sim_results['link_status'][:ntimes]}
         results.link = pd.Panel(link_dictionary, major_axis=results.time, minor_axis=link_names)
 
     def set_network_inputs_by_id(self):
@@ -1227,17 +1333,12 @@ class HydraulicModel(object):
         for reservoir_name, reservoir in self._wn.nodes(Reservoir):
             reservoir_id = self._node_name_to_id[reservoir_name]
             self.reservoir_head[reservoir_id] = reservoir.head
-        for junction_name, junction in self._wn.nodes(Junction):
-            junction_id = self._node_name_to_id[junction_name]
-            #if junction_id in self.isolated_junction_ids:
-            #    self.junction_demand[junction_id] = 0.0
-            #else:
-            self.junction_demand[junction_id] = junction.expected_demand
-            if junction._leak:
-                self.leak_status[junction_id] = junction.leak_status
-        for link_name, link in self._wn.links():
-            link_id = self._link_name_to_id[link_name]
-            self.link_status[link_id] = link.status
+        junction_store_ids = self._node_store_ids[:self.num_junctions]
+        self.junction_demand[:] = self._wn._node_attributes['expected_demand'][junction_store_ids]
+        for junction_id in self._leak_ids_array[self._leak_junction_mask].tolist():
+            self.leak_status[junction_id] = self._wn.get_node(self._node_id_to_name[junction_id]).leak_status
+        link_status = self._wn._link_attributes['status'][self._link_store_ids].tolist()
+        self.link_status = dict(zip(self._link_ids, link_status))
         for valve_name, valve in self._wn.links(Valve):
             valve_id = self._link_name_to_id[valve_name]
             self.valve_settings[valve_id] = valve.setting
@@ -1247,10 +1348,25 @@ class HydraulicModel(object):
             self.pump_speeds[pump_id] = pump.speed
             if pump._cv_status == wntr.network.LinkStatus.closed:
                 self.link_status[pump_id] = pump._cv_status
-        for link_id in self._link_ids:
-            if self.link_status[link_id] == wntr.network.LinkStatus.closed:
-                self.closed_links.add(link_id)
-                self.closed_link_array[link_id] = 0.0
+        self.link_status_array = np.array([self.link_status[link_id] for link_id in self._link_ids], dtype=int)
+        closed_link_ids = np.flatnonzero(self.link_status_array == wntr.network.LinkStatus.closed)
+        self.closed_links = set(closed_link_ids.tolist())
+        self.closed_link_array[closed_link_ids] = 0.0
+
+        # Masks used by the vectorized pump, valve, and leak equations
+        inactive_links = (self.isolated_link_array == 1.0) | (self.closed_link_array == 0.0)
+        self._pump_inactive_mask = inactive_links[self._pump_ids_array]
+        self._line_pump_inactive_mask = inactive_links[self._line_pump_ids_array]
+        self._poly_pump_inactive_mask = inactive_links[self._poly_pump_ids_array]
+        self._power_pump_inactive_mask = inactive_links[self._power_pump_ids_array]
+        self._prv_inactive_mask = inactive_links[self._prv_ids_array]
+        prv_status = np.array([self.link_status[link_id] for link_id in self._prv_ids])
+        self._prv_active_mask = np.logical_and(prv_status == LinkStatus.active, np.logical_not(self._prv_inactive_mask))
+        self._prv_open_mask = np.logical_and(prv_status == LinkStatus.opened, np.logical_not(self._prv_inactive_mask))
+        self.prv_settings = np.array([self.valve_settings[link_id] for link_id in self._prv_ids])
+        self._active_leak_mask = np.array([self.leak_status[node_id] for node_id in self._leak_ids], dtype=bool)
+        self._active_leak_mask[self._leak_junction_mask] &= (
+            self.isolated_junction_array[self._leak_ids_array[self._leak_junction_mask]] == 0.0)
 
     def update_tank_heads(self):
         for tank_name, tank in self._wn.nodes(Tank):
@@ -1258,10 +1374,13 @@ class HydraulicModel(object):
             delta_h = 4.0*q_net*(self._wn.sim_time-self._wn.prev_sim_time)/(math.pi*tank.diameter**2)
             tank.head = tank.prev_head + delta_h
 
-    def update_junction_demands(self, demand_dict):
-        t = math.floor(self._wn.sim_time/self._wn.options.hydraulic_timestep)
-        for junction_name, junction in self._wn.nodes(Junction):
-            junction.expected_demand = demand_dict[(junction_name,t)]
+    def update_junction_demands(self, demands):
+        """
+        Set the expected demands of the junctions at the current hydraulic timestep (see DemandEngine).
+        """
+        t = int(math.floor(self._wn.sim_time/self._wn.options.hydraulic_timestep))
+        junction_store_ids = self._node_store_ids[:self.num_junctions]
+        self._wn._node_attributes['expected_demand'][junction_store_ids] = demands.demands(t)
 
     def reset_isolated_junctions(self):
         self.isolated_junction_names = set()
@@ -1279,59 +1398,32 @@ class HydraulicModel(object):
 
     def update_network_previous_values(self):
         self._wn.prev_sim_time = self._wn.sim_time
-        for name, node in self._wn.nodes(Junction):
-            node.prev_head = node.head
-            node.prev_demand = node.demand
-            node.prev_expected_demand = node.expected_demand
-            node.prev_leak_demand = node.leak_demand
-        for name, node in self._wn.nodes(Tank):
-            node.prev_head = node.head
-            node.prev_demand = node.demand
-            node.prev_leak_demand = node.leak_demand
-        for name, node in self._wn.nodes(Reservoir):
-            node.prev_head = node.head
-            node.prev_demand = node.demand
-        for link_name, link in self._wn.links(Pipe):
-            link.prev_flow = link.flow
+        nodes = self._wn._node_attributes
+        node_ids = self._node_store_ids
+        junction_ids = node_ids[:self.num_junctions]
+        # reservoirs do not have a previous leak demand
+        junction_and_tank_ids = node_ids[:self.num_junctions+self.num_tanks]
+        nodes['prev_head'][node_ids] = nodes['head'][node_ids]
+        nodes['prev_demand'][node_ids] = nodes['demand'][node_ids]
+        nodes['prev_expected_demand'][junction_ids] = nodes['expected_demand'][junction_ids]
+        nodes['prev_leak_demand'][junction_and_tank_ids] = nodes['leak_demand'][junction_and_tank_ids]
+        links = self._wn._link_attributes
+        links['prev_flow'][self._link_store_ids] = links['flow'][self._link_store_ids]
         for link_name, link in self._wn.links(Pump):
-            link.prev_flow = link.flow
             link._prev_power_outage = link._power_outage
-        for link_name, link in self._wn.links(Valve):
-            link.prev_flow = link.flow
 
     def store_results_in_network(self, x):
         head = x[:self.num_nodes]
         demand = x[self.num_nodes:self.num_nodes*2]
         flow = x[self.num_nodes*2:(2*self.num_nodes+self.num_links)]
         leak_demand = x[(2*self.num_nodes+self.num_links):]
-        node_name_to_id = self._node_name_to_id
-        link_name_to_id = self._link_name_to_id
-        for name, node in self._wn.nodes(Junction):
-            node_id = node_name_to_id[name]
-            node.head = head[node_id]
-            node.demand = demand[node_id]
-            if node._leak:
-                leak_idx = self._leak_ids.index(node_id)
-                node.leak_demand = leak_demand[leak_idx]
-            else:
-                node.leak_demand = 0.0
-        for name, node in self._wn.nodes(Tank):
-            node_id = node_name_to_id[name]
-            node.head = head[node_id]
-            node.demand = demand[node_id]
-            if node._leak:
-                leak_idx = self._leak_ids.index(node_id)
-                node.leak_demand = leak_demand[leak_idx]
-            else:
-                node.leak_demand = 0.0
-        for name, node in self._wn.nodes(Reservoir):
-            node_id = node_name_to_id[name]
-            node.head = head[node_id]
-            node.demand = demand[node_id]
-            node.leak_demand = 0.0
-        for link_name, link in self._wn.links():
-            link_id = link_name_to_id[link_name]
-            link.flow = flow[link_id]
+        node_leak_demand = np.zeros(self.num_nodes)
+        node_leak_demand[self._leak_ids_array] = leak_demand
+        nodes = self._wn._node_attributes
+        nodes['head'][self._node_store_ids] = head
+        nodes['demand'][self._node_store_ids] = demand
+        nodes['leak_demand'][self._node_store_ids] = node_leak_demand
+        self._wn._link_attributes['flow'][self._link_store_ids] = flow
 
     def compute_polynomial_coefficients(self, x1, x2, f1, f2, df1, df2):
         """
@@ -1484,7 +1576,7 @@ class HydraulicModel(object):
         for link_id in xrange(self.num_links):
             print construct_string(self._link_id_to_name[link_id], jacobian.getrow(2*self.num_nodes+link_id).toarray()[0])
         for node_id in self._leak_ids:
-            print construct_string(self._node_id_to_name[node_id], jacobian.getrow(2*self.num_nodes+self.num_links+self._leak_ids.index(node_id)).toarray()[0])
+            print construct_string(self._node_id_to_name[node_id], jacobian.getrow(2*self.num_nodes+self.num_links+self._leak_idx[node_id]).toarray()[0])
 
     def print_jacobian_nonzeros(self):
         print('{0:<15s}{1:<15s}{2:<25s}{3:<25s}{4:<15s}'.format('row index','col index','eqnuation','variable','value'))
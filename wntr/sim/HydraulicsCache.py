@@ -0,0 +1,138 @@
+try:
+    from wntr import pyepanet
+except ImportError:
+    raise ImportError('Error importing pyepanet while running epanet simulator.'
+                      'Make sure pyepanet is installed and added to path.')
+from EpanetSimulator import _check_no_open_session
+import hashlib
+import tempfile
+import shutil
+import os
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class HydraulicsCache(object):
+    """
+    EPANET hydraulics files of water networks, which are used to run any number of water quality
+    scenarios without solving the hydraulics again (see EpanetSimulator.run_sim and
+    QualityScenarioRunner).
+
+    The hydraulics are keyed on the network as written by WaterNetworkModel.write_inpfile, which
+    includes the elements and the hydraulic options of the model, so changes made to the model in
+    memory are not given the hydraulics of the original network. The first time the hydraulics of a
+    network are requested, the written inp file is saved in the cache and its hydraulics are solved
+    (ENsolveH) and saved (ENsavehydfile) next to it. EpanetSimulator simulates the saved inp file
+    with the hydraulics file, so the nodes and links are in the same order in both. Sections of the
+    inp file that write_inpfile does not write (e.g., rules) are not simulated. The files are
+    written under a temporary name and renamed when complete, so a cache directory can be shared by
+    several processes.
+    """
+
+    def __init__(self, directory=None):
+        """
+        Parameters
+        ----------
+        directory : string
+            The directory of the hydraulics files. The default is a new temporary directory,
+            which is removed by clear.
+        """
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='wntr_hyd_')
+            self._remove_directory = True
+        else:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._remove_directory = False
+        self.directory = directory
+
+    def key(self, wn):
+        """
+        Returns the key of the hydraulics of a water network (the SHA-1 digest of the network as
+        written by write_inpfile).
+        """
+        handle, inpfile = tempfile.mkstemp(suffix='.inp')
+        os.close(handle)
+        try:
+            wn.write_inpfile(inpfile)
+            return self._file_key(inpfile)
+        finally:
+            os.remove(inpfile)
+
+    def filename(self, wn):
+        """
+        Returns the name of the hydraulics file of a water network (which may not exist yet).
+        """
+        return os.path.join(self.directory, self.key(wn) + '.hyd')
+
+    def get(self, wn):
+        """
+        Returns the name of the hydraulics file of a water network, solving the hydraulics if they
+        are not in the cache. The inp file of the hydraulics has the same name with the .inp
+        extension.
+
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+            A water network model
+
+        Returns
+        -------
+        hydfile : string
+        """
+        handle, partial_inpfile = tempfile.mkstemp(suffix='.part', dir=self.directory)
+        os.close(handle)
+        try:
+            wn.write_inpfile(partial_inpfile)
+            key = self._file_key(partial_inpfile)
+            hydfile = os.path.join(self.directory, key + '.hyd')
+            if not os.path.exists(hydfile):
+                logger.debug('Solving the hydraulics of ' + str(wn.name))
+                inpfile = os.path.join(self.directory, key + '.inp')
+                if not os.path.exists(inpfile):
+                    os.rename(partial_inpfile, inpfile)
+                self._save_hydraulics(inpfile, hydfile)
+        finally:
+            if os.path.exists(partial_inpfile):
+                os.remove(partial_inpfile)
+        return hydfile
+
+    @staticmethod
+    def _file_key(filename):
+        sha1 = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    def _save_hydraulics(self, inpfile, hydfile):
+        _check_no_open_session()
+        handle, partial_hydfile = tempfile.mkstemp(suffix='.part', dir=self.directory)
+        os.close(handle)
+        rptfile = partial_hydfile[:-len('.part')] + '.rpt'
+        try:
+            enData = pyepanet.ENepanet()
+            enData.ENopen(inpfile, rptfile, '')
+            try:
+                enData.ENsolveH()
+                enData.ENsavehydfile(partial_hydfile)
+            finally:
+                enData.ENclose()
+            os.rename(partial_hydfile, hydfile)
+        finally:
+            for filename in [partial_hydfile, rptfile]:
+                if os.path.exists(filename):
+                    os.remove(filename)
+
+    def clear(self):
+        """
+        Remove the hydraulics files and their inp files (and the directory, if it was created by
+        the cache).
+        """
+        if self._remove_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        elif os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                if filename.endswith('.hyd') or filename.endswith('.inp'):
+                    os.remove(os.path.join(self.directory, filename))
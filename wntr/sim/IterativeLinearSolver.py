@@ -0,0 +1,139 @@
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg
+from LinearSolver import LinearSolver
+import logging
+
+logger = logging.getLogger('wntr.sim.IterativeLinearSolver')
+
+class IterativeLinearSolver(object):
+    """
+    Preconditioned Krylov solver (GMRES or BiCGSTAB with an incomplete LU preconditioner) for
+    the linear systems arising in each Newton iteration.
+
+    The linear systems are solved inexactly: the right hand side of the Newton system is the
+    residual of the hydraulic equations, and the Krylov iterations stop when the linear residual
+    is less than eta times the norm of the right hand side, where eta = min(ITER_ETA_MAX, norm
+    of the right hand side). Early Newton iterations are therefore cheap, while the last
+    iterations are solved accurately enough to keep the fast local convergence of Newton's
+    method.
+
+    If the incomplete factorization fails or the Krylov method does not converge, the system is
+    solved with the direct LinearSolver instead.
+    """
+
+    def __init__(self, options={}):
+        """
+        Parameters
+        ----------
+        options: dict
+            LINEAR_SOLVER: 'GMRES' or 'BICGSTAB' (default = 'GMRES')
+            ITER_ETA_MAX: the largest relative tolerance used for the linear solves (default = 0.1)
+            ITER_MAXITER: the maximum number of Krylov iterations for each linear solve (default = 500)
+            GMRES_RESTART: the number of GMRES iterations between restarts (default = 50)
+            ILU_DROP_TOL: drop tolerance of the incomplete LU preconditioner (default = 1e-4)
+            ILU_FILL_FACTOR: maximum fill of the incomplete LU preconditioner relative to the
+                             jacobian (default = 10)
+        """
+        self._options = options
+
+        if 'LINEAR_SOLVER' not in self._options:
+            self.method = 'GMRES'
+        else:
+            self.method = self._options['LINEAR_SOLVER'].upper()
+        if self.method not in ['GMRES', 'BICGSTAB']:
+            raise ValueError('IterativeLinearSolver method must be "GMRES" or "BICGSTAB".')
+
+        if 'ITER_ETA_MAX' not in self._options:
+            self.eta_max = 0.1
+        else:
+            self.eta_max = self._options['ITER_ETA_MAX']
+
+        if 'ITER_MAXITER' not in self._options:
+            self.maxiter = 500
+        else:
+            self.maxiter = self._options['ITER_MAXITER']
+
+        if 'GMRES_RESTART' not in self._options:
+            self.restart = 50
+        else:
+            self.restart = self._options['GMRES_RESTART']
+
+        if 'ILU_DROP_TOL' not in self._options:
+            self.drop_tol = 1e-4
+        else:
+            self.drop_tol = self._options['ILU_DROP_TOL']
+
+        if 'ILU_FILL_FACTOR' not in self._options:
+            self.fill_factor = 10
+        else:
+            self.fill_factor = self._options['ILU_FILL_FACTOR']
+
+        self._direct_solver = LinearSolver(self._options)
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the counters and the fallback direct solver.
+        """
+        self._direct_solver.reset()
+        self.last_solve_reused = False
+        self.num_iterative_solves = 0
+        self.num_krylov_iterations = 0
+        self.num_direct_fallbacks = 0
+
+    def refactorize(self):
+        """
+        The preconditioner is recomputed for every solve, so there is nothing to do.
+        """
+        pass
+
+    def solve(self, A, b):
+        """
+        Solve A*x = b approximately.
+
+        Parameters
+        ----------
+        A : scipy.sparse matrix
+            The jacobian
+        b : numpy array
+            The right hand side (the residual of the hydraulic equations)
+
+        Returns
+        -------
+        x : numpy array
+        """
+        A = A.tocsc()
+        b_norm = np.linalg.norm(b)
+        if b_norm == 0.0:
+            return np.zeros(len(b))
+        eta = min(self.eta_max, np.max(np.abs(b)))
+
+        try:
+            ilu = sp.linalg.spilu(A, drop_tol=self.drop_tol, fill_factor=self.fill_factor)
+        except RuntimeError:
+            logger.debug('Incomplete LU factorization failed; using a direct solve.')
+            return self._direct_solve(A, b)
+        M = sp.linalg.LinearOperator(A.shape, ilu.solve)
+
+        num_iters = [0]
+        def count_iterations(xk):
+            num_iters[0] += 1
+
+        if self.method == 'GMRES':
+            x, info = sp.linalg.gmres(A, b, tol=eta, atol=0.0, restart=self.restart, maxiter=self.maxiter, M=M,
+                                      callback=count_iterations)
+        else:
+            x, info = sp.linalg.bicgstab(A, b, tol=eta, atol=0.0, maxiter=self.maxiter, M=M,
+                                         callback=count_iterations)
+        self.num_iterative_solves += 1
+        self.num_krylov_iterations += num_iters[0]
+
+        if info != 0 or not np.all(np.isfinite(x)):
+            logger.debug('{0} did not converge (info = {1}); using a direct solve.'.format(self.method, info))
+            return self._direct_solve(A, b)
+        return x
+
+    def _direct_solve(self, A, b):
+        self.num_direct_fallbacks += 1
+        return self._direct_solver.solve(A.tocoo(), b)
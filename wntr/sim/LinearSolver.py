@@ -0,0 +1,165 @@
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg
+import logging
+
+logger = logging.getLogger('wntr.sim.LinearSolver')
+
+class LinearSolver(object):
+    """
+    Sparse direct solver for the linear systems arising in each Newton iteration.
+
+    The sparsity structure of the jacobian built by HydraulicModel never changes during a
+    simulation. The fill-reducing column ordering is therefore computed once (the first time
+    a jacobian with a new structure is seen), and the column permutation is folded into a
+    precomputed map from the coo entries of the jacobian to the entries of a csc matrix.
+    Subsequent solves only perform a numeric factorization with the natural ordering.
+
+    If LU_REUSE_TOL is greater than 0, the previous factorization is reused (i.e., a chord
+    step is taken) whenever the largest change in the jacobian entries relative to the largest
+    entry of the factorized jacobian is less than LU_REUSE_TOL.
+    """
+
+    def __init__(self, options={}):
+        """
+        Parameters
+        ----------
+        options: dict
+            LU_REUSE_TOL: relative change in the jacobian below which the last factorization
+                          is reused (default = 0.0, i.e., always refactorize)
+            PERMC_SPEC: fill-reducing column ordering used by SuperLU (default = 'COLAMD')
+        """
+        self._options = options
+
+        if 'LU_REUSE_TOL' not in self._options:
+            self.reuse_tol = 0.0
+        else:
+            self.reuse_tol = self._options['LU_REUSE_TOL']
+
+        if 'PERMC_SPEC' not in self._options:
+            self.permc_spec = 'COLAMD'
+        else:
+            self.permc_spec = self._options['PERMC_SPEC']
+
+        self.reset()
+
+    def reset(self):
+        """
+        Discard the symbolic analysis and the last factorization.
+        """
+        self._shape = None
+        self._row = None
+        self._col = None
+        self._perm_c = None
+        self._entry_map = None
+        self._csc = None
+        self._lu = None
+        self._lu_is_permuted = False
+        self._factorized_data = None
+        self._factorized_norm = None
+        self.last_solve_reused = False
+
+        self.num_symbolic_factorizations = 0
+        self.num_numeric_factorizations = 0
+        self.num_reused_factorizations = 0
+
+    def solve(self, A, b):
+        """
+        Solve A*x = b.
+
+        Parameters
+        ----------
+        A : scipy.sparse matrix
+            The jacobian. It is most efficient to pass the same coo_matrix object (with only
+            the data changing) on every call.
+        b : numpy array
+            The right hand side.
+
+        Returns
+        -------
+        x : numpy array
+        """
+        if not sp.isspmatrix_coo(A):
+            A = A.tocoo()
+
+        self.last_solve_reused = False
+        if not self._same_structure(A):
+            self._analyze(A)
+        elif self._can_reuse(A.data):
+            self.last_solve_reused = True
+            self.num_reused_factorizations += 1
+        else:
+            self._factorize(A.data)
+
+        x = self._lu.solve(b)
+        if self._lu_is_permuted:
+            x = x[self._perm_c]
+        return x
+
+    def _same_structure(self, A):
+        if self._entry_map is None or A.shape != self._shape or A.nnz != len(self._row):
+            return False
+        if A.row is self._row and A.col is self._col:
+            return True
+        return np.array_equal(A.row, self._row) and np.array_equal(A.col, self._col)
+
+    def _analyze(self, A):
+        """
+        Compute the fill-reducing ordering, the map from the coo entries of A to the entries
+        of the column-permuted csc matrix, and the first numeric factorization.
+        """
+        n = A.shape[1]
+        self._shape = A.shape
+        self._row = A.row
+        self._col = A.col
+
+        lu = self._splu(A.tocsc(), self.permc_spec)
+        self._perm_c = lu.perm_c
+        self.num_symbolic_factorizations += 1
+        logger.debug('Computed {0} ordering for jacobian of size {1} with {2} nonzeros'.format(self.permc_spec, n, A.nnz))
+
+        # Column j of A is column perm_c[j] of the permuted matrix. Entries are keyed in csc
+        # order (column-major, then row) so that np.unique yields the csc indices directly;
+        # duplicate coo entries map to the same position and are summed by np.bincount.
+        keys = self._perm_c[A.col].astype(np.int64)*self._shape[0] + A.row
+        unique_keys, self._entry_map = np.unique(keys, return_inverse=True)
+        indices = (unique_keys % self._shape[0]).astype(np.int32)
+        indptr = np.zeros(n+1, dtype=np.int32)
+        indptr[1:] = np.cumsum(np.bincount((unique_keys // self._shape[0]).astype(np.int64), minlength=n))
+        self._csc = sp.csc_matrix((np.zeros(len(unique_keys)), indices, indptr), shape=self._shape)
+
+        # The first factorization was computed from the unpermuted matrix
+        self._lu = lu
+        self._lu_is_permuted = False
+        self._factorized_data = np.array(A.data)
+        self._factorized_norm = np.max(np.abs(A.data)) if A.nnz > 0 else 0.0
+        self.num_numeric_factorizations += 1
+
+    def _can_reuse(self, data):
+        if self.reuse_tol <= 0.0 or self._lu is None or self._factorized_norm == 0.0:
+            return False
+        change = np.max(np.abs(data - self._factorized_data))
+        return change <= self.reuse_tol*self._factorized_norm
+
+    def _factorize(self, data):
+        self._csc.data = np.bincount(self._entry_map, weights=data, minlength=self._csc.nnz)
+        self._lu = self._splu(self._csc, 'NATURAL')
+        self._lu_is_permuted = True
+        self._factorized_data = np.array(data)
+        self._factorized_norm = np.max(np.abs(data)) if len(data) > 0 else 0.0
+        self.num_numeric_factorizations += 1
+
+    def _splu(self, A, permc_spec):
+        try:
+            return sp.linalg.splu(A, permc_spec=permc_spec)
+        except RuntimeError:
+            # SuperLU reports singular factors with a RuntimeError; spsolve reports them with
+            # a MatrixRankWarning, which is what NewtonSolver expects.
+            self._lu = None
+            raise sp.linalg.MatrixRankWarning('Matrix is exactly singular')
+
+    def refactorize(self):
+        """
+        Force the next solve to compute a new numeric factorization.
+        """
+        self._factorized_norm = 0.0
@@ -1,4 +1,5 @@
 import numpy as np
+import pandas as pd
 import datetime
 
 class NetResults(object):
@@ -15,6 +16,23 @@ class NetResults(object):
         self.link = None
         self.node = None
 
+    def get_solver_statistics(self):
+        """
+        Returns the solver statistics as a DataFrame with one row for each hydraulic
+        solve (each timestep and trial).
+
+        The WNTRSimulator records the simulation time (s), trial, number of Newton
+        iterations, number of backtracking steps, final residual norm, residual norm
+        at each iteration, whether the solve converged, and the time (s) spent
+        evaluating residuals, evaluating the jacobian, solving linear systems,
+        checking controls, and updating the network connectivity.
+
+        Returns
+        -------
+        solver_statistics : pandas DataFrame
+        """
+        return pd.DataFrame(self.solver_statistics)
+
     def _adjust_demand(self, Pstar):
         """        
         Correction factor when using demand driven simualtion, see [1]
@@ -4,6 +4,10 @@ import copy
 import time
 import warnings
 import logging
+from LinearSolver import LinearSolver
+from UmfpackLinearSolver import UmfpackLinearSolver
+from IterativeLinearSolver import IterativeLinearSolver
+from GGALinearSolver import GGALinearSolver
 
 # Ideas:
 #    scale variables
@@ -16,6 +20,27 @@ np.set_printoptions(precision=3, threshold=10000, linewidth=300)
 
 logger = logging.getLogger('wntr.sim.NewtonSolver')
 
+def _get_linear_solver(options, model):
+    """
+    Create the linear solver selected with the LINEAR_SOLVER option ('SUPERLU', 'UMFPACK',
+    'GMRES', 'BICGSTAB', or 'GGA'). The GGA solver needs the block structure of the model.
+    """
+    if 'LINEAR_SOLVER' not in options:
+        method = 'SUPERLU'
+    else:
+        method = options['LINEAR_SOLVER'].upper()
+
+    if method == 'SUPERLU':
+        return LinearSolver(options)
+    elif method == 'GGA':
+        return GGALinearSolver(model, options)
+    elif method == 'UMFPACK':
+        return UmfpackLinearSolver(options)
+    elif method in ['GMRES', 'BICGSTAB']:
+        return IterativeLinearSolver(options)
+    else:
+        raise ValueError('LINEAR_SOLVER must be one of "SUPERLU", "UMFPACK", "GMRES", "BICGSTAB", or "GGA".')
+
 class NewtonSolver(object):
     def __init__(self, num_nodes, num_links, num_leaks, model, options={}):
         self._options = options
@@ -54,8 +79,35 @@ class NewtonSolver(object):
         else:
             self.bt_start_iter = self._options['BT_START_ITER']
 
+        # The linear solver keeps the fill-reducing ordering of the jacobian between solves
+        self.linear_solver = _get_linear_solver(self._options, model)
+
+        self.last_solve_statistics = None
+
+    def _new_statistics(self):
+        """
+        Returns an empty dictionary for the statistics of one solve (see solve).
+        """
+        return {'iterations': 0,
+                'backtracking_steps': 0,
+                'residual_norms': [],
+                'residual_time': 0.0,
+                'jacobian_time': 0.0,
+                'linear_solve_time': 0.0,
+                'status': 0}
 
     def solve(self, Residual, Jacobian, x0):
+        """
+        Solve Residual(x) = 0 with Newton's method starting from x0.
+
+        Returns [x, iter, status], where status is 1 if the solve converged and 0 otherwise.
+        The statistics of the solve (number of iterations, number of backtracking steps, the
+        residual norm at each iteration, and the time spent evaluating residuals, evaluating
+        the jacobian, and solving the linear systems) are stored in self.last_solve_statistics.
+        """
+        stats = self._new_statistics()
+        self.last_solve_statistics = stats
+        norms = stats['residual_norms']
 
         x = np.array(x0)
 
@@ -63,32 +115,43 @@ class NewtonSolver(object):
 
         # MAIN NEWTON LOOP
         for iter in xrange(self.maxiter):
+            stats['iterations'] = iter
             if use_r_:
                 r = r_
                 r_norm = new_norm
             else:
+                t0 = time.time()
                 r = Residual(x)
                 r_norm = np.max(abs(r))
+                stats['residual_time'] += time.time() - t0
+            norms.append(r_norm)
 
             # if iter<self.bt_start_iter:
             #    logger.debug('iter: {0:<4d} norm: {1:<10.2e}'.format(iter, r_norm))
 
             if r_norm < self.tol:
+                stats['status'] = 1
                 return [x, iter, 1]
 
-            J = Jacobian(x).tocsr()
+            t0 = time.time()
+            J = Jacobian(x)
+            t1 = time.time()
+            stats['jacobian_time'] += t1 - t0
 
             # Call Linear solver
             try:
-                d = -sp.linalg.spsolve(J,r,permc_spec='COLAMD',use_umfpack=False)
+                d = -self.linear_solver.solve(J,r)
             except sp.linalg.MatrixRankWarning:
                 logger.warning('Jacobian is singular.')
                 return [x, iter, 0]
+            finally:
+                stats['linear_solve_time'] += time.time() - t1
 
             # Backtracking
             alpha = 1.0
             if self.bt and iter>=self.bt_start_iter:
                 use_r_ = True
+                t0 = time.time()
                 for iter_bt in xrange(self.bt_maxiter):
                     x_ = x + alpha*d
                     r_ = Residual(x_)
@@ -98,8 +161,15 @@ class NewtonSolver(object):
                         break
                     else:
                         alpha = alpha*self.rho
+                stats['residual_time'] += time.time() - t0
+                stats['backtracking_steps'] += iter_bt
 
                 if iter_bt+1 >= self.bt_maxiter:
+                    if self.linear_solver.last_solve_reused:
+                        # The step came from an old factorization; retry with a fresh one
+                        self.linear_solver.refactorize()
+                        use_r_ = False
+                        continue
                     logger.debug('Backtracking failed.')
                     return [x,iter,0]
                 # logger.debug('iter: {0:<4d} norm: {1:<10.2e} alpha: {2:<10.2e}'.format(iter, new_norm, alpha))
@@ -109,6 +179,3 @@ class NewtonSolver(object):
 
         logger.debug('Reached maximum number of iterations.')
         return [x, iter, 0]
-
-
-
@@ -0,0 +1,83 @@
+from EpanetSimulator import EpanetSimulator
+from HydraulicsCache import HydraulicsCache
+from ScenarioRunner import _ScenarioPool, _reduce_results
+import os
+
+def _run_quality_scenario(wn, WQ, settings):
+    """
+    Simulate one water quality scenario with the hydraulics read from the hydraulics file.
+    """
+    sim = EpanetSimulator(wn)
+    # Each process writes its own EPANET report file
+    sim.report_file = os.path.join(settings['directory'], 'worker_{0}.rpt'.format(os.getpid()))
+    results = sim.run_sim(WQ, convert_units=settings['convert_units'], hydfile=settings['hydfile'])
+    return _reduce_results(wn, results, settings)
+
+class QualityScenarioRunner(_ScenarioPool):
+    """
+    Run water quality scenarios of the same water network in parallel processes with EPANET.
+
+    The hydraulics of the network are solved once and saved to a hydraulics file (see
+    HydraulicsCache). Each scenario then only runs the water quality simulation, reading the
+    hydraulics from the file (see EpanetSimulator.run_sim). As with ScenarioRunner, the network
+    is serialized once for all of the worker processes, and only the requested result fields (or
+    the value returned by reduce_func) are sent back.
+    """
+
+    def __init__(self, wn, scenarios, hydraulics=None, convert_units=True, node_fields=None,
+                 link_fields=None, reduce_func=None):
+        """
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+            The water network. It is simulated as written by write_inpfile (see HydraulicsCache).
+        scenarios : list of Waterquality objects (or lists of Waterquality objects)
+            The water quality scenarios (see EpanetSimulator.run_sim)
+        hydraulics : HydraulicsCache
+            The cache of the hydraulics files. If None, the hydraulics are saved in a temporary
+            directory, which is removed after the scenarios are run.
+        convert_units : bool
+            If True, the results are converted to SI units
+        node_fields : list of strings
+            Node results to return (e.g., ['quality']). If None, all node results are returned.
+        link_fields : list of strings
+            Link results to return (e.g., ['flowrate']). If None, all link results are returned.
+        reduce_func : function
+            If provided, reduce_func(wn, results) is called in the worker process and its return
+            value is returned instead of the results. The function must be defined at the top level
+            of a module so that it can be pickled.
+        """
+        _ScenarioPool.__init__(self, wn, scenarios,
+                               {'scenario_func': _run_quality_scenario,
+                                'convert_units': convert_units,
+                                'node_fields': node_fields,
+                                'link_fields': link_fields,
+                                'reduce_func': reduce_func})
+        self._hydraulics = hydraulics
+        self._run_hydraulics = None
+
+    def _start(self):
+        """
+        Returns the settings of the workers, with the hydraulics file of the network.
+        """
+        self._run_hydraulics = self._hydraulics
+        if self._run_hydraulics is None:
+            self._run_hydraulics = HydraulicsCache()
+        settings = dict(self._settings)
+        settings['hydfile'] = self._run_hydraulics.get(self._wn)
+        settings['directory'] = self._run_hydraulics.directory
+        return settings
+
+    def _finish(self):
+        """
+        Remove the report files of the workers (and the temporary hydraulics).
+        """
+        hydraulics = self._run_hydraulics
+        if hydraulics is None:
+            return
+        self._run_hydraulics = None
+        for filename in os.listdir(hydraulics.directory):
+            if filename.startswith('worker_') and filename.endswith('.rpt'):
+                os.remove(os.path.join(hydraulics.directory, filename))
+        if self._hydraulics is None:
+            hydraulics.clear()
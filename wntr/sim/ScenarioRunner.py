@@ -0,0 +1,203 @@
+from WNTRSimulator import WNTRSimulator
+import multiprocessing
+import cPickle as pickle
+import traceback
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Set in each worker process by _initialize_worker
+_base_wn_data = None
+_base_wn = None
+_worker_settings = None
+
+def _initialize_worker(wn_data, settings):
+    global _base_wn_data, _base_wn, _worker_settings
+    _base_wn_data = wn_data
+    _base_wn = None
+    _worker_settings = settings
+
+def _run_task(task):
+    """
+    Simulate one scenario on the base network of the worker with the scenario function of the
+    settings. Exceptions are caught and returned so that one failed scenario does not stop the
+    other scenarios.
+    """
+    global _base_wn
+    index, scenario = task
+    settings = _worker_settings
+    try:
+        if _base_wn is None:
+            _base_wn = pickle.loads(_base_wn_data)
+        return index, settings['scenario_func'](_base_wn, scenario, settings), None
+    except Exception:
+        return index, None, traceback.format_exc()
+
+def _reduce_results(wn, results, settings):
+    """
+    Returns the value sent back for the results of a scenario: the value returned by reduce_func,
+    or the results restricted to node_fields and link_fields.
+    """
+    if settings['reduce_func'] is not None:
+        return settings['reduce_func'](wn, results)
+    if settings['node_fields'] is not None:
+        results.node = results.node[settings['node_fields']]
+    if settings['link_fields'] is not None:
+        results.link = results.link[settings['link_fields']]
+    return results
+
+def _run_hydraulic_scenario(wn, scenario, settings):
+    """
+    Simulate one scenario inside an overlay of the base network, which restores the base network
+    exactly afterwards.
+    """
+    with wn.overlay():
+        scenario.apply(wn)
+        sim = WNTRSimulator(wn, settings['pressure_driven'])
+        results = sim.run_sim(settings['solver_options'], settings['convergence_error'])
+        return _reduce_results(wn, results, settings)
+
+class _ScenarioPool(object):
+    """
+    Base class of the runners that simulate scenarios of the same water network in a pool of worker
+    processes. The network is serialized once and sent once to each worker process. Subclasses
+    provide the settings of the workers, including the scenario function (a top level function
+    scenario_func(wn, scenario, settings) that returns the value of a scenario).
+    """
+
+    def __init__(self, wn, scenarios, settings):
+        self._wn = wn
+        self.scenarios = scenarios
+        self._settings = settings
+        self.errors = {}
+
+    def _start(self):
+        """
+        Returns the settings of the workers. Called before the scenarios are run.
+        """
+        return self._settings
+
+    def _finish(self):
+        """
+        Called after the scenarios are run (or have failed).
+        """
+        pass
+
+    def iter_results(self, num_processes=None, chunksize=1):
+        """
+        Generator that yields (scenario index, value, error) tuples as scenarios finish. value
+        is None and error is the traceback (string) if the scenario failed.
+
+        Parameters
+        ----------
+        num_processes : int
+            Number of worker processes. The default is the number of CPUs. If num_processes is 1,
+            the scenarios are run in the current process.
+        chunksize : int
+            Number of scenarios sent to a worker at a time
+        """
+        try:
+            settings = self._start()
+            wn_data = pickle.dumps(self._wn, pickle.HIGHEST_PROTOCOL)
+            tasks = list(enumerate(self.scenarios))
+            self.errors = {}
+
+            if num_processes is None:
+                num_processes = multiprocessing.cpu_count()
+
+            if num_processes == 1:
+                _initialize_worker(wn_data, settings)
+                try:
+                    for task in tasks:
+                        yield self._record(_run_task(task))
+                finally:
+                    _initialize_worker(None, None)
+                return
+
+            pool = multiprocessing.Pool(num_processes, _initialize_worker, (wn_data, settings))
+            try:
+                for result in pool.imap_unordered(_run_task, tasks, chunksize):
+                    yield self._record(result)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        finally:
+            self._finish()
+
+    def run(self, num_processes=None, chunksize=1):
+        """
+        Run all scenarios.
+
+        Parameters
+        ----------
+        num_processes : int
+            Number of worker processes (see iter_results)
+        chunksize : int
+            Number of scenarios sent to a worker at a time
+
+        Returns
+        -------
+        values : list
+            The results (or reduced values) for each scenario, in the same order as the
+            scenarios. The value is None for failed scenarios (see errors).
+        """
+        values = [None for scenario in self.scenarios]
+        for index, value, error in self.iter_results(num_processes, chunksize):
+            values[index] = value
+        return values
+
+    def _record(self, result):
+        index, value, error = result
+        if error is not None:
+            self.errors[index] = error
+            logger.warning('Scenario {0} failed: {1}'.format(index, error.strip().splitlines()[-1]))
+        return result
+
+class ScenarioRunner(_ScenarioPool):
+    """
+    Run hydraulic scenarios of the same water network in parallel processes.
+
+    The base water network is serialized once. Each worker process receives the serialized
+    network once (through the pool initializer, which is inherited without copying on
+    platforms that fork), unpickles it once, and simulates each scenario inside a
+    ScenarioOverlay of that copy, which discards the changes of the scenario. Only the compact
+    scenario descriptions are sent to the workers, and only the requested result fields
+    (or the value returned by reduce_func) are sent back.
+    """
+
+    def __init__(self, wn, scenarios, pressure_driven=False, solver_options={}, convergence_error=True,
+                 node_fields=None, link_fields=None, reduce_func=None):
+        """
+        Parameters
+        ----------
+        wn : WaterNetworkModel
+            The base water network. It is not modified.
+        scenarios : list of HydraulicScenario objects
+            The changes to simulate
+        pressure_driven : bool
+            Specifies whether the simulations will be demand-driven or pressure-driven.
+        solver_options : dict
+            solver options (see WNTRSimulator.run_sim)
+        convergence_error : bool
+            See WNTRSimulator.run_sim. A scenario that raises an error is recorded in
+            ScenarioRunner.errors and does not stop the other scenarios.
+        node_fields : list of strings
+            Node results to return (e.g., ['pressure']). If None, all node results are returned.
+        link_fields : list of strings
+            Link results to return (e.g., ['flowrate']). If None, all link results are returned.
+        reduce_func : function
+            If provided, reduce_func(wn, results) is called in the worker process and its return
+            value is returned instead of the results. wn is the scenario network. The function
+            must be defined at the top level of a module so that it can be pickled.
+        """
+        _ScenarioPool.__init__(self, wn, scenarios,
+                               {'scenario_func': _run_hydraulic_scenario,
+                                'pressure_driven': pressure_driven,
+                                'solver_options': solver_options,
+                                'convergence_error': convergence_error,
+                                'node_fields': node_fields,
+                                'link_fields': link_fields,
+                                'reduce_func': reduce_func})
@@ -0,0 +1,96 @@
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg
+import warnings
+import logging
+try:
+    import scikits.umfpack as umfpack
+except ImportError:
+    umfpack = None
+
+logger = logging.getLogger('wntr.sim.UmfpackLinearSolver')
+
+class UmfpackLinearSolver(object):
+    """
+    Sparse direct solver based on UMFPACK (requires scikits.umfpack).
+
+    As with LinearSolver, the symbolic analysis (fill-reducing ordering) is only computed when
+    the sparsity structure of the jacobian changes; every other solve only performs a numeric
+    factorization.
+    """
+
+    def __init__(self, options={}):
+        """
+        Parameters
+        ----------
+        options: dict
+            Not used
+        """
+        if umfpack is None:
+            raise ImportError('Error importing scikits.umfpack while creating the UMFPACK linear solver.'
+                              'Make sure scikits.umfpack is installed and added to path.')
+        self._options = options
+        self.reset()
+
+    def reset(self):
+        """
+        Discard the symbolic analysis.
+        """
+        self._context = umfpack.UmfpackContext('di')
+        self._row = None
+        self._col = None
+        self._shape = None
+        self.last_solve_reused = False
+
+        self.num_symbolic_factorizations = 0
+        self.num_numeric_factorizations = 0
+        self.num_reused_factorizations = 0
+
+    def refactorize(self):
+        """
+        Every solve computes a new numeric factorization, so there is nothing to do.
+        """
+        pass
+
+    def solve(self, A, b):
+        """
+        Solve A*x = b.
+
+        Parameters
+        ----------
+        A : scipy.sparse matrix
+            The jacobian
+        b : numpy array
+            The right hand side.
+
+        Returns
+        -------
+        x : numpy array
+        """
+        if not sp.isspmatrix_coo(A):
+            A = A.tocoo()
+        csc = A.tocsc()
+        csc.sort_indices()
+        csc.indptr = csc.indptr.astype(np.int32)
+        csc.indices = csc.indices.astype(np.int32)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', umfpack.UmfpackWarning)
+            try:
+                if not self._same_structure(A):
+                    self._context.free()
+                    self._context.symbolic(csc)
+                    self._shape = A.shape
+                    self._row = np.array(A.row)
+                    self._col = np.array(A.col)
+                    self.num_symbolic_factorizations += 1
+                self._context.numeric(csc)
+                self.num_numeric_factorizations += 1
+                return self._context.solve(umfpack.UMFPACK_A, csc, b, autoTranspose=True)
+            except (umfpack.UmfpackWarning, RuntimeError):
+                raise sp.linalg.MatrixRankWarning('Matrix is exactly singular')
+
+    def _same_structure(self, A):
+        if self._row is None or A.shape != self._shape or A.nnz != len(self._row):
+            return False
+        return np.array_equal(A.row, self._row) and np.array_equal(A.col, self._col)
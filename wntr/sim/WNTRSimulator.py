@@ -9,9 +9,6 @@ TODO: Valves should not be placed anywhere such that controls are added that act
 TODO: What happens if, for example, someone adds a pipe with the same name as a pump?
 TODO: Remove deep copy methods from WaterNetworkModel object
 TODO: Do a single smoothing for all leaks similar to what is done for Hazen-Williams.
-TODO: Bug - when the initial level of a tank is such that a conditional control would activate at time zero,
-      the control does not activate, time 0 is solved, results are saved at time 0, the control is activate, and time
-      zero is resolved, resulting in 2 sets of results for time 0.
 TODO: Remove __eq__ methods
 TODO: fix broken tests
 """
@@ -25,8 +22,13 @@ from HydraulicModel import *
 from wntr.network.WaterNetworkModel import *
 from NewtonSolver import *
 from NetworkResults import *
+from ConnectivityTracker import ConnectivityTracker
+from ControlEngine import ControlEngine
+from EventScheduler import EventScheduler
+from DemandEngine import DemandEngine
 import time
 import copy
+from collections import OrderedDict
 import networkx as nx
 import sys
 
@@ -49,8 +51,10 @@ class WNTRSimulator(WaterNetworkSimulator):
         """
 
         super(WNTRSimulator, self).__init__(wn, pressure_driven)
-        self._internal_graph = None
+        self._connectivity = None
         self._control_log = None
+        # The hydraulic model is kept between calls to run_sim (see HydraulicModel.reset)
+        self._model = None
 
     def get_time(self):
         s = int(self._wn.sim_time)
@@ -64,6 +68,12 @@ class WNTRSimulator(WaterNetworkSimulator):
         """
         Method to run an extended period simulation
 
+        The hydraulic model of the network is built by the first call and reused by later calls, which
+        read the parameters of the nodes and links again and recompile only the parts of the model
+        affected by structural changes (see HydraulicModel.reset). Changes made
+        to the network between calls (e.g., to demands, statuses, leak areas, or roughnesses) are used
+        by the next simulation. Use wn.reset_initial_values() to start the next simulation from time 0.
+
         Parameters
         ----------
         solver_options: dict
@@ -74,14 +84,69 @@ class WNTRSimulator(WaterNetworkSimulator):
                 BT_MAXITER: the maximum number of iterations for each line search (default = 20)
                 BACKTRACKING: wheter or not to use a line search (default = True)
                 BT_START_ITER: the newton iteration at which a line search should start being used (default = 2)
+                LU_REUSE_TOL: the relative change in the jacobian below which the previous LU factorization is reused (default = 0.0, i.e., always refactorize)
+                PERMC_SPEC: the fill-reducing ordering computed once per simulation for the jacobian (default = 'COLAMD')
+                LINEAR_SOLVER: the linear solver used in each newton iteration: 'SUPERLU', 'UMFPACK' (requires scikits.umfpack),
+                               the inexact iterative solvers 'GMRES' and 'BICGSTAB' (see IterativeLinearSolver for
+                               the ITER_ETA_MAX, ITER_MAXITER, GMRES_RESTART, ILU_DROP_TOL, and ILU_FILL_FACTOR options),
+                               or 'GGA', which solves a reduced system in the junction heads (see GGALinearSolver for
+                               the GGA_FACTORIZATION and GGA_MIN_DERIVATIVE options) (default = 'SUPERLU')
+                PREDICTOR: whether or not to extrapolate the initial guess for each timestep from the solutions of the last two
+                           timesteps and the change in junction demands. The extrapolated guess is only used if its residual
+                           is smaller than the residual of the previous solution. (default = False)
+                ADAPTIVE_TIMESTEP: whether or not to choose each timestep from the rate of change of the tank levels instead of
+                                   using the hydraulic timestep. The steps end at the times at which the junction demands change
+                                   and at control events, and the results at the reporting times are interpolated between steps
+                                   (default = False)
+                MIN_TIMESTEP: the smallest adaptive timestep in seconds (default = 60)
+                MAX_TIMESTEP: the largest adaptive timestep in seconds (default = 43200)
+                TANK_LEVEL_TOL: the largest change in the level of any tank during an adaptive timestep in meters (default = 0.5)
         convergence_error: bool
             If convergence_error is True, an error will be raised if the simulation does not converge. If convergence_error is False, 
             a warning will be issued and results.error_code will be set to 2 if the simulation does not converge. 
         """
 
+        steps = self._simulation_steps(solver_options, convergence_error)
+        solve_result = None
+        while True:
+            try:
+                model, X_init = steps.send(solve_result)
+            except StopIteration:
+                break
+            solve_result = self.solver.solve(model.get_hydraulic_equations, model.get_jacobian, X_init)
+            solve_result.append(self.solver.last_solve_statistics)
+        return self._results
+
+    def _simulation_steps(self, solver_options, convergence_error):
+        """
+        Generator that carries out the extended period simulation. Every time the hydraulic
+        equations need to be solved, the generator yields (model, X_init) and expects the
+        solution [X, num_iters, solver_status, solver_statistics] to be sent back (see
+        NewtonSolver.solve and NewtonSolver.last_solve_statistics), which run_sim does. The
+        results are stored in self._results when the generator is exhausted.
+        """
+
         self.time_per_step = []
+        self.iterations_per_step = []
+        self.num_predictor_fallbacks = 0
+        self._results = None
+        self._step_timers = {'control': 0.0, 'connectivity': 0.0}
 
-        self._get_demand_dict()
+        if 'PREDICTOR' not in solver_options:
+            use_predictor = False
+        else:
+            use_predictor = solver_options['PREDICTOR']
+        # (sim_time, solution, junction demands) for the last two timesteps
+        solution_history = []
+        if 'ADAPTIVE_TIMESTEP' not in solver_options:
+            adaptive_timestep = False
+        else:
+            adaptive_timestep = solver_options['ADAPTIVE_TIMESTEP']
+        # (sim_time, solution, junction demands, link statuses, isolated junctions) for the previous timestep
+        # with an adaptive timestep
+        previous_step = None
+
+        self._demands = DemandEngine(self._wn)
 
         tank_controls = self._wn._get_all_tank_controls()
         cv_controls = self._wn._get_cv_controls()
@@ -89,8 +154,24 @@ class WNTRSimulator(WaterNetworkSimulator):
         valve_controls = self._wn._get_valve_controls()
 
         self._controls = self._wn._control_dict.values()+tank_controls+cv_controls+pump_controls+valve_controls
-
-        model = HydraulicModel(self._wn, self.pressure_driven)
+        self._control_engine = ControlEngine(self._wn, self._controls)
+        if adaptive_timestep:
+            adaptive_options = {}
+            for key, option in [('MIN_TIMESTEP', 'min_timestep'), ('MAX_TIMESTEP', 'max_timestep'),
+                                ('TANK_LEVEL_TOL', 'level_tolerance')]:
+                if key in solver_options:
+                    adaptive_options[option] = solver_options[key]
+            self._scheduler = EventScheduler(self._wn, adaptive=True, breakpoints=self._get_demand_breakpoints(),
+                                             **adaptive_options)
+        else:
+            self._scheduler = EventScheduler(self._wn)
+        self._scheduler.queue_time_control_events(self._control_engine.time_control_events())
+
+        if self._model is None or self._model.pressure_driven != self.pressure_driven:
+            self._model = HydraulicModel(self._wn, self.pressure_driven)
+        elif self._model.reset():
+            logger.debug('The hydraulic model was recompiled because the network structure changed.')
+        model = self._model
         model.initialize_results_dict()
 
         self.solver = NewtonSolver(model.num_nodes, model.num_links, model.num_leaks, model, options=solver_options)
@@ -98,6 +179,7 @@ class WNTRSimulator(WaterNetworkSimulator):
         results = NetResults()
         results.error_code = 0
         results.time = []
+        results.solver_statistics = OrderedDict((key, []) for key in self._solver_statistics_keys)
         # if self._wn.sim_time%self._wn.options.hydraulic_timestep!=0:
         #     results_start_time = int(round((self._wn.options.hydraulic_timestep-(self._wn.sim_time%self._wn.options.hydraulic_timestep))+self._wn.sim_time))
         # else:
@@ -118,8 +200,7 @@ class WNTRSimulator(WaterNetworkSimulator):
 
         X_init = np.concatenate((head0, demand0, flow0,leak_demand0))
 
-        self._internal_graph = self._wn.get_graph_deep_copy()
-        self._initialize_internal_graph()
+        self._initialize_connectivity()
         self._control_log = wntr.network.ControlLogger()
 
         if self._wn.sim_time==0:
@@ -140,34 +221,49 @@ class WNTRSimulator(WaterNetworkSimulator):
 
             if not resolve:
                 trial = 0
-                #print 'presolve = True'
-                last_backup_time = np.inf
+                step_iterations = 0
+                # Fire the earliest group of control events since the last solve that changes the network and
+                # solve at the time of these events
+                events, controls_to_activate_regardless_of_time = self._check_controls(presolve=True)
+                self._scheduler.schedule_control_events(events)
                 while True:
-                    backup_time, controls_to_activate = self._check_controls(presolve=True,last_backup_time=last_backup_time)
+                    backup_time, controls_to_activate = self._scheduler.pop_control_events()
+                    controls_to_activate += controls_to_activate_regardless_of_time
                     changes_made_flag = self._fire_controls(controls_to_activate)
                     if changes_made_flag:
                         self._wn.sim_time -= backup_time
                         break
                     if backup_time == 0:
                         break
-                    last_backup_time = backup_time
+                if not changes_made_flag and not first_step and self._scheduler.at_control_event():
+                    # Nothing changed at this control event, so the tanks keep filling at the same rates
+                    self._wn.sim_time = self._scheduler.skip_time()
+                    if self._wn.sim_time > self._wn.options.duration:
+                        break
+                    continue
 
             logger.info('simulation time = %s, trial = %d',self.get_time(),trial)
 
             # Prepare for solve
             #model.reset_isolated_junctions()
+            connectivity_start_time = time.time()
             isolated_junctions, isolated_links = self._get_isolated_junctions_and_links()
+            self._step_timers['connectivity'] += time.time() - connectivity_start_time
             model.identify_isolated_junctions(isolated_junctions, isolated_links)
             # model.identify_isolated_junctions()
             if not first_step:
                 model.update_tank_heads()
-            model.update_junction_demands(self._demand_dict)
+            model.update_junction_demands(self._demands)
             model.set_network_inputs_by_id()
             model.set_jacobian_constants()
 
+            if use_predictor and trial == 0 and len(solution_history) == 2:
+                X_init = self._predict_initial_guess(model, X_init, solution_history)
+
             # Solve
             #X_init = model.update_initializations(X_init)
-            [self._X,num_iters,solver_status] = self.solver.solve(model.get_hydraulic_equations, model.get_jacobian, X_init)
+            [self._X,num_iters,solver_status,solver_statistics] = yield model, X_init
+            step_iterations += num_iters
             #if solver_status == 0:
             #    model.identify_isolated_junctions()
             #    model.set_network_inputs_by_id()
@@ -180,13 +276,17 @@ class WNTRSimulator(WaterNetworkSimulator):
                     raise RuntimeError('Simulatin did not converge!')
                 warnings.warn('Simulation did not converge!')
                 logger.warning('Simulation did not converge at time %s',self.get_time())
+                self._save_solver_statistics(results, trial, solver_statistics)
                 model.get_results(results)
                 results.error_code = 2
-                return results
+                self._results = results
+                return
             X_init = np.array(self._X)
 
             # Enter results in network and update previous inputs
             model.store_results_in_network(self._X)
+            # The controls checked and fired after this solve are timed in the statistics of the next solve
+            self._save_solver_statistics(results, trial, solver_statistics)
 
             #print 'presolve = False'
             resolve, resolve_controls_to_activate = self._check_controls(presolve=False)
@@ -202,7 +302,8 @@ class WNTRSimulator(WaterNetworkSimulator):
                         warnings.warn('Exceeded maximum number of trials.')
                         logger.warning('Exceeded maximum number of trials at time %s',self.get_time())
                         model.get_results(results)
-                        return results
+                        self._results = results
+                        return
                     continue
                 else:
                     if solver_status==0:
@@ -210,7 +311,16 @@ class WNTRSimulator(WaterNetworkSimulator):
                         raise RuntimeError('failed to converge')
                     resolve = False
 
-            if type(self._wn.options.report_timestep)==float or type(self._wn.options.report_timestep)==int:
+            self.iterations_per_step.append(step_iterations)
+            if use_predictor:
+                solution_history.append((self._wn.sim_time, self._X, np.array(model.junction_demand)))
+                solution_history = solution_history[-2:]
+
+            if adaptive_timestep:
+                self._save_interpolated_results(model, results, previous_step)
+                previous_step = (self._wn.sim_time, np.array(self._X), np.array(model.junction_demand),
+                                 np.array(model.link_status_array), np.array(model.isolated_junction_array))
+            elif type(self._wn.options.report_timestep)==float or type(self._wn.options.report_timestep)==int:
                 if self._wn.sim_time%self._wn.options.report_timestep == 0:
                     model.save_results(self._X, results)
                     results.time.append(int(self._wn.sim_time))
@@ -219,9 +329,8 @@ class WNTRSimulator(WaterNetworkSimulator):
                 results.time.append(int(self._wn.sim_time))
             model.update_network_previous_values()
             first_step = False
-            self._wn.sim_time += self._wn.options.hydraulic_timestep
-            overstep = float(self._wn.sim_time)%self._wn.options.hydraulic_timestep
-            self._wn.sim_time -= overstep
+            self._scheduler.schedule_tank_events(self._control_engine.tank_events())
+            self._wn.sim_time = self._scheduler.next_time()
 
             if self._wn.sim_time > self._wn.options.duration:
                 break
@@ -230,80 +339,116 @@ class WNTRSimulator(WaterNetworkSimulator):
                 self.time_per_step.append(time.time()-start_step_time)
 
         model.get_results(results)
-        return results
+        self._results = results
 
-    def _get_demand_dict(self):
+    _solver_statistics_keys = ['time', 'trial', 'iterations', 'backtracking_steps', 'residual_norm', 'residual_norms',
+                               'residual_time', 'jacobian_time', 'linear_solve_time', 'control_time',
+                               'connectivity_time', 'converged']
 
-        # Number of hydraulic timesteps
-        self._n_timesteps = int(round(self._wn.options.duration / self._wn.options.hydraulic_timestep)) + 1
-
-        # Get all demand for complete time interval
-        self._demand_dict = {}
-        for node_name, node in self._wn.nodes(Junction):
-            demand_values = self.get_node_demand(node_name)
-            for t in range(self._n_timesteps):
-                self._demand_dict[(node_name, t)] = demand_values[t]
+    def _save_solver_statistics(self, results, trial, solver_statistics):
+        """
+        Append the statistics of one hydraulic solve (one timestep and trial) to
+        results.solver_statistics, including the time spent checking controls and updating the
+        connectivity since the last solve. See NetResults.get_solver_statistics.
+        """
+        stats = results.solver_statistics
+        stats['time'].append(int(self._wn.sim_time))
+        stats['trial'].append(trial)
+        stats['iterations'].append(solver_statistics['iterations'])
+        stats['backtracking_steps'].append(solver_statistics['backtracking_steps'])
+        stats['residual_norm'].append(solver_statistics['residual_norms'][-1])
+        stats['residual_norms'].append(solver_statistics['residual_norms'])
+        stats['residual_time'].append(solver_statistics['residual_time'])
+        stats['jacobian_time'].append(solver_statistics['jacobian_time'])
+        stats['linear_solve_time'].append(solver_statistics['linear_solve_time'])
+        stats['control_time'].append(self._step_timers['control'])
+        stats['connectivity_time'].append(self._step_timers['connectivity'])
+        stats['converged'].append(solver_statistics['status'] == 1)
+        self._step_timers['control'] = 0.0
+        self._step_timers['connectivity'] = 0.0
+
+    def _predict_initial_guess(self, model, X_prev, solution_history):
+        """
+        Linearly extrapolate the heads, flows, and leak demands of the last two timesteps to the
+        current time. The junction demands are shifted by the change in the expected demands, and
+        the tank and reservoir heads are set to their known values. The prediction is rejected
+        (and X_prev is returned) if it does not reduce the residual of X_prev.
+        """
+        t0, X0, expected_demand0 = solution_history[0]
+        t1, X1, expected_demand1 = solution_history[1]
+        if t1 <= t0:
+            return X_prev
+
+        X_pred = X1 + float(self._wn.sim_time - t1)/(t1 - t0)*(X1 - X0)
+        junction_demand = slice(model.num_nodes, model.num_nodes+model.num_junctions)
+        X_pred[junction_demand] = X1[junction_demand] + (model.junction_demand - expected_demand1)
+        for tank_id in model._tank_ids:
+            X_pred[tank_id] = model.tank_head[tank_id]
+        for reservoir_id in model._reservoir_ids:
+            X_pred[reservoir_id] = model.reservoir_head[reservoir_id]
+        X_pred = model.update_initializations(X_pred)
+
+        pred_norm = np.max(np.abs(model.get_hydraulic_equations(X_pred)))
+        prev_norm = np.max(np.abs(model.get_hydraulic_equations(X_prev)))
+        if pred_norm < prev_norm:
+            return X_pred
+        logger.debug('Predicted initial guess rejected ({0:.2e} >= {1:.2e})'.format(pred_norm, prev_norm))
+        self.num_predictor_fallbacks += 1
+        return X_prev
+
+    def _save_interpolated_results(self, model, results, previous_step):
+        """
+        Save the results at the reporting times since the previous timestep (time, solution, junction
+        demands, link statuses, isolated junctions) with an adaptive timestep. Between timesteps, the
+        network is in the quasi-steady state solved at the previous timestep: its results are held, except
+        for the tank heads, which change linearly during a timestep. The solution at the current timestep
+        is not used, as controls may have changed the network at the end of the step.
+        """
+        sim_time = self._wn.sim_time
+        report_timestep = self._wn.options.report_timestep
+        if not (type(report_timestep)==float or type(report_timestep)==int):
+            model.save_results(self._X, results)
+            results.time.append(int(sim_time))
+            return
+
+        if previous_step is not None:
+            t0, X0, junction_demand0, link_status0, isolated_junctions0 = previous_step
+            report_time = t0 - t0%report_timestep + report_timestep
+            tank_ids = model._tank_ids
+            while report_time < sim_time:
+                fraction = float(report_time - t0)/(sim_time - t0)
+                X = np.array(X0)
+                X[tank_ids] = X0[tank_ids] + fraction*(self._X[tank_ids] - X0[tank_ids])
+                model.save_results(X, results, junction_demand0, link_status0, isolated_junctions0)
+                results.time.append(int(report_time))
+                report_time += report_timestep
+        if sim_time%report_timestep == 0:
+            model.save_results(self._X, results)
+            results.time.append(int(sim_time))
+
+    def _get_demand_breakpoints(self):
+        """
+        Returns the times (multiples of the hydraulic timestep) at which the demand of any junction changes.
+        """
+        return [t*self._wn.options.hydraulic_timestep for t in self._demands.breakpoints().tolist()]
 
-    def _check_controls(self, presolve, last_backup_time=None):
+    def _check_controls(self, presolve):
+        start_time = time.time()
         if presolve:
-            assert last_backup_time is not None
-            backup_time = 0.0
-            controls_to_activate = []
-            controls_to_activate_regardless_of_time = []
-            for i in xrange(len(self._controls)):
-                control = self._controls[i]
-                control_tuple = control.IsControlActionRequired(self._wn, presolve)
-                assert type(control_tuple[1]) == int or control_tuple[1] == None, 'control backup time should be an int. back up time = '+str(control_tuple[1])
-                if control_tuple[0] and control_tuple[1]==None:
-                    controls_to_activate_regardless_of_time.append(i)
-                elif control_tuple[0] and control_tuple[1] > backup_time and control_tuple[1]<last_backup_time:
-                    controls_to_activate = [i]
-                    backup_time = control_tuple[1]
-                elif control_tuple[0] and control_tuple[1] == backup_time:
-                    controls_to_activate.append(i)
-            assert backup_time <= self._wn.options.hydraulic_timestep, 'Backup time is larger than hydraulic timestep'
-            return backup_time, (controls_to_activate+controls_to_activate_regardless_of_time)
+            events, controls_to_activate_regardless_of_time = self._control_engine.presolve_events()
+            self._step_timers['control'] += time.time() - start_time
+            return events, controls_to_activate_regardless_of_time
 
         else:
-            resolve = False
-            resolve_controls_to_activate = []
-            for i, control in enumerate(self._controls):
-                control_tuple = control.IsControlActionRequired(self._wn, presolve)
-                if control_tuple[0]:
-                    resolve = True
-                    resolve_controls_to_activate.append(i)
+            resolve, resolve_controls_to_activate = self._control_engine.check_postsolve()
+            self._step_timers['control'] += time.time() - start_time
             return resolve, resolve_controls_to_activate
 
     def _fire_controls(self, controls_to_activate):
+        start_time = time.time()
         changes_made = False
-        change_dict = {}
-        for i in controls_to_activate:
-            control = self._controls[i]
-            change_flag, change_tuple, orig_value = control.FireControlAction(self._wn, 0)
-            if change_flag:
-                if change_tuple not in change_dict.keys():
-                    change_dict[change_tuple] = (orig_value, control.name)
-
-        for i in controls_to_activate:
-            control = self._controls[i]
-            change_flag, change_tuple, orig_value = control.FireControlAction(self._wn, 1)
-            if change_flag:
-                if change_tuple not in change_dict.keys():
-                    change_dict[change_tuple] = (orig_value, control.name)
-
-        for i in controls_to_activate:
-            control = self._controls[i]
-            change_flag, change_tuple, orig_value = control.FireControlAction(self._wn, 2)
-            if change_flag:
-                if change_tuple not in change_dict.keys():
-                    change_dict[change_tuple] = (orig_value, control.name)
-
-        for i in controls_to_activate:
-            control = self._controls[i]
-            change_flag, change_tuple, orig_value = control.FireControlAction(self._wn, 3)
-            if change_flag:
-                if change_tuple not in change_dict.keys():
-                    change_dict[change_tuple] = (orig_value, control.name)
+        change_dict = self._control_engine.fire(controls_to_activate)
+        self._scheduler.queue_time_control_events(self._control_engine.time_control_events())
 
         self._control_log.reset()
 
@@ -317,7 +462,11 @@ class WNTRSimulator(WaterNetworkSimulator):
                 self._control_log.add(change_tuple[0],change_tuple[1])
                 logger.debug('setting {0} {1} to {2} because of control {3}'.format(change_tuple[0].name(),change_tuple[1],getattr(change_tuple[0],change_tuple[1]),control_name))
 
-        self._update_internal_graph()
+        self._step_timers['control'] += time.time() - start_time
+
+        start_time = time.time()
+        self._update_connectivity()
+        self._step_timers['connectivity'] += time.time() - start_time
 
         return changes_made
 
@@ -330,115 +479,65 @@ class WNTRSimulator(WaterNetworkSimulator):
                 valve._status = valve.status
                 #print 'setting ',valve.name(),' _status to ',valve.status
 
-    def _initialize_internal_graph(self):
+    def _initialize_connectivity(self):
+        open_links = []
         for link_name, link in self._wn.links(wntr.network.Pipe):
-            if link.status == wntr.network.LinkStatus.closed:
-                self._internal_graph.remove_edge(link.start_node(), link.end_node(), key=link_name)
+            if link.status != wntr.network.LinkStatus.closed:
+                open_links.append(link_name)
         for link_name, link in self._wn.links(wntr.network.Pump):
-            if link.status == wntr.network.LinkStatus.closed or link._cv_status == wntr.network.LinkStatus.closed:
-                self._internal_graph.remove_edge(link.start_node(), link.end_node(), key=link_name)
+            if link.status != wntr.network.LinkStatus.closed and link._cv_status != wntr.network.LinkStatus.closed:
+                open_links.append(link_name)
         for link_name, link in self._wn.links(wntr.network.Valve):
-            if link.status == wntr.network.LinkStatus.closed or link._status == wntr.network.LinkStatus.closed:
-                self._internal_graph.remove_edge(link.start_node(), link.end_node(), key=link_name)
-
-    def _update_internal_graph(self):
+            if link.status != wntr.network.LinkStatus.closed and link._status != wntr.network.LinkStatus.closed:
+                open_links.append(link_name)
+        sources = self._wn.tank_name_list() + self._wn.reservoir_name_list()
+        links = [(link_name, link.start_node(), link.end_node()) for link_name, link in self._wn.links()]
+        self._connectivity = ConnectivityTracker(self._wn.node_name_list(), sources, links, open_links)
+
+    def _update_connectivity(self):
+        connectivity = self._connectivity
         for obj_name, obj in self._control_log.changed_objects.iteritems():
             changed_attrs = self._control_log.changed_attributes[obj_name]
             if type(obj) == wntr.network.Pipe:
                 if 'status' in changed_attrs:
                     if getattr(obj, 'status') == wntr.network.LinkStatus.opened:
-                        self._internal_graph.add_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                        connectivity.open_link(obj_name)
                     elif getattr(obj, 'status') == wntr.network.LinkStatus.closed:
-                        self._internal_graph.remove_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                        connectivity.close_link(obj_name)
                     else:
                         raise RuntimeError('Pipe status not recognized.')
             elif type(obj) == wntr.network.Pump:
                 if 'status' in changed_attrs and '_cv_status' in changed_attrs:
                     if obj.status == wntr.network.LinkStatus.closed and obj._status == wntr.network.LinkStatus.closed:
-                        self._internal_graph.remove_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                        connectivity.close_link(obj_name)
                     elif obj.status == wntr.network.LinkStatus.opened and obj._status == wntr.network.LinkStatus.opened:
-                        self._internal_graph.add_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                        connectivity.open_link(obj_name)
                     else:
                         pass
                 elif 'status' in changed_attrs:
                     if obj.status == wntr.network.LinkStatus.closed:
                         if obj._cv_status == wntr.network.LinkStatus.opened:
-                            self._internal_graph.remove_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                            connectivity.close_link(obj_name)
                     elif obj.status == wntr.network.LinkStatus.opened:
                         if obj._cv_status == wntr.network.LinkStatus.opened:
-                            self._internal_graph.add_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                            connectivity.open_link(obj_name)
                 elif '_cv_status' in changed_attrs:
                     if obj._cv_status == wntr.network.LinkStatus.closed:
                         if obj.status == wntr.network.LinkStatus.opened:
-                            self._internal_graph.remove_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                            connectivity.close_link(obj_name)
                     elif obj._cv_status == wntr.network.LinkStatus.opened:
                         if obj.status == wntr.network.LinkStatus.opened:
-                            self._internal_graph.add_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                            connectivity.open_link(obj_name)
             elif type(obj) == wntr.network.Valve:
                 if ((obj.status == wntr.network.LinkStatus.opened or
                              obj.status == wntr.network.LinkStatus.active) and
                         (obj._status == wntr.network.LinkStatus.opened or
                                  obj._status == wntr.network.LinkStatus.active)):
-                    self._internal_graph.add_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                    connectivity.open_link(obj_name)
                 elif obj.status == wntr.network.LinkStatus.closed:
-                    if obj_name in [k for i,j,k in self._internal_graph.edges_iter(keys=True)]:
-                        self._internal_graph.remove_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                    connectivity.close_link(obj_name)
                 elif obj.status == wntr.network.LinkStatus.active and obj._status == wntr.network.LinkStatus.closed:
-                    if obj_name in [k for i, j, k in self._internal_graph.edges_iter(keys=True)]:
-                        self._internal_graph.remove_edge(obj.start_node(), obj.end_node(), key=obj_name)
+                    connectivity.close_link(obj_name)
 
     def _get_isolated_junctions_and_links(self):
-
-        # isolated_junctions = set()
-        # isolated_links = set()
-        # n = 1
-        # for subG in nx.connected_component_subgraphs(self._internal_graph):
-        #     print 'subgraph ',n
-        #     n += 1
-        #     # print subG.nodes()
-        #     type_list = [i[1]['type'] for i in subG.nodes_iter(data=True)]
-        #     if 'tank' in type_list or 'reservoir' in type_list:
-        #         continue
-        #     else:
-        #         isolated_junctions = isolated_junctions.union(set(subG.nodes()))
-        #         for start_node, end_node, key in subG.edges_iter(keys=True):
-        #             isolated_links.add(key)
-        # return isolated_junctions, isolated_links
-
-        starting_recursion_limit = sys.getrecursionlimit()
-        sys.setrecursionlimit(50000)
-        G = self._internal_graph
-        node_set = set(self._wn.node_name_list())
-
-        def grab_group(node_name):
-            node_set.remove(node_name)
-            suc = G.successors(node_name)
-            pre = G.predecessors(node_name)
-            for s in suc:
-                if s in node_set:
-                    grab_group(s)
-            for p in pre:
-                if p in node_set:
-                    grab_group(p)
-
-        for tank_name, tank in self._wn.nodes(wntr.network.Tank):
-            if tank_name in node_set:
-                grab_group(tank_name)
-            else:
-                continue
-        for reservoir_name, reservoir in self._wn.nodes(wntr.network.Reservoir):
-            if reservoir_name in node_set:
-                grab_group(reservoir_name)
-            else:
-                continue
-
-        isolated_junctions = list(node_set)
-        isolated_links = set()
-        for j in isolated_junctions:
-            connected_links = self._wn.get_links_for_node(j)
-            for l in connected_links:
-                isolated_links.add(l)
-        isolated_links = list(isolated_links)
-
-        sys.setrecursionlimit(starting_recursion_limit)
-        return isolated_junctions, isolated_links
+        return self._connectivity.get_isolated_junctions_and_links()
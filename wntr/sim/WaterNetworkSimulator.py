@@ -70,29 +70,24 @@ class WaterNetworkSimulator(object):
             raise KeyError("Not a valid node name")
         # Make sure node object is a Junction
         assert(isinstance(node, Junction)), "Demands can only be calculated for Junctions"
-        # Calculate demand pattern values
-        base_demand = node.base_demand
-        pattern_name = node.demand_pattern_name
-        if pattern_name is None:
-            pattern_name = self._wn.options.pattern
-        pattern_list = self._wn.get_pattern(pattern_name)
-        pattern_length = len(pattern_list)
         offset = self._wn.options.pattern_start
-
         assert(offset == 0.0), "Only 0.0 Pattern Start time is currently supported. "
 
-        demand_times_minutes = range(start_time, end_time + self._wn.options.hydraulic_timestep, self._wn.options.hydraulic_timestep)
-        demand_pattern_values = [base_demand*i for i in pattern_list]
-
-        demand_values = []
-        for t in demand_times_minutes:
-            # Modulus with the last pattern time to get time within pattern range
-            pattern_index = t / self._wn.options.pattern_timestep
-            # Modulus with the pattern time step to get the pattern index
-            pattern_index = pattern_index % pattern_length
-            demand_values.append(demand_pattern_values[pattern_index])
-
-        return demand_values
+        # Sum the demands of the demand categories of the node
+        demand_times = np.arange(start_time, end_time + self._wn.options.hydraulic_timestep, self._wn.options.hydraulic_timestep)
+        pattern_steps = np.floor_divide(demand_times, self._wn.options.pattern_timestep).astype(int)
+        demand_values = None
+        for base_demand, pattern_name, category_name in [(node.base_demand, node.demand_pattern_name, None)]+node.demand_categories:
+            if pattern_name is None:
+                pattern_name = self._wn.options.pattern
+            pattern = np.array(self._wn.get_pattern(pattern_name), dtype=float)
+            category_demand_values = base_demand*pattern[pattern_steps % len(pattern)]
+            if demand_values is None:
+                demand_values = category_demand_values
+            else:
+                demand_values += category_demand_values
+
+        return demand_values.tolist()
 
     def _get_link_type(self, name):
         if isinstance(self._wn.get_link(name), Pipe):
@@ -1,6 +1,19 @@
 from EpanetSimulator import EpanetSimulator
 from WNTRSimulator import WNTRSimulator
+from ScenarioRunner import ScenarioRunner
 from NetworkResults import NetResults
 from NewtonSolver import NewtonSolver
+from LinearSolver import LinearSolver
+from UmfpackLinearSolver import UmfpackLinearSolver
+from IterativeLinearSolver import IterativeLinearSolver
+from GGALinearSolver import GGALinearSolver
+from ConnectivityTracker import ConnectivityTracker
 from WaterNetworkSimulator import WaterNetworkSimulator
 from HydraulicModel import HydraulicModel
+from ControlEngine import ControlEngine
+from EventScheduler import EventScheduler
+from DemandEngine import DemandEngine
+from EpanetSession import EpanetSession
+from HydraulicsCache import HydraulicsCache
+from QualityScenarioRunner import QualityScenarioRunner
+from ContaminantEnsemble import ContaminantEnsemble
@@ -0,0 +1,57 @@
+from nose.tools import *
+import networkx as nx
+import random
+import wntr
+
+def _isolated_nodes_from_graph(node_names, source_names, links, open_links):
+    G = nx.MultiGraph()
+    G.add_nodes_from(node_names)
+    for link_name, start_node_name, end_node_name in links:
+        if link_name in open_links:
+            G.add_edge(start_node_name, end_node_name, key=link_name)
+    connected = set()
+    for source_name in source_names:
+        connected.update(nx.node_connected_component(G, source_name))
+    return set(node_names) - connected
+
+def test_open_and_close_links():
+    # R1 - a - b - c, with a loop a - c
+    links = [('p1', 'R1', 'a'), ('p2', 'a', 'b'), ('p3', 'b', 'c'), ('p4', 'a', 'c')]
+    tracker = wntr.sim.ConnectivityTracker(['R1', 'a', 'b', 'c'], ['R1'], links, ['p1', 'p2', 'p3', 'p4'])
+    assert_equal(tracker.get_isolated_junctions_and_links(), ([], []))
+
+    tracker.close_link('p4')
+    assert_equal(tracker.get_isolated_junctions_and_links(), ([], []))
+
+    tracker.close_link('p2')
+    junctions, isolated_links = tracker.get_isolated_junctions_and_links()
+    assert_equal(set(junctions), set(['b', 'c']))
+    assert_equal(set(isolated_links), set(['p2', 'p3', 'p4']))
+
+    tracker.open_link('p4')
+    assert_equal(tracker.get_isolated_junctions_and_links(), ([], []))
+
+    tracker.close_link('p1')
+    junctions, isolated_links = tracker.get_isolated_junctions_and_links()
+    assert_equal(set(junctions), set(['a', 'b', 'c']))
+
+def test_random_changes_match_graph_search():
+    random.seed(5)
+    node_names = ['n'+str(i) for i in range(40)]
+    source_names = ['n0', 'n1']
+    links = []
+    for i in range(80):
+        start, end = random.sample(node_names, 2)
+        links.append(('l'+str(i), start, end))
+    open_links = set(link[0] for link in links)
+    tracker = wntr.sim.ConnectivityTracker(node_names, source_names, links, open_links)
+    for i in range(300):
+        link_name = random.choice(links)[0]
+        if link_name in open_links:
+            open_links.remove(link_name)
+            tracker.close_link(link_name)
+        else:
+            open_links.add(link_name)
+            tracker.open_link(link_name)
+        junctions, isolated_links = tracker.get_isolated_junctions_and_links()
+        assert_equal(set(junctions), _isolated_nodes_from_graph(node_names, source_names, links, open_links))
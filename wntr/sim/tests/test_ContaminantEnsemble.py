@@ -0,0 +1,36 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+import numpy as np
+import wntr
+from wntr.sim.ContaminantEnsemble import _HealthImpacts
+
+testdir = dirname(abspath(str(__file__)))
+datadir = join(testdir,'..','..','..','examples','networks')
+
+def test_contaminant_ensemble():
+    inp_file = join(datadir,'Net3.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    injections = [('121', 0, 24*3600, 100), ('not a node', 0, 3600, 100), ('River', 3600, 7200, 100)]
+
+    ensemble = wntr.sim.ContaminantEnsemble(wn, injections, source_type='SETPOINT')
+    impacts = ensemble.run(num_processes=2)
+
+    assert_equal(list(impacts['node']), ['121', 'not a node', 'River'])
+    assert_equal(ensemble.errors.keys(), [1])
+    assert_true(np.isnan(impacts.loc[1, 'mass_consumed']))
+
+    # Same as the health impact metrics of the full results
+    WQ = wntr.scenario.Waterquality('CHEM', ['121'], 'SETPOINT', 100, 0, 24*3600)
+    results = wntr.sim.EpanetSimulator(wn).run_sim(WQ)
+    node_results = results.node.loc[:, :, wn.junction_name_list()]
+    expected = wntr.metrics.mass_contaminant_consumed(node_results).sum().sum()
+    assert_less(abs(impacts.loc[0, 'mass_consumed'] - expected)/expected, 1e-4)
+    expected = wntr.metrics.volume_contaminant_consumed(node_results, 0).sum().sum()
+    assert_less(abs(impacts.loc[0, 'volume_consumed'] - expected)/expected, 1e-4)
+    reduce_func = _HealthImpacts(0.0)
+    assert_equal(impacts.loc[0, 'extent'], reduce_func(wn, results)['extent'])
+    # extent_contaminant is slow, so the extent is compared during the first day
+    results.node = results.node.loc[:, :24*3600]
+    results.link = results.link.loc[:, :24*3600]
+    expected = wntr.metrics.extent_contaminant(results.node, results.link, wn, 0).sum(axis=1).max()
+    assert_almost_equal(reduce_func(wn, results)['extent'], expected, 6)
@@ -0,0 +1,109 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+import numpy as np
+import wntr
+
+testdir = dirname(abspath(str(__file__)))
+datadir = join(testdir,'..','..','tests','networks_for_testing')
+net3dir = join(testdir,'..','..','..','examples','networks')
+
+class _CheckedSimulator(wntr.sim.WNTRSimulator):
+    """
+    Checks that the control engine gives the same results as checking
+    every control individually.
+    """
+    def _check_controls(self, presolve):
+        engine_results = wntr.sim.WNTRSimulator._check_controls(self, presolve)
+        if presolve:
+            events = []
+            controls_to_activate_regardless_of_time = []
+            for i, control in enumerate(self._controls):
+                control_tuple = control.IsControlActionRequired(self._wn, presolve)
+                if control_tuple[0] and control_tuple[1]==None:
+                    controls_to_activate_regardless_of_time.append(i)
+                elif control_tuple[0] and control_tuple[1] >= 0:
+                    events.append((control_tuple[1], i))
+            expected = (events, controls_to_activate_regardless_of_time)
+        else:
+            resolve_controls_to_activate = [i for i, control in enumerate(self._controls)
+                                            if control.IsControlActionRequired(self._wn, presolve)[0]]
+            expected = (len(resolve_controls_to_activate) > 0, resolve_controls_to_activate)
+        assert_equal(engine_results, expected)
+        self.num_checks += 1
+        return engine_results
+
+def _run_checked(wn, pressure_driven=False):
+    sim = _CheckedSimulator(wn, pressure_driven=pressure_driven)
+    sim.num_checks = 0
+    results = sim.run_sim()
+    assert_true(sim.num_checks > 0)
+    return sim, results
+
+def test_same_as_individual_checks():
+    for inp_file in ['conditional_controls_1.inp', 'time_controls.inp', 'tank_controls_1.inp', 'cv_controls.inp',
+                     'control_comb.inp', 'leaks.inp']:
+        wn = wntr.network.WaterNetworkModel(join(datadir, inp_file))
+        _run_checked(wn)
+
+def test_same_as_individual_checks_Net3():
+    wn = wntr.network.WaterNetworkModel(join(net3dir, 'Net3.inp'))
+    wn.options.duration = 24*3600
+    sim, results = _run_checked(wn)
+    # The tank, check valve, and pump controls are evaluated with arrays
+    assert_equal(len(sim._control_engine._generic), 0)
+
+def test_multi_conditional_control():
+    wn = wntr.network.WaterNetworkModel(join(datadir, 'conditional_controls_1.inp'))
+    wn.options.duration = 6*3600
+    pump = wn.get_link('pump1')
+    tank = wn.get_node('tank1')
+    action = wntr.network.ControlAction(pump, 'status', wntr.network.LinkStatus.closed)
+    control = wntr.network.MultiConditionalControl([(tank, 'head'), (wn, 'sim_time')],
+                                                   [np.greater, np.greater_equal],
+                                                   [(wn.get_node('junction1'), 'head'), 3600], action)
+    wn.add_control('multi', control)
+    sim, results = _run_checked(wn)
+    assert_true('multi' not in [wn._control_dict.keys()[i] for i in sim._control_engine._generic])
+    assert_equal(results.link.at['status', 5*3600, 'pump1'], wntr.network.LinkStatus.closed)
+
+def test_prv():
+    wn = wntr.network.WaterNetworkModel()
+    wn.add_pattern('pattern1', [1.0])
+    wn.add_reservoir('r1', base_head=100.0)
+    wn.add_junction('j1', demand_pattern_name='pattern1', elevation=10.0)
+    wn.add_junction('j2', base_demand=0.05, demand_pattern_name='pattern1', elevation=10.0)
+    wn.add_junction('j3', base_demand=0.02, demand_pattern_name='pattern1', elevation=5.0)
+    wn.add_pipe('p1', 'r1', 'j1')
+    wn.add_valve('v1', 'j1', 'j2', setting=30.0)
+    wn.add_pipe('p2', 'j2', 'j3')
+    wn.options.duration = 3*3600
+    wn.options.hydraulic_timestep = 3600
+    wn.options.pattern_timestep = 3600
+    sim, results = _run_checked(wn)
+    assert_equal(len(sim._control_engine._prv_controls), 1)
+    assert_almost_equal(results.node.at['pressure', 0, 'j2'], 30.0, 4)
+
+def test_event_times():
+    wn = wntr.network.WaterNetworkModel(join(datadir, 'tank_controls_1.inp'))
+    wn.options.start_clocktime = 6*3600
+    pipe = wn.get_link('pipe1')
+    tank = wn.get_node('tank1')
+    closed = wntr.network.ControlAction(pipe, 'status', wntr.network.LinkStatus.closed)
+    controls = [wntr.network.TimeControl(wn, 5000, 'SIM_TIME', False, closed),
+                wntr.network.TimeControl(wn, 8*3600+0.5, 'SHIFTED_TIME', True, closed),
+                wntr.network.ConditionalControl((tank, 'head'), np.less, 15.0, closed),
+                wntr.network.ConditionalControl((tank, 'head'), np.greater, 25.0, closed)]
+    engine = wntr.sim.ControlEngine(wn, controls)
+    assert_equal(sorted(engine.time_control_events()), [(5000, 0), (2*3600+1, 1)])
+    assert_equal(engine.time_control_events(), [])
+    # Daily controls are queued again when they are fired
+    wn.sim_time = 2*3600+1
+    engine.fire([1])
+    assert_equal(engine.time_control_events(), [(26*3600+1, 1)])
+
+    # The head (20 m) drops by 5 m in 39269.9 seconds
+    wn.sim_time = 3600
+    tank.prev_demand = -0.01
+    assert_equal(engine.tank_events(), [(3600+39270, 2)])
+    tank.prev_demand = 0.0
+    assert_equal(engine.tank_events(), [])
@@ -0,0 +1,40 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+import numpy as np
+import wntr
+
+testdir = dirname(abspath(str(__file__)))
+net3dir = join(testdir,'..','..','..','examples','networks')
+
+def test_same_as_node_demands():
+    wn = wntr.network.WaterNetworkModel(join(net3dir, 'Net3.inp'))
+    wn.options.hydraulic_timestep = 900
+    engine = wntr.sim.DemandEngine(wn)
+    sim = wntr.sim.WNTRSimulator(wn)
+    matrix = engine.demand_matrix()
+    assert_equal(matrix.shape, (engine.num_timesteps, engine.num_junctions))
+    for column, junction_name in enumerate(engine.junction_names):
+        assert_equal(matrix[:, column].tolist(), sim.get_node_demand(junction_name))
+    for t in [0, 1, 50, engine.num_timesteps-1]:
+        assert_true(np.array_equal(engine.demands(t), matrix[t]))
+    # Net3 demand patterns change every hour
+    assert_equal(engine.breakpoints().tolist(), range(4, engine.num_timesteps, 4))
+
+def test_demand_categories():
+    wn = wntr.network.WaterNetworkModel()
+    wn.add_pattern('pattern1', [1.0, 2.0])
+    wn.add_pattern('pattern2', [0.5, 0.5, 3.0])
+    wn.options.duration = 5*3600
+    wn.options.hydraulic_timestep = 3600
+    wn.options.pattern_timestep = 3600
+    wn.add_junction('j1', base_demand=1.0, demand_pattern_name='pattern1')
+    wn.add_junction('j2', base_demand=2.0, demand_pattern_name='pattern2')
+    wn.get_node('j2').add_demand_category(0.25, 'pattern1', 'commercial')
+    wn.get_node('j2').add_demand_category(1.0, 'pattern2')
+    engine = wntr.sim.DemandEngine(wn, ['j2', 'j1'])
+    expected_j2 = [3.0*0.5 + 0.25*1.0, 3.0*0.5 + 0.25*2.0, 3.0*3.0 + 0.25*1.0,
+                   3.0*0.5 + 0.25*2.0, 3.0*0.5 + 0.25*1.0, 3.0*3.0 + 0.25*2.0]
+    assert_true(np.allclose(engine.demand_matrix()[:, 0], expected_j2))
+    assert_equal(engine.demand_matrix()[:, 1].tolist(), [1.0, 2.0]*3)
+    assert_true(np.allclose(engine.demands(2), [expected_j2[2], 1.0]))
+    assert_true(np.allclose(wntr.sim.WNTRSimulator(wn).get_node_demand('j2'), expected_j2))
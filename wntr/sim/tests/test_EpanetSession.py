@@ -0,0 +1,94 @@
+from nose.tools import *
+from os.path import abspath, dirname, join, exists
+import numpy as np
+import wntr
+
+testdir = dirname(abspath(str(__file__)))
+net3dir = join(testdir,'..','..','..','examples','networks')
+
+def _max_difference(results1, results2):
+    diff = [np.abs(results1.node[key].values - results2.node[key].values).max() for key in ['head', 'demand']]
+    diff.append(np.abs(results1.link['flowrate'].values - results2.link['flowrate'].values).max())
+    return max(diff)
+
+def test_same_as_epanet_simulator():
+    wn = wntr.network.WaterNetworkModel(join(net3dir, 'Net3.inp'))
+    expected = wntr.sim.EpanetSimulator(wn).run_sim()
+    with wntr.sim.EpanetSession(wn) as session:
+        tempdir = session.tempdir
+        assert_true(exists(join(tempdir, 'network.inp')))
+        results = session.run_sim()
+        # The session is reused
+        assert_equal(_max_difference(session.run_sim(), results), 0.0)
+    assert_false(exists(tempdir))
+    assert_equal(results.node['head'].shape, expected.node['head'].shape)
+    # The network is written in LPS, which rounds some of its parameters
+    assert_less(_max_difference(results, expected), 1e-3)
+
+def test_rerun_with_new_parameters():
+    wn = wntr.network.WaterNetworkModel(join(net3dir, 'Net3.inp'))
+    wn.options.duration = 24*3600
+    with wntr.sim.EpanetSession(wn) as session:
+        results1 = session.run_sim()
+        wn.get_link('10').roughness = 90.0
+        wn.get_link('20').diameter = 0.5
+        wn.get_node('15').base_demand = 0.01
+        wn.get_node('101').elevation += 1.0
+        wn.get_node('1').init_level += 1.0
+        wn.get_node('River').base_head += 1.0
+        wn.get_pattern('1')[0] = 2.0
+        results2 = session.run_sim()
+    assert_greater(_max_difference(results1, results2), 0.1)
+    with wntr.sim.EpanetSession(wn) as session:
+        expected = session.run_sim()
+    assert_less(_max_difference(results2, expected), 1e-3)
+
+def test_one_session_per_process():
+    wn = wntr.network.WaterNetworkModel(join(net3dir, 'Net3.inp'))
+    session = wntr.sim.EpanetSession(wn)
+    assert_raises(RuntimeError, wntr.sim.EpanetSession, wn)
+    # EpanetSimulator and HydraulicsCache would replace the network of the session
+    assert_raises(RuntimeError, wntr.sim.EpanetSimulator(wn).run_sim)
+    cache = wntr.sim.HydraulicsCache()
+    try:
+        assert_raises(RuntimeError, cache.get, wn)
+    finally:
+        cache.clear()
+    session.run_sim()
+    session.close()
+    assert_raises(RuntimeError, session.run_sim)
+    wntr.sim.EpanetSession(wn).close()
+
+def test_rerun_with_new_link_status():
+    wn = wntr.network.WaterNetworkModel(join(net3dir, 'Net3.inp'))
+    wn.options.duration = 24*3600
+    with wntr.sim.EpanetSession(wn) as session:
+        results1 = session.run_sim()
+        wn.get_link('20')._base_status = wntr.network.LinkStatus.closed
+        results2 = session.run_sim()
+    assert_equal(np.abs(results2.link['flowrate']['20'].values).max(), 0.0)
+    assert_greater(_max_difference(results1, results2), 0.1)
+    with wntr.sim.EpanetSession(wn) as session:
+        expected = session.run_sim()
+    assert_less(_max_difference(results2, expected), 1e-3)
+
+def test_warnings_of_each_run():
+    wn = wntr.network.WaterNetworkModel(join(net3dir, 'Net3.inp'))
+    wn.options.duration = 24*3600
+    with wntr.sim.EpanetSession(wn) as session:
+        base_demand = wn.get_node('15').base_demand
+        wn.get_node('15').base_demand = 10.0
+        results = session.run_sim()
+        assert_equal(results.error_code, 1)
+        assert_greater(len(session.warning_list), 0)
+        wn.get_node('15').base_demand = base_demand
+        results = session.run_sim()
+        assert_equal(results.error_code, 0)
+        assert_equal(session.warning_list, [])
+
+def test_changed_options():
+    wn = wntr.network.WaterNetworkModel(join(net3dir, 'Net3.inp'))
+    wn.options.duration = 24*3600
+    with wntr.sim.EpanetSession(wn) as session:
+        wn.options.duration = 48*3600
+        assert_raises(RuntimeError, session.run_sim)
@@ -1,6 +1,10 @@
 from nose.tools import *
 from nose import SkipTest
-from os.path import abspath, dirname, join
+from os.path import abspath, dirname, join, exists
+from StringIO import StringIO
+import gzip
+import shutil
+import tempfile
 import wntr
 
 testdir = dirname(abspath(str(__file__)))
@@ -101,6 +105,109 @@ def test_trace_waterquality_simulation():
     expected = 91.66 # Node '159' at hour 6
     error = abs((results.node.loc['quality', 6*3600, '159'] - expected)/expected)
     assert_less(error, 0.0001) # 0.01% error
+
+def test_binary_output():
+    inp_file = join(datadir,'Net3.inp')
+
+    wn = wntr.network.WaterNetworkModel(inp_file)
+
+    WQ = wntr.scenario.Waterquality('TRACE', ['121'])
+
+    sim = wntr.sim.EpanetSimulator(wn)
+    expected = sim.run_sim(WQ)
+    results = sim.run_sim(WQ, binary_output=True)
+
+    assert_equal(list(results.time), list(expected.time))
+    assert_equal(list(results.node.minor_axis), list(expected.node.minor_axis))
+    assert_equal(list(results.link.minor_axis), list(expected.link.minor_axis))
+    assert_true((results.node['type'] == expected.node['type']).all().all())
+    assert_true((results.link['type'] == expected.link['type']).all().all())
+    # EPANET saves the results in single precision
+    for key in ['head', 'demand', 'pressure', 'quality']:
+        error = abs(results.node[key].astype(float) - expected.node[key].astype(float)).max().max()
+        assert_less(error, 1e-4)
+    for key in ['flowrate', 'velocity']:
+        error = abs(results.link[key].astype(float) - expected.link[key].astype(float)).max().max()
+        assert_less(error, 1e-4)
+
+    # The results of several runs can be saved. Without a water quality scenario, the results are
+    # read from the hydraulics file.
+    for convert_units in [True, False]:
+        expected = sim.run_sim(convert_units=convert_units)
+        results = sim.run_sim(convert_units=convert_units, binary_output=True)
+        assert_equal(list(results.time), list(expected.time))
+        # The hydraulics file is saved in single precision
+        for key in ['head', 'demand', 'pressure']:
+            error = abs(results.node[key].astype(float) - expected.node[key].astype(float)).max().max()
+            assert_less(error, 1e-6*abs(expected.node[key].astype(float)).max().max())
+        for key in ['flowrate', 'velocity']:
+            error = abs(results.link[key].astype(float) - expected.link[key].astype(float)).max().max()
+            assert_less(error, 1e-6*abs(expected.link[key].astype(float)).max().max())
+
+def test_file_like_and_gzip_sources():
+    inp_file = join(datadir,'Net1.inp')
+
+    expected = wntr.sim.EpanetSimulator(wntr.network.WaterNetworkModel(inp_file)).run_sim()
+
+    tempdir = tempfile.mkdtemp()
+    try:
+        gz_file = join(tempdir, 'Net1.inp.gz')
+        with open(inp_file, 'rb') as f:
+            contents = f.read()
+        g = gzip.open(gz_file, 'wb')
+        g.write(contents)
+        g.close()
+        networks = [wntr.network.WaterNetworkModel(gz_file),
+                    wntr.network.WaterNetworkModel(StringIO(contents))]
+        # The models are simulated from a temporary inp file, written with a limited precision
+        for wn in networks:
+            results = wntr.sim.EpanetSimulator(wn).run_sim()
+            assert_equal(list(results.time), list(expected.time))
+            for key in ['head', 'demand', 'pressure']:
+                error = abs(results.node[key].astype(float) - expected.node[key].astype(float)).max().max()
+                assert_less(error, 1e-3*abs(expected.node[key].astype(float)).max().max())
+            error = abs(results.link['flowrate'].astype(float) -
+                        expected.link['flowrate'].astype(float)).max().max()
+            assert_less(error, 1e-3*abs(expected.link['flowrate'].astype(float)).max().max())
+        # The hydraulics are keyed on the model as written by write_inpfile
+        cache = wntr.sim.HydraulicsCache(join(tempdir, 'hydraulics'))
+        for wn in networks:
+            assert_true(exists(cache.get(wn)))
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_hydraulics_file():
+    inp_file = join(datadir,'Net3.inp')
+
+    wn = wntr.network.WaterNetworkModel(inp_file)
+
+    WQ = wntr.scenario.Waterquality('CHEM', ['121'], 'SETPOINT', 100, 0, -1)
+
+    sim = wntr.sim.EpanetSimulator(wn)
+    cache = wntr.sim.HydraulicsCache()
+    try:
+        hydfile = cache.get(wn)
+        assert_equal(cache.get(wn), hydfile)
+        results = sim.run_sim(WQ, hydfile=hydfile)
+        assert_raises(ValueError, sim.run_sim, hydfile=hydfile)
+        # The network is simulated from the inp file saved with the hydraulics
+        inp_file = hydfile[:-len('.hyd')] + '.inp'
+        expected = wntr.sim.EpanetSimulator(wntr.network.WaterNetworkModel(inp_file)).run_sim(WQ)
+
+        # Changes to the model in memory are not given the saved hydraulics
+        wn.options.hydraulic_timestep = 1800
+        assert_not_equal(cache.filename(wn), hydfile)
+    finally:
+        cache.clear()
+
+    assert_equal(list(results.time), list(expected.time))
+    assert_equal(abs(results.node['quality'] - expected.node['quality']).max().max(), 0.0)
+    # The hydraulics file is saved in single precision
+    for key in ['head', 'demand', 'pressure']:
+        error = abs(results.node[key].astype(float) - expected.node[key].astype(float)).max().max()
+        assert_less(error, 1e-4)
+    error = abs(results.link['flowrate'] - expected.link['flowrate']).max().max()
+    assert_less(error, 1e-4)
     
 if __name__ == '__main__':
     #test_setpoint_waterquality_simulation()
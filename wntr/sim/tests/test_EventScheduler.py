@@ -0,0 +1,143 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+import numpy as np
+import wntr
+
+testdir = dirname(abspath(str(__file__)))
+datadir = join(testdir,'..','..','tests','networks_for_testing')
+
+def test_next_time():
+    wn = wntr.network.WaterNetworkModel()
+    wn.options.hydraulic_timestep = 3600
+    wn.options.report_timestep = 5400
+    scheduler = wntr.sim.EventScheduler(wn)
+    times = []
+    for i in range(5):
+        wn.sim_time = scheduler.next_time()
+        times.append(wn.sim_time)
+    assert_equal(times, [3600, 5400, 7200, 10800, 14400])
+    # after backing up to an event, the simulation returns to the regular events
+    wn.sim_time = 15000
+    assert_equal(scheduler.next_time(), 16200)
+
+def test_control_events():
+    wn = wntr.network.WaterNetworkModel()
+    wn.sim_time = 7200
+    scheduler = wntr.sim.EventScheduler(wn)
+    scheduler.schedule_control_events([(0, 1), (600, 2), (1200, 4), (600, 3), (0, 0)])
+    assert_equal(scheduler.pop_control_events(), (1200, [4]))
+    assert_equal(scheduler.pop_control_events(), (600, [2, 3]))
+    assert_equal(scheduler.pop_control_events(), (0, [0, 1]))
+    assert_false(scheduler.has_control_events())
+    assert_equal(scheduler.pop_control_events(), (0, []))
+
+def test_report_times():
+    inp_file = join(datadir, 'tank_controls_1.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    wn.options.report_timestep = wn.options.hydraulic_timestep/2
+    results = wntr.sim.WNTRSimulator(wn).run_sim()
+    num_report_times = int(wn.options.duration//wn.options.report_timestep) + 1
+    assert_equal(list(results.node.major_axis),
+                 [i*wn.options.report_timestep for i in range(num_report_times)])
+
+def test_adaptive_next_time():
+    wn = wntr.network.WaterNetworkModel()
+    wn.add_tank('t1', diameter=10.0)
+    wn.options.duration = 24*3600
+    tank = wn.get_node('t1')
+    tank.demand = 0.01
+    scheduler = wntr.sim.EventScheduler(wn, adaptive=True, min_timestep=60, max_timestep=6*3600,
+                                        level_tolerance=0.5, breakpoints=[7200, 36000])
+    # the level changes by 0.5 m in 3926.99 seconds, then the step ends at the breakpoint
+    wn.sim_time = 0
+    assert_equal(scheduler.next_time(), 3926)
+    wn.sim_time = 3926
+    assert_equal(scheduler.next_time(), 7200)
+    tank.demand = 0.0
+    wn.sim_time = 7200
+    assert_equal(scheduler.next_time(), 7200+6*3600)
+    wn.sim_time = 20*3600
+    assert_equal(scheduler.next_time(), 24*3600)
+    tank.demand = 100.0
+    assert_equal(scheduler.next_time(), 20*3600+60)
+    assert_raises(ValueError, wntr.sim.EventScheduler, wn, adaptive=True, min_timestep=600, max_timestep=60)
+
+def test_adaptive_timestep():
+    inp_file = join(datadir, '..', '..', '..', 'examples', 'networks', 'Net3.inp')
+    results = {}
+    num_steps = {}
+    for adaptive in [False, True]:
+        wn = wntr.network.WaterNetworkModel(inp_file)
+        wn.options.duration = 48*3600
+        wn.options.hydraulic_timestep = 900
+        sim = wntr.sim.WNTRSimulator(wn)
+        results[adaptive] = sim.run_sim(solver_options={'ADAPTIVE_TIMESTEP': adaptive})
+        num_steps[adaptive] = len(sim.iterations_per_step)
+    assert_true(num_steps[True] < num_steps[False]/2)
+    assert_equal(list(results[True].node.major_axis), list(results[False].node.major_axis))
+    tank_names = [name for name, tank in wn.nodes(wntr.network.Tank)]
+    head_difference = results[True].node['head'][tank_names] - results[False].node['head'][tank_names]
+    assert_less(head_difference.abs().values.max(), 0.5)
+
+def test_adaptive_timestep_pump_controls():
+    inp_file = join(datadir, '..', '..', '..', 'examples', 'networks', 'Net1.inp')
+    results = {}
+    for adaptive in [False, True]:
+        wn = wntr.network.WaterNetworkModel(inp_file)
+        wn.options.duration = 48*3600
+        solver_options = {'ADAPTIVE_TIMESTEP': adaptive, 'MAX_TIMESTEP': 6*3600, 'TANK_LEVEL_TOL': 5.0}
+        results[adaptive] = wntr.sim.WNTRSimulator(wn).run_sim(solver_options=solver_options)
+    # the pump controls fire at the end of long steps, so the reported statuses and flows between
+    # steps are those of the previous step
+    status = results[True].link['status'].astype(float)
+    expected_status = results[False].link['status'].astype(float)
+    assert_equal((status != expected_status).sum().sum(), 0)
+    flow_difference = results[True].link['flowrate'] - results[False].link['flowrate']
+    assert_less(flow_difference.abs().values.max(), 0.005)
+
+def test_queued_control_events():
+    wn = wntr.network.WaterNetworkModel()
+    wn.options.hydraulic_timestep = 3600
+    wn.options.report_timestep = 3600
+    scheduler = wntr.sim.EventScheduler(wn)
+    scheduler.queue_time_control_events([(5000, 2), (1800, 1)])
+    scheduler.schedule_tank_events([(3000, 4)])
+    # each step ends at the earliest control event or regular event
+    assert_equal(scheduler.next_time(), 1800)
+    assert_true(scheduler.at_control_event())
+    wn.sim_time = 1800
+    assert_equal(scheduler.skip_time(), 3000)
+    wn.sim_time = 3000
+    assert_equal(scheduler.skip_time(), 3600)
+    assert_false(scheduler.at_control_event())
+    wn.sim_time = 3600
+    assert_equal(scheduler.next_time(), 5000)
+    # the tank events are replaced after every solve
+    scheduler.schedule_tank_events([(4000, 4)])
+    assert_equal(scheduler.next_time(), 4000)
+
+def test_skipped_control_events():
+    wn = wntr.network.WaterNetworkModel()
+    wn.options.hydraulic_timestep = 3600
+    scheduler = wntr.sim.EventScheduler(wn)
+    scheduler.schedule_tank_events([(1000, 3)])
+    assert_equal(scheduler.next_time(), 1000)
+    wn.sim_time = 1000
+    assert_equal(scheduler.skip_time(), 3600)
+    # events fired at the skipped control event are not fired again
+    wn.sim_time = 3600
+    scheduler.schedule_control_events([(2600, 3), (600, 5)])
+    assert_equal(scheduler.pop_control_events(), (600, [5]))
+    assert_false(scheduler.has_control_events())
+
+def test_control_at_time_zero():
+    inp_file = join(datadir, 'tank_controls_1.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    tank = wn.get_node('tank1')
+    action = wntr.network.ControlAction(wn.get_link('pipe1'), 'status', wntr.network.LinkStatus.closed)
+    wn.add_control('close_pipe1', wntr.network.ConditionalControl((tank, 'head'), np.less, 30.0, action))
+    results = wntr.sim.WNTRSimulator(wn).run_sim()
+    # the control is fired before time 0 is solved, so time 0 is solved and saved once
+    assert_equal(list(results.get_solver_statistics()['time'][:2]), [0, 3600])
+    assert_equal(list(results.node.major_axis[:2]), [0, 3600])
+    assert_equal(results.link.at['status', 0, 'pipe1'], wntr.network.LinkStatus.closed)
@@ -0,0 +1,94 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+import numpy as np
+import wntr
+
+testdir = dirname(abspath(str(__file__)))
+datadir = join(testdir,'..','..','tests','networks_for_testing')
+net3dir = join(testdir,'..','..','..','examples','networks')
+
+def _assert_same_results(results1, results2):
+    for key in ['head', 'demand', 'pressure', 'leak_demand']:
+        assert_equal(np.abs(results1.node[key].values - results2.node[key].values).max(), 0.0)
+    for key in ['flowrate', 'status']:
+        assert_equal(np.abs(results1.link[key].values - results2.link[key].values).max(), 0.0)
+
+def _rerun(inp_file, change_network, num_runs=2):
+    """
+    Run a simulator several times (calling change_network between runs) and run the same
+    sequence of simulations with a new simulator each time.
+    """
+    all_results = []
+    for reuse in [True, False]:
+        wn = wntr.network.WaterNetworkModel(inp_file)
+        wn.options.duration = 24*3600
+        sim = wntr.sim.WNTRSimulator(wn)
+        sim.run_sim()
+        for run in range(1, num_runs):
+            wn.reset_initial_values()
+            change_network(wn, run)
+            if not reuse:
+                sim = wntr.sim.WNTRSimulator(wn)
+            all_results.append((sim, sim.run_sim()))
+    return all_results[:num_runs-1], all_results[num_runs-1:]
+
+def test_rerun_with_new_parameters():
+    def change_network(wn, run):
+        if run == 1:
+            wn.get_link('10').roughness = 90.0
+            wn.get_link('20').diameter = 0.5
+            wn.get_node('15').base_demand = 0.01
+            wn.get_node('101').elevation += 1.0
+            wn.get_node('123').add_leak(wn, area=0.005, start_time=3600)
+        else:
+            junction = wn.get_node('123')
+            junction.leak_area = 0.01
+            junction.leak_discharge_coeff = 0.6
+    reused, fresh = _rerun(join(net3dir, 'Net3.inp'), change_network, num_runs=3)
+    (sim1, results1), (sim2, results2) = reused
+    # Adding the leak only rebuilds the leak blocks of the model (in place)
+    assert_true(sim1._model is sim2._model)
+    assert_equal(sim2._model.num_leaks, 1)
+    _assert_same_results(results1, fresh[0][1])
+    _assert_same_results(results2, fresh[1][1])
+
+def test_reset():
+    wn = wntr.network.WaterNetworkModel(join(net3dir, 'Net3.inp'))
+    model = wntr.sim.HydraulicModel(wn)
+    node_balance_matrix = model.node_balance_matrix
+    head_curve_coefficients = model.head_curve_coefficients
+
+    wn.get_link('10').roughness = 90.0
+    assert_false(model.reset())
+    assert_true(model.node_balance_matrix is node_balance_matrix)
+    assert_equal(model.head_curve_coefficients, head_curve_coefficients)
+    expected = wntr.sim.HydraulicModel(wn)
+    assert_equal(model.pipe_resistance_coefficients.tolist(), expected.pipe_resistance_coefficients.tolist())
+
+    # Adding a leak only rebuilds the leak ids and the leak blocks of the jacobian
+    wn.get_node('123').add_leak(wn, area=0.005, start_time=3600)
+    assert_true(model.reset())
+    assert_true(model.node_balance_matrix is node_balance_matrix)
+    expected = wntr.sim.HydraulicModel(wn)
+    assert_equal(model.num_leaks, 1)
+    assert_equal(model._leak_ids, expected._leak_ids)
+    assert_equal((model.jacobian - expected.jacobian).nnz, 0)
+    assert_false(model.reset())
+
+    wn.add_pipe('new_pipe', '10', '101', length=100.0, diameter=0.3, roughness=100.0)
+    assert_true(model.reset())
+    assert_true(model.node_balance_matrix is not node_balance_matrix)
+    assert_equal(model.num_links, expected.num_links+1)
+    assert_equal((model.link_headloss_matrix - wntr.sim.HydraulicModel(wn).link_headloss_matrix).nnz, 0)
+    # The pump curve fits are reused
+    assert_equal(len(model._head_curve_coefficients_cache), len(set(head_curve_coefficients.values())))
+
+def test_rerun_after_topology_change():
+    def change_network(wn, run):
+        node_name = sorted(wn._junctions.keys())[0]
+        wn.add_junction('new_junction', base_demand=0.001, elevation=wn.get_node(node_name).elevation)
+        wn.add_pipe('new_pipe', node_name, 'new_junction', length=100.0, diameter=0.2, roughness=100.0)
+    reused, fresh = _rerun(join(datadir, 'tank_controls_1.inp'), change_network)
+    results = reused[0][1]
+    assert_true('new_junction' in results.node['head'].columns)
+    _assert_same_results(results, fresh[0][1])
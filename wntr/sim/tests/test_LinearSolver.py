@@ -0,0 +1,113 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg
+import wntr
+
+testdir = dirname(abspath(str(__file__)))
+datadir = join(testdir,'..','..','..','examples','networks')
+
+def _random_system(seed):
+    np.random.seed(seed)
+    n = 30
+    A = sp.random(n, n, density=0.1, random_state=seed) + 5.0*sp.eye(n)
+    return A.tocoo(), np.random.rand(n)
+
+def test_solve_matches_spsolve():
+    A, b = _random_system(1)
+    solver = wntr.sim.LinearSolver()
+    for i in range(3):
+        A.data = A.data*(1.0+0.1*i)
+        x = solver.solve(A, b)
+        expected = sp.linalg.spsolve(A.tocsc(), b)
+        assert_less(np.max(np.abs(x-expected)), 1e-10)
+    assert_equal(solver.num_symbolic_factorizations, 1)
+    assert_equal(solver.num_numeric_factorizations, 3)
+
+def test_duplicate_entries():
+    A, b = _random_system(2)
+    # split every entry into two coo entries
+    A2 = sp.coo_matrix((np.concatenate((0.5*A.data, 0.5*A.data)),
+                        (np.concatenate((A.row, A.row)), np.concatenate((A.col, A.col)))), shape=A.shape)
+    solver = wntr.sim.LinearSolver()
+    solver.solve(A2, b)
+    x = solver.solve(A2, b)
+    expected = sp.linalg.spsolve(A.tocsc(), b)
+    assert_less(np.max(np.abs(x-expected)), 1e-10)
+
+def test_reuse_factorization():
+    A, b = _random_system(3)
+    solver = wntr.sim.LinearSolver({'LU_REUSE_TOL': 1e-3})
+    solver.solve(A, b)
+    A.data = A.data*(1.0+1e-6)
+    solver.solve(A, b)
+    assert_true(solver.last_solve_reused)
+    A.data = A.data*1.1
+    x = solver.solve(A, b)
+    assert_false(solver.last_solve_reused)
+    assert_equal(solver.num_reused_factorizations, 1)
+    expected = sp.linalg.spsolve(A.tocsc(), b)
+    assert_less(np.max(np.abs(x-expected)), 1e-10)
+
+def test_singular():
+    A = sp.coo_matrix((np.array([1.0, 1.0]), (np.array([0, 1]), np.array([0, 0]))), shape=(2, 2))
+    solver = wntr.sim.LinearSolver()
+    assert_raises(sp.linalg.MatrixRankWarning, solver.solve, A, np.ones(2))
+
+def test_iterative_solvers():
+    A, b = _random_system(4)
+    expected = sp.linalg.spsolve(A.tocsc(), b)
+    for method in ['GMRES', 'BICGSTAB']:
+        # the relative tolerance is min(ITER_ETA_MAX, max(abs(b)))
+        solver = wntr.sim.IterativeLinearSolver({'LINEAR_SOLVER': method, 'ITER_ETA_MAX': 1e-10, 'ILU_DROP_TOL': 1e-2})
+        x = solver.solve(A, b)
+        assert_less(np.max(np.abs(x-expected)), 1e-8)
+        assert_equal(solver.num_direct_fallbacks, 0)
+
+def test_linear_solver_option():
+    inp_file = join(datadir, 'Net1.inp')
+    pressures = {}
+    for method in ['SUPERLU', 'GMRES', 'BICGSTAB']:
+        wn = wntr.network.WaterNetworkModel(inp_file)
+        sim = wntr.sim.WNTRSimulator(wn)
+        results = sim.run_sim(solver_options={'LINEAR_SOLVER': method})
+        pressures[method] = results.node['pressure']
+    for method in ['GMRES', 'BICGSTAB']:
+        assert_less(abs(pressures[method] - pressures['SUPERLU']).max().max(), 1e-3)
+
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    sim = wntr.sim.WNTRSimulator(wn)
+    assert_raises(ValueError, sim.run_sim, solver_options={'LINEAR_SOLVER': 'FOO'})
+
+def test_gga_solver_matches_full_solve():
+    inp_file = join(datadir, 'Net3.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    model = wntr.sim.HydraulicModel(wn, pressure_driven=True)
+    model.initialize_results_dict()
+    model.identify_isolated_junctions([], [])
+    model.set_network_inputs_by_id()
+    model.set_jacobian_constants()
+    x = np.concatenate((model.initialize_head(), model.initialize_demand(), model.initialize_flow(),
+                        model.initialize_leak_demand()))
+    r = model.get_hydraulic_equations(x)
+    J = model.get_jacobian(x)
+
+    solver = wntr.sim.GGALinearSolver(model, {'GGA_FACTORIZATION': 'SUPERLU'})
+    d = solver.solve(J, r)
+    expected = sp.linalg.spsolve(J.tocsc(), r)
+    assert_equal(solver.num_reduced_solves, 1)
+    assert_less(np.max(np.abs(d-expected)), 1e-6*np.max(np.abs(expected)))
+
+def test_gga_linear_solver_option():
+    inp_file = join(datadir, 'Net1.inp')
+    pressures = {}
+    for method in ['SUPERLU', 'GGA']:
+        wn = wntr.network.WaterNetworkModel(inp_file)
+        junction = wn.get_node('22')
+        junction.add_leak(wn, area=0.01, start_time=2*3600, end_time=12*3600)
+        sim = wntr.sim.WNTRSimulator(wn, pressure_driven=True)
+        results = sim.run_sim(solver_options={'LINEAR_SOLVER': method})
+        pressures[method] = results.node['pressure']
+    assert_greater(sim.solver.linear_solver.num_reduced_solves, 0)
+    assert_less(abs(pressures['GGA'] - pressures['SUPERLU']).max().max(), 1e-6)
@@ -0,0 +1,48 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+import os
+import wntr
+
+testdir = dirname(abspath(str(__file__)))
+datadir = join(testdir,'..','..','..','examples','networks')
+
+def max_quality(wn, results):
+    return results.node['quality'].loc[:, wn.junction_name_list()].max().max()
+
+def test_quality_scenario_runner():
+    inp_file = join(datadir,'Net3.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    scenarios = [wntr.scenario.Waterquality('CHEM', ['121'], 'SETPOINT', 100, 0, -1),
+                 wntr.scenario.Waterquality('CHEM', ['not a node'], 'SETPOINT', 100, 0, -1),
+                 wntr.scenario.Waterquality('AGE')]
+
+    cache = wntr.sim.HydraulicsCache()
+    try:
+        runner = wntr.sim.QualityScenarioRunner(wn, scenarios, hydraulics=cache, node_fields=['quality'],
+                                                link_fields=[])
+        results = runner.run(num_processes=2)
+        # The hydraulics are solved once and the report files of the workers are removed
+        key = cache.key(wn)
+        assert_equal(sorted(os.listdir(cache.directory)), [key + '.hyd', key + '.inp'])
+        # Same as simulating the inp file saved with the hydraulics
+        expected_sim = wntr.sim.EpanetSimulator(wntr.network.WaterNetworkModel(join(cache.directory, key + '.inp')))
+        expected = [expected_sim.run_sim(scenarios[i]) for i in [0, 2]]
+    finally:
+        cache.clear()
+
+    assert_equal(runner.errors.keys(), [1])
+    assert_true(results[1] is None)
+    assert_equal(list(results[0].node.items), ['quality'])
+    assert_equal(len(results[0].link.items), 0)
+    for i, expected_results in zip([0, 2], expected):
+        assert_equal(abs(results[i].node['quality'] - expected_results.node['quality']).max().max(), 0.0)
+
+def test_quality_scenario_runner_reduce():
+    inp_file = join(datadir,'Net3.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    scenarios = [wntr.scenario.Waterquality('CHEM', ['121'], 'SETPOINT', quality, 0, -1) for quality in [100, 200]]
+    runner = wntr.sim.QualityScenarioRunner(wn, scenarios, reduce_func=max_quality)
+    serial = runner.run(num_processes=1)
+    parallel = runner.run(num_processes=2)
+    assert_equal(serial, parallel)
+    assert_less(serial[0], serial[1])
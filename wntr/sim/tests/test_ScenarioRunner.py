@@ -0,0 +1,68 @@
+from nose.tools import *
+from os.path import abspath, dirname, join
+import numpy as np
+import copy
+import wntr
+
+testdir = dirname(abspath(str(__file__)))
+datadir = join(testdir,'..','..','..','examples','networks')
+
+def min_pressure(wn, results):
+    return results.node['pressure'].loc[:, wn.junction_name_list()].min().min()
+
+def _network():
+    inp_file = join(datadir,'Net3.inp')
+    wn = wntr.network.WaterNetworkModel(inp_file)
+    wn.options.duration = 6*3600
+    wn.options.hydraulic_timestep = 3600
+    return wn
+
+def test_scenario_runner():
+    wn = _network()
+    scenarios = [wntr.scenario.HydraulicScenario('leak', leaks=[('20', 0.01, 3600, 5*3600)]),
+                 wntr.scenario.HydraulicScenario('bad', closed_links=['not a link']),
+                 wntr.scenario.HydraulicScenario('demand', demand_multiplier=1.2)]
+
+    runner = wntr.sim.ScenarioRunner(wn, scenarios, pressure_driven=True, node_fields=['pressure'], link_fields=[])
+    results = runner.run(num_processes=2)
+
+    assert_equal(runner.errors.keys(), [1])
+    assert_true(results[1] is None)
+    assert_equal(list(results[0].node.items), ['pressure'])
+    assert_equal(len(results[0].link.items), 0)
+
+    scenario_wn = copy.deepcopy(wn)
+    scenarios[2].apply(scenario_wn)
+    expected = wntr.sim.WNTRSimulator(scenario_wn, pressure_driven=True).run_sim()
+    assert_less(np.max(np.abs(results[2].node['pressure'].values - expected.node['pressure'].values)), 1e-10)
+
+def test_scenario_runner_reduce():
+    wn = _network()
+    scenarios = [wntr.scenario.HydraulicScenario('demand', demand_multiplier=m) for m in [1.0, 2.0]]
+    runner = wntr.sim.ScenarioRunner(wn, scenarios, pressure_driven=True, reduce_func=min_pressure)
+    serial = runner.run(num_processes=1)
+    parallel = runner.run(num_processes=2)
+    assert_equal(serial, parallel)
+    assert_greater(serial[0], serial[1])
+
+def test_scenario_runner_matches_individual_simulations():
+    wn = _network()
+    scenarios = [wntr.scenario.HydraulicScenario('leak', leaks=[('20', 0.01, 3600, 5*3600)]),
+                 wntr.scenario.HydraulicScenario('closed', closed_links=['101']),
+                 wntr.scenario.HydraulicScenario('outage', pump_outages=[('10', 3600, 4*3600)])]
+    runner = wntr.sim.ScenarioRunner(wn, scenarios, pressure_driven=True)
+    runner_results = runner.run(num_processes=1)
+
+    for scenario, runner_result in zip(scenarios, runner_results):
+        scenario_wn = copy.deepcopy(wn)
+        scenario.apply(scenario_wn)
+        results = wntr.sim.WNTRSimulator(scenario_wn, pressure_driven=True).run_sim()
+        assert_equal(runner_result.time, results.time)
+        head = runner_result.node['head'][results.node['head'].columns]
+        flowrate = runner_result.link['flowrate'][results.link['flowrate'].columns]
+        assert_less(np.max(np.abs(head.values - results.node['head'].values)), 1e-6)
+        assert_less(np.max(np.abs(flowrate.values - results.link['flowrate'].values)), 1e-8)
+
+    # The base network is not modified
+    assert_true('leak_20' not in wn.junction_name_list())
+    assert_true(abs(runner_results[0].node.at['leak_demand', 3*3600, 'leak_20']) > 0)
@@ -38,3 +38,62 @@ class TestPDD(unittest.TestCase):
         for t in results.time:
             self.assertEqual(results.node.at['demand',t,'junction2'], 150.0/3600.0*math.sqrt((10.0-0.0)/(15.0-0.0)))
 
+
+class TestPredictor(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        sys.path.append(resilienceMainDir)
+        import wntr
+        self.wntr = wntr
+
+    @classmethod
+    def tearDownClass(self):
+        sys.path.remove(resilienceMainDir)
+
+    def test_predictor_matches_previous_solution_initialization(self):
+        inp_file = resilienceMainDir+'/examples/networks/Net3.inp'
+        results = {}
+        iterations = {}
+        for predictor in [False, True]:
+            wn = self.wntr.network.WaterNetworkModel(inp_file)
+            wn.options.duration = 2*3600
+            wn.options.hydraulic_timestep = 60
+            wn.options.report_timestep = 60
+            sim = self.wntr.sim.WNTRSimulator(wn)
+            results[predictor] = sim.run_sim(solver_options={'PREDICTOR': predictor})
+            iterations[predictor] = sum(sim.iterations_per_step)
+            self.assertEqual(len(sim.iterations_per_step), len(results[predictor].time))
+
+        pressure_diff = abs(results[True].node['pressure'] - results[False].node['pressure']).max().max()
+        self.assertLess(pressure_diff, 1e-4)
+        self.assertLessEqual(iterations[True], iterations[False])
+
+class TestSolverStatistics(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        sys.path.append(resilienceMainDir)
+        import wntr
+        self.wntr = wntr
+
+    @classmethod
+    def tearDownClass(self):
+        sys.path.remove(resilienceMainDir)
+
+    def test_solver_statistics(self):
+        inp_file = resilienceMainDir+'/wntr/tests/networks_for_testing/conditional_controls_1.inp'
+        wn = self.wntr.network.WaterNetworkModel(inp_file)
+        sim = self.wntr.sim.WNTRSimulator(wn)
+        results = sim.run_sim()
+
+        stats = results.get_solver_statistics()
+        self.assertEqual(list(stats.columns[:3]), ['time', 'trial', 'iterations'])
+        self.assertEqual(stats['iterations'].sum(), sum(sim.iterations_per_step))
+        self.assertEqual(len(stats[stats['trial'] == 0]), len(sim.iterations_per_step))
+        self.assertTrue(stats['converged'].all())
+        for i in range(len(stats)):
+            self.assertEqual(len(stats['residual_norms'][i]), stats['iterations'][i]+1)
+            self.assertEqual(stats['residual_norms'][i][-1], stats['residual_norm'][i])
+        for key in ['residual_time', 'jacobian_time', 'linear_solve_time', 'control_time', 'connectivity_time']:
+            self.assertTrue((stats[key] >= 0.0).all())